@@ -9,6 +9,7 @@ from .models import (
     Comment,
     GameTurnOutcome,
     GameRoom,
+    WeeklyScore,
 )
 from django.db import models
 from django import forms
@@ -207,6 +208,14 @@ admin.site.register(Poster, PosterAdmin)
 admin.site.register(Comment, CommentAdmin)
 
 
+@admin.register(WeeklyScore)
+class WeeklyScoreAdmin(admin.ModelAdmin):
+    list_display = ("id", "week", "user", "score", "ended_at", "session")
+    list_filter = ("week",)
+    search_fields = ("user__username",)
+    raw_id_fields = ("user", "session")
+
+
 @admin.register(GameRoom)
 class GameRoomAdmin(admin.ModelAdmin):
     list_display = (
@@ -0,0 +1,143 @@
+"""Async versions of the hot ``GameSessionViewSet`` actions, for ASGI servers.
+
+Under Daphne a sync DRF view holds a worker thread for the whole request.
+These views authenticate, parse, serialize and render on the event loop; only
+the service transaction (``services.a*``) runs in a thread, on the bounded
+``ts.db.db_pool``. The rest is the viewset's own code: its serializers and
+``ts.payloads`` bodies, its parsers, DRF's exception handler, and the
+``ts.idempotency`` replay helpers and cache.
+
+``ts.middleware.AsgiUrlconfMiddleware`` routes POSTs of ASGI requests through
+``tsbackend.asgi_urls``, which puts these views in front of the normal URLs.
+WSGI servers (gunicorn) keep serving the sync viewset.
+"""
+
+from __future__ import annotations
+
+from functools import wraps
+from typing import Any, Dict, Optional, Tuple
+
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed, MethodNotAllowed, NotAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from . import payloads, services
+from .authentication import CachedJWTAuthentication
+from .idempotency import IDEMPOTENCY_HEADER, REPLAYED_HEADER, remember, replayed
+from .serializers import GuessSerializer, VersionNumberSerializer
+from .views import GameSessionViewSet
+
+_authentication = CachedJWTAuthentication()
+_parsers = [parser_class() for parser_class in GameSessionViewSet.parser_classes]
+_renderer = JSONRenderer()
+
+
+def _finalize(response: Response) -> Response:
+    # what APIView.finalize_response does once JSON has been negotiated
+    response.accepted_renderer = _renderer
+    response.accepted_media_type = _renderer.media_type
+    response.renderer_context = {}
+    return response.render()
+
+
+def _render(data: Any, status_code: int) -> Response:
+    return _finalize(Response(data, status=status_code))
+
+
+def _error(exc: Exception, request) -> Response:
+    # as APIView.handle_exception passes it to the configured exception handler,
+    # which turns Http404 and PermissionDenied into responses; the rest is raised
+    if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+        exc.auth_header = _authentication.authenticate_header(request)
+    response = api_settings.EXCEPTION_HANDLER(exc, {"request": request})
+    if response is None:
+        raise exc
+    return _finalize(response)
+
+
+def _body(request) -> Dict[str, Any]:
+    # the viewset's parsers, chosen by Content-Type as DRF's Request chooses them
+    return Request(request, parsers=_parsers).data
+
+
+def game_action(idempotency_name: Optional[str] = None):
+    """Wrap ``handler(request, user, data, pk) -> (payload, status)`` as a POST
+    view with the viewset's authentication, errors and idempotency."""
+
+    def decorator(handler):
+        @csrf_exempt
+        @wraps(handler)
+        async def view(request, pk: Optional[int] = None):
+            try:
+                if request.method != "POST":
+                    raise MethodNotAllowed(request.method)
+                authenticated = await _authentication.aauthenticate(request)
+                if authenticated is None:
+                    raise NotAuthenticated()
+                user = authenticated[0]
+
+                data = _body(request)
+                key = request.headers.get(IDEMPOTENCY_HEADER) if idempotency_name else None
+                cache_key = (user.pk, str(pk), idempotency_name, key)
+                if key:
+                    cached = replayed(cache_key, data)
+                    if cached is not None:
+                        response = _render(*cached)
+                        response[REPLAYED_HEADER] = "true"
+                        return response
+
+                payload, status_code = await handler(request, user, data, pk)
+            except Exception as exc:
+                return _error(exc, request)
+            if key:
+                remember(cache_key, data, payload, status_code)
+            return _render(payload, status_code)
+
+        return view
+
+    return decorator
+
+
+def _validated(serializer_class, data: Dict[str, Any]) -> Dict[str, Any]:
+    serializer = serializer_class(data=data)
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data
+
+
+@game_action()
+async def create_session(request, user, data, pk) -> Tuple[Dict[str, Any], int]:
+    session = await services.astart_session(user)
+    return payloads.start_payload(session, {"request": request}), status.HTTP_201_CREATED
+
+
+@game_action("guess")
+async def guess(request, user, data, pk) -> Tuple[Dict[str, Any], int]:
+    args = _validated(GuessSerializer, data)
+    turn, session = await services.asubmit_guess(session_id=pk, user=user, **args)
+    return payloads.guess_payload(turn, session, {"request": request}), status.HTTP_200_OK
+
+
+@game_action("guess-and-advance")
+async def guess_and_advance(request, user, data, pk) -> Tuple[Dict[str, Any], int]:
+    args = _validated(GuessSerializer, data)
+    turn, session, new_turn, preloaded_turn = await services.aguess_and_advance(session_id=pk, user=user, **args)
+    payload = payloads.guess_and_advance_payload(turn, session, new_turn, preloaded_turn, {"request": request})
+    return payload, status.HTTP_200_OK
+
+
+@game_action("next-turn")
+async def next_turn(request, user, data, pk) -> Tuple[Dict[str, Any], int]:
+    version = _validated(VersionNumberSerializer, data)["version"]
+    session, new_turn, preloaded_turn = await services.ahandle_next(session_id=pk, version=version, user=user)
+    return payloads.next_turn_payload(session, new_turn, preloaded_turn, {"request": request}), status.HTTP_200_OK
+
+
+@game_action("end-session")
+async def end_session(request, user, data, pk) -> Tuple[Dict[str, Any], int]:
+    version = _validated(VersionNumberSerializer, data)["version"]
+    session, turn = await services.aend_session(session_id=pk, version=version, user=user)
+    return payloads.end_session_payload(session, turn, {"request": request}), status.HTTP_200_OK
@@ -0,0 +1,135 @@
+"""Token-to-user resolution shared by REST and WebSocket authentication.
+
+Both ``JWTAuthentication`` and the Channels ``JwtAuthMiddleware`` used to load
+the user row for every request or connect. ``user_cache`` keeps the loaded
+users for ``TS_AUTH_CACHE_TTL_SECS``, keyed by user id so every token of a
+user shares one entry. Saving or deleting a user drops the entry (see
+``ts.signals``); changes made without signals, such as ``QuerySet.update``,
+are picked up when the entry expires.
+
+``acached_user`` and ``auser_for_token`` are the same lookups for the
+WebSocket stack: a cache hit stays on the event loop and a miss uses the async
+ORM.
+"""
+
+from __future__ import annotations
+
+import copy
+from typing import Any, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import UntypedToken
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .caching import TTLCache
+
+User = get_user_model()
+
+user_cache = TTLCache(
+    max_entries=getattr(settings, "TS_AUTH_CACHE_MAX_ENTRIES", 10000),
+    ttl=getattr(settings, "TS_AUTH_CACHE_TTL_SECS", 60),
+)
+
+
+def _cache_key(user_id: Any) -> str:
+    # tokens carry the id as a string (older ones as an int)
+    return str(user_id)
+
+
+def cached_user(user_id: Any) -> Optional[User]:
+    """The user with ``user_id``, or ``None``. Each caller gets its own copy so
+    attribute changes made while handling a request stay with that request."""
+    key = _cache_key(user_id)
+    user = user_cache.get(key)
+    if user is None:
+        user = User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+        if user is None:
+            return None
+        user_cache.set(key, user)
+    return copy.copy(user)
+
+
+async def acached_user(user_id: Any) -> Optional[User]:
+    key = _cache_key(user_id)
+    user = user_cache.get(key)
+    if user is None:
+        user = await User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).afirst()
+        if user is None:
+            return None
+        user_cache.set(key, user)
+    return copy.copy(user)
+
+
+def invalidate_user(user_id: Any) -> None:
+    user_cache.delete(_cache_key(user_id))
+
+
+def _token_user_id(raw_token: str) -> Optional[Any]:
+    try:
+        token = UntypedToken(raw_token)
+    except (InvalidToken, TokenError):
+        return None
+    return token.get(api_settings.USER_ID_CLAIM)
+
+
+def _active(user: Optional[User]) -> Optional[User]:
+    if user is None or (api_settings.CHECK_USER_IS_ACTIVE and not user.is_active):
+        return None
+    return user
+
+
+def user_for_token(raw_token: str) -> Optional[User]:
+    """Resolve a raw access token (as sent on WebSocket connect) to an active
+    user, or ``None`` when the token or the user is not valid."""
+    user_id = _token_user_id(raw_token)
+    return None if user_id is None else _active(cached_user(user_id))
+
+
+async def auser_for_token(raw_token: str) -> Optional[User]:
+    user_id = _token_user_id(raw_token)
+    return None if user_id is None else _active(await acached_user(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` with the user lookup served from ``user_cache``."""
+
+    def _user_id(self, validated_token) -> Any:
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+    def _checked(self, user: Optional[User], validated_token) -> User:
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        return user
+
+    def get_user(self, validated_token):
+        return self._checked(cached_user(self._user_id(validated_token)), validated_token)
+
+    async def aauthenticate(self, request):
+        """``authenticate`` for async views; only the user lookup awaits."""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        user = await acached_user(self._user_id(validated_token))
+        return self._checked(user, validated_token), validated_token
@@ -0,0 +1,52 @@
+"""Small helpers shared by the ``bench_*`` management commands."""
+
+from __future__ import annotations
+
+import statistics
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List
+
+from django.db import transaction
+
+
+class Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rolled_back():
+    """Run the block in a transaction that is always rolled back, so a
+    benchmark can fill tables without leaving rows behind."""
+    try:
+        with transaction.atomic():
+            yield
+            raise Rollback
+    except Rollback:
+        pass
+
+
+def measure(fn: Callable[[], object], repeat: int) -> Dict[str, float]:
+    """Call ``fn`` ``repeat`` times; return per-call timings in milliseconds."""
+    samples: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return summarize(samples)
+
+
+def summarize(samples_ms: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples_ms)
+    return {
+        "mean": statistics.fmean(ordered),
+        "p50": ordered[len(ordered) // 2],
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+    }
+
+
+def format_row(label: str, stats: Dict[str, float]) -> str:
+    return (
+        f"{label:<32} mean={stats['mean']:9.3f}ms "
+        f"p50={stats['p50']:9.3f}ms p95={stats['p95']:9.3f}ms"
+    )
@@ -0,0 +1,148 @@
+"""In-process index of the songs that can be dealt in a game turn.
+
+The index is built once per worker with a single query and dropped by the
+signal handlers in ``ts.signals`` whenever a ``Song`` or ``SongTitle`` row
+changes, so sampling a song for a turn costs no SQL at all. Poster URLs per
+title are kept the same way for the reveal step.
+"""
+
+from __future__ import annotations
+
+import random
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+from django.db import router
+
+from ts.models import Poster, Song, SongTitle
+
+
+@dataclass(frozen=True)
+class CatalogSong:
+    id: int
+    file: str
+    title_id: int
+    title: str
+    album: str
+
+    def to_song(self) -> Song:
+        """Rebuild a ``Song`` (with its ``song_title`` cached) without a query."""
+        db = router.db_for_read(Song)
+        title = SongTitle.from_db(
+            db, ["id", "title", "album"], [self.title_id, self.title, self.album]
+        )
+        song = Song.from_db(
+            db, ["id", "file", "song_title_id"], [self.id, self.file, self.title_id]
+        )
+        song.song_title = title
+        return song
+
+
+class LazyIndex(ABC):
+    """Base for per-worker read-mostly indexes rebuilt on first use.
+
+    Subclasses implement ``_build``; ``version`` is bumped on every
+    invalidation so callers (and tests) can observe cache resets.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+        self.version = 0
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._index = None
+            self.version += 1
+
+    @abstractmethod
+    def _build(self):
+        """Load the index; runs under the lock, once per invalidation."""
+
+    def _load(self):
+        index = self._index
+        if index is not None:
+            return index
+        with self._lock:
+            if self._index is None:
+                self._index = self._build()
+            return self._index
+
+
+_Index = Tuple[List[CatalogSong], Dict[str, List[CatalogSong]]]
+
+
+class SongCatalog(LazyIndex):
+    """Eligible songs, overall and per album. Only songs attached to a
+    ``SongTitle`` are eligible."""
+
+    def _build(self) -> _Index:
+        rows = (
+            Song.objects.filter(song_title__isnull=False)
+            .order_by("id")
+            .values_list(
+                "id", "file", "song_title_id", "song_title__title", "song_title__album"
+            )
+        )
+        songs = [CatalogSong(*row) for row in rows]
+        by_album: Dict[str, List[CatalogSong]] = {}
+        for song in songs:
+            by_album.setdefault(song.album, []).append(song)
+        return songs, by_album
+
+    def __len__(self) -> int:
+        return len(self._load()[0])
+
+    def albums(self) -> Dict[str, int]:
+        return {album: len(songs) for album, songs in self._load()[1].items()}
+
+    def sample(
+        self, album: Optional[str] = None, exclude: Optional[Set[int]] = None
+    ) -> CatalogSong:
+        """Pick a random eligible song, from ``album`` when it has any.
+
+        Song ids in ``exclude`` are avoided for as long as the pool has other
+        songs, which lets a caller deal several turns without repeats.
+        """
+        songs, by_album = self._load()
+        pool = by_album.get(album) if album else None
+        if not pool:
+            pool = songs
+        if not pool:
+            raise Song.DoesNotExist("No song with a title is available.")
+        for _ in range(4):
+            song = pool[random.randrange(len(pool))]
+            if not exclude or song.id not in exclude:
+                return song
+        remaining = [s for s in pool if s.id not in exclude]
+        return random.choice(remaining) if remaining else song
+
+
+class PosterIndex(LazyIndex):
+    """Poster image URLs per ``SongTitle`` id, rebuilt when ``poster_pics``
+    or a ``Poster`` changes."""
+
+    def _build(self) -> Dict[int, List[str]]:
+        storage = Poster._meta.get_field("image").storage
+        rows = SongTitle.poster_pics.through.objects.order_by("id").values_list(
+            "songtitle_id", "poster__image"
+        )
+        urls: Dict[int, List[str]] = {}
+        for title_id, image in rows:
+            if image:
+                urls.setdefault(title_id, []).append(storage.url(image))
+        return urls
+
+    def urls(self, title_id: int) -> List[str]:
+        return self._load().get(title_id, [])
+
+    def choice(self, title_id: int) -> Optional[str]:
+        """A random poster URL for the title, or ``None`` if it has none."""
+        urls = self.urls(title_id)
+        return urls[random.randrange(len(urls))] if urls else None
+
+
+catalog = SongCatalog()
+posters = PosterIndex()
@@ -0,0 +1,112 @@
+"""Wire encodings of the room and lobby sockets, negotiated per connection.
+
+JSON text frames stay the default. A client that offers ``ts.msgpack`` or
+``ts.cbor`` in ``Sec-WebSocket-Protocol`` gets binary MessagePack or CBOR
+frames instead, when ``msgpack`` / ``cbor2`` is installed; they are optional
+dependencies and a codec whose package is missing is simply not offered.
+Clients may always send JSON text frames.
+
+Group broadcasts are encoded once as JSON (``ts.fanout``); a binary connection
+transcodes the frame, and the result is cached per worker so each broadcast is
+transcoded at most once per codec.
+"""
+
+from __future__ import annotations
+
+import functools
+import json
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Union
+
+Frame = Union[str, bytes]
+
+
+@dataclass(frozen=True)
+class Codec:
+    subprotocol: str
+    encode: Callable[[Any], Frame]
+    decode: Callable[[Frame], Any]
+
+    @property
+    def binary(self) -> bool:
+        return self is not JSON
+
+
+JSON = Codec("ts.json", json.dumps, json.loads)
+
+
+def _binary_codecs() -> List[Codec]:
+    codecs = []
+    try:
+        import msgpack
+    except ImportError:
+        pass
+    else:
+        codecs.append(
+            Codec("ts.msgpack", functools.partial(msgpack.packb, use_bin_type=True),
+                  functools.partial(msgpack.unpackb, raw=False))
+        )
+    try:
+        import cbor2
+    except ImportError:
+        pass
+    else:
+        codecs.append(Codec("ts.cbor", cbor2.dumps, cbor2.loads))
+    return codecs
+
+
+CODECS: Dict[str, Codec] = {codec.subprotocol: codec for codec in [JSON, *_binary_codecs()]}
+
+
+def negotiate(subprotocols: List[str]) -> Codec:
+    """The first codec the client offered that this worker supports, else JSON."""
+    for name in subprotocols:
+        if name in CODECS:
+            return CODECS[name]
+    return JSON
+
+
+@functools.lru_cache(maxsize=256)
+def _transcode(subprotocol: str, text: str) -> Frame:
+    return CODECS[subprotocol].encode(json.loads(text))
+
+
+def from_json_text(codec: Codec, text: str) -> Frame:
+    """A JSON-encoded frame in ``codec``."""
+    return text if codec is JSON else _transcode(codec.subprotocol, text)
+
+
+class CodecMixin:
+    """Encoding of an ``AsyncJsonWebsocketConsumer`` chosen at connect."""
+
+    codec: Codec = JSON
+
+    async def websocket_connect(self, message):
+        self.codec = negotiate(self.scope.get("subprotocols") or [])
+        await super().websocket_connect(message)
+
+    async def accept(self, subprotocol=None, headers=None):
+        if subprotocol is None and self.codec.subprotocol in (self.scope.get("subprotocols") or []):
+            subprotocol = self.codec.subprotocol
+        await super().accept(subprotocol=subprotocol, headers=headers)
+
+    async def receive(self, text_data=None, bytes_data=None, **kwargs):
+        if text_data:
+            content = json.loads(text_data)
+        elif bytes_data and self.codec.binary:
+            content = self.codec.decode(bytes_data)
+        else:
+            raise ValueError("No text section for incoming WebSocket frame!")
+        await self.receive_json(content, **kwargs)
+
+    async def send_frame_data(self, frame: Frame, close: bool = False) -> None:
+        if isinstance(frame, bytes):
+            await self.send(bytes_data=frame, close=close)
+        else:
+            await self.send(text_data=frame, close=close)
+
+    async def send_json(self, content, close=False):
+        await self.send_frame_data(self.codec.encode(content), close=close)
+
+    async def send_json_text(self, text: str) -> None:
+        await self.send_frame_data(from_json_text(self.codec, text))
@@ -1,54 +1,73 @@
-from typing import Any, Dict, Optional, Set, List
-import asyncio
+from typing import Any, Dict, Optional, List
 import logging
-import uuid
-from dataclasses import dataclass, field
-from django.utils import timezone
 from .models import RoomStatus
 from channels.generic.websocket import AsyncJsonWebsocketConsumer,AsyncWebsocketConsumer
+from django.core.exceptions import DisallowedHost
+from django.http import HttpRequest
+from rest_framework.exceptions import APIException, ValidationError
+from . import payloads, services
+from .codecs import CodecMixin
+from .db import db_sync_to_async
+from .fanout import TextFrameMixin, group_send_json
+from .limits import RelayLimitsMixin, check_shape
+from .lobby import LOBBY_GROUP, broadcaster
+from .matchmaking import Ticket, bracket_for, match_queue, place_match, recent_score
+from .rooms import LiveRoom, RoomEvent, registry
+from .rounds import ROUND_INPUT_TYPES, RoundEngine
+from .spectators import publish_room, spectator_feed, spectator_group
+from .serializers import GuessSerializer, VersionNumberSerializer
 
 logger = logging.getLogger(__name__)
 
-@dataclass
-class LiveRoom:
-    id: str
-    status: str = RoomStatus.WAITING
-    player_1: Optional[int] = None
-    player_2: Optional[int] = None
-    player_1_score: int = 0
-    player_2_score: int = 0
-    current_song: Optional[int] = None
-    members: Set[str] = field(default_factory=set)
-    created_at: Any = field(default_factory=timezone.now)
-    updated_at: Any = field(default_factory=timezone.now)
-
-    def to_dict(self) -> Dict[str, Any]:
-        status_value = getattr(self.status, "value", self.status)
-        return {
-            "id": self.id,
-            "status": status_value,
-            "player_1": self.player_1,
-            "player_2": self.player_2,
-            "player_1_score": self.player_1_score,
-            "player_2_score": self.player_2_score,
-            "current_song": self.current_song,
-            "members": len(self.members),
-            "created_at": self.created_at.isoformat(),
-            "updated_at": self.updated_at.isoformat(),
-        }
-
-
-class RoomConsumer(AsyncJsonWebsocketConsumer):
+class RoomRegistryMixin:
+    """Consumers of the lobby's rooms. ``as_asgi(room_registry=...)`` binds a
+    registry (tests run two "workers" in one process); otherwise the worker's
+    configured one is used."""
+
+    room_registry = None
+
+    def __init__(self, *args, room_registry=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if room_registry is not None:
+            self.room_registry = room_registry
+
+    @property
+    def rooms(self):
+        return self.room_registry or registry()
+
+
+class RoomConsumer(RoomRegistryMixin, RelayLimitsMixin, CodecMixin, AsyncJsonWebsocketConsumer):
+    """A dual-mode room. Client messages of the types in ``TS_ROOM_RELAYED_TYPES``
+    are relayed to the room within the limits of ``ts.limits``. Frames are
+    JSON unless the client negotiated a binary codec (``ts.codecs``).
+
+    ``ready`` from both players starts the match, which a ``ts.rounds``
+    engine runs; ``pong`` and ``answer`` go to that engine only.
+
+    Once both player slots are taken, anyone else who connects is a
+    spectator: only sent the throttled ``room_view`` of ``ts.spectators`` and
+    unable to send to the room.
+    """
+
     group_name: str
     room_id: str
+    engine_channel: Optional[str] = None
+    spectator = False
+
+    def is_spectator(self, room: LiveRoom) -> bool:
+        user = self.scope.get("user")
+        user_id = getattr(user, "id", None) if getattr(user, "is_authenticated", False) else None
+        return None not in (room.player_1, room.player_2) and user_id not in (room.player_1, room.player_2)
 
     async def connect(self):
         self.room_id = self.scope["url_route"]["kwargs"]["room_id"]
-        self.group_name = f"room_{self.room_id}"
         
         user = self.scope.get("user")
-        print(f"RoomConsumer: connecting to room {self.room_id} for user {getattr(user, 'id', None)}")
-        room_state = await LobbyConsumer.add_member(self.room_id, self.channel_name, user)
+        logger.debug("RoomConsumer: connecting to room %s for user %s", self.room_id, getattr(user, "id", None))
+        joined = await self.rooms.join(self.room_id, self.channel_name, user)
+        room_state = joined.room.to_dict()
+        self.spectator = self.is_spectator(joined.room)
+        self.group_name = spectator_group(self.room_id) if self.spectator else f"room_{self.room_id}"
         
         await self.channel_layer.group_add(self.group_name, self.channel_name)
         await self.accept()
@@ -59,66 +78,84 @@ class RoomConsumer(AsyncJsonWebsocketConsumer):
             "data": room_state
         })
 
-        # Broadcast to room that someone joined
-        user_info = None
-        if user and getattr(user, "is_authenticated", False):
-            user_info = {
-                "id": user.id,
-                "username": user.username,
-                "avatar": getattr(user, "avatar", None) and str(user.avatar.url) or None
-            }
+        if self.spectator:
+            await self.send_json({"type": "room_view", "data": spectator_feed(self.room_id).state})
+        else:
+            # Broadcast to room that someone joined
+            user_info = None
+            if user and getattr(user, "is_authenticated", False):
+                user_info = {
+                    "id": user.id,
+                    "username": user.username,
+                    "avatar": getattr(user, "avatar", None) and str(user.avatar.url) or None
+                }
 
-        await self.channel_layer.group_send(
-            self.group_name,
-            {
-                "type": "broadcast",
-                "message_type": "player_joined",
-                "data": {
-                    "room_id": self.room_id,
-                    "user": user_info
+            await group_send_json(
+                self.channel_layer,
+                self.group_name,
+                {
+                    "type": "player_joined",
+                    "data": {
+                        "room_id": self.room_id,
+                        "user": user_info
+                    },
+                    "sender": "system",
                 },
-                "sender": "system",
-            },
-        )
+            )
 
-        # broadcast updated rooms list to lobby
-        await self.channel_layer.group_send(
-            LobbyConsumer.group_name,
-            {
-                "type": "broadcast",
-                "message_type": "rooms",
-                "data": await LobbyConsumer.snapshot_rooms(),
-            },
-        )
+        # tell the lobby and the spectators what changed
+        await LobbyConsumer.publish(self.rooms, self.channel_layer, [joined])
+        await publish_room(self.channel_layer, joined)
 
     async def disconnect(self, code: int):
+        self.stop_frames()
         await self.channel_layer.group_discard(self.group_name, self.channel_name)
         # update lobby registry and broadcast
-        await LobbyConsumer.remove_member(self.room_id, self.channel_name)
+        left = await self.rooms.leave(self.room_id, self.channel_name)
         
         # Broadcast to room that someone left
-        await self.channel_layer.group_send(
-            self.group_name,
-            {
-                "type": "broadcast",
-                "message_type": "player_left",
-                "data": {"room_id": self.room_id},
-                "sender": "system",
-            },
-        )
+        if not self.spectator:
+            await group_send_json(
+                self.channel_layer,
+                self.group_name,
+                {
+                    "type": "player_left",
+                    "data": {"room_id": self.room_id},
+                    "sender": "system",
+                },
+            )
 
-        await self.channel_layer.group_send(
-            LobbyConsumer.group_name,
-            {
-                "type": "broadcast",
-                "message_type": "rooms",
-                "data": await LobbyConsumer.snapshot_rooms(),
-            },
-        )
+        if left is not None:
+            await LobbyConsumer.publish(self.rooms, self.channel_layer, [left])
+            await publish_room(self.channel_layer, left)
+
+    async def receive(self, text_data=None, bytes_data=None, **kwargs):
+        error = self.check_frame(text_data, bytes_data)
+        if error is not None:
+            await self.send_json(error)
+            return
+        await super().receive(text_data=text_data, bytes_data=bytes_data, **kwargs)
 
-    async def receive_json(self, content: Dict[str, Any], **kwargs: Any):
-        print("Received message:", content)
+    async def receive_json(self, content: Any, **kwargs: Any):
+        error = check_shape(content)
+        if error is not None:
+            await self.send_json(error)
+            return
         message_type: str = str(content.get("type", "message"))
+        if self.spectator:
+            await self.send_json({"type": "error", "data": {"code": "spectator", "detail": "Spectators cannot send to the room."}})
+            return
+        if message_type == "ready" or message_type in ROUND_INPUT_TYPES:
+            error = self.check_rate()
+            if error is None:
+                error = await self.match_input(message_type, content.get("data") or {})
+            if error is not None:
+                await self.send_json(error)
+            return
+        error = self.check_message(message_type)
+        if error is not None:
+            await self.send_json(error)
+            return
         data: Dict[str, Any] = content.get("data", {}) or {}
         sender: Optional[int] = None
         user = self.scope.get("user")
@@ -126,135 +163,115 @@ class RoomConsumer(AsyncJsonWebsocketConsumer):
             sender = getattr(user, "id", None)
 
         # Broadcast to room group
-        await self.channel_layer.group_send(
+        await group_send_json(
+            self.channel_layer,
             self.group_name,
-            {
-                "type": "broadcast",  # maps to self.broadcast
-                "message_type": message_type,
-                "data": data,
-                "sender": sender,
-            },
+            {"type": message_type, "data": data, "sender": sender},
         )
 
+    async def match_input(self, message_type: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        user = self.scope.get("user")
+        if not (user and getattr(user, "is_authenticated", False)):
+            return {"type": "error", "data": {"code": "not_a_player", "detail": "Only players take part in the match."}}
+        if message_type != "ready":
+            if self.engine_channel is not None:
+                await self.channel_layer.send(
+                    self.engine_channel,
+                    {"type": "round.input", "user": user.id, "message_type": message_type, "data": data},
+                )
+            return None
+
+        event = await self.rooms.ready(self.room_id, user.id)
+        if event is None:
+            return {"type": "error", "data": {"code": "cannot_start", "detail": "The match cannot be started."}}
+        await group_send_json(
+            self.channel_layer, self.group_name, {"type": "room_state", "data": event.room.to_dict()}
+        )
+        await LobbyConsumer.publish(self.rooms, self.channel_layer, [event])
+        await publish_room(self.channel_layer, event)
+        if event.room.status == RoomStatus.IN_GAME:
+            # only the second ready sees the room go in game
+            engine = RoundEngine(event.room, self.channel_layer, self.rooms, context=_socket_context(self.scope))
+            await engine.start()
+        return None
+
+    async def text_frame(self, event: Dict[str, Any]):
+        await self.send_frame(event["text"])
+
+    async def round_frame(self, event: Dict[str, Any]):
+        self.engine_channel = event["engine"]
+        await self.send_frame(event["text"])
+
     async def broadcast(self, event: Dict[str, Any]):
-        await self.send_json(
-            {
-                "type": event.get("message_type", "message"),
-                "data": event.get("data", {}),
-                "sender": event.get("sender"),
-            }
+        await self.send_frame(
+            await self.encode_json(
+                {
+                    "type": event.get("message_type", "message"),
+                    "data": event.get("data", {}),
+                    "sender": event.get("sender"),
+                }
+            )
         )
 
 
-class LobbyConsumer(AsyncJsonWebsocketConsumer):
-
-    LIVE_ROOMS: Dict[str, LiveRoom] = {}
-    LIVE_ROOMS_LOCK = asyncio.Lock()
-
-    group_name = "lobby"
-
-    @classmethod
-    async def create_room(cls, *, player_1: Optional[int] = None) -> LiveRoom:
-        async with cls.LIVE_ROOMS_LOCK:
-            # 8-char random id; retry if collision
-            room_id = uuid.uuid4().hex[:8]
-            while room_id in cls.LIVE_ROOMS:
-                room_id = uuid.uuid4().hex[:8]
-            room = LiveRoom(id=room_id, player_1=player_1)
-            cls.LIVE_ROOMS[room_id] = room
-            return room
-
-    @classmethod
-    async def add_member(cls, room_id: str, channel_name: str, user: Any = None) -> Dict[str, Any]:
-        async with cls.LIVE_ROOMS_LOCK:
-            room = cls.LIVE_ROOMS.get(room_id)
-            if room is None:
-                # create adhoc room if joined directly by id
-                room = LiveRoom(id=room_id)
-                cls.LIVE_ROOMS[room_id] = room
-                logger.info(f"Created adhoc room {room_id}")
-            room.members.add(channel_name)
-            room.updated_at = timezone.now()
-            logger.info(f"Room {room_id}: member {channel_name} joined. Members count: {len(room.members)}")
+class LobbyConsumer(RoomRegistryMixin, CodecMixin, TextFrameMixin, AsyncJsonWebsocketConsumer):
+    """Room list for the lobby page.
 
-            if user and getattr(user, "is_authenticated", False):
-                # Assign slots
-                if room.player_1 == user.id:
-                    pass
-                elif room.player_2 == user.id:
-                    pass
-                elif room.player_1 is None:
-                    room.player_1 = user.id
-                elif room.player_2 is None:
-                    room.player_2 = user.id
-            
-            return room.to_dict()
-
-    @classmethod
-    async def remove_member(cls, room_id: str, channel_name: str) -> None:
-        async with cls.LIVE_ROOMS_LOCK:
-            room = cls.LIVE_ROOMS.get(room_id)
-            if room is None:
-                logger.warning(f"Attempted to remove member from non-existent room {room_id}")
-                return
-            room.members.discard(channel_name)
-            room.updated_at = timezone.now()
-            logger.info(f"Room {room_id}: member {channel_name} left. Members count: {len(room.members)}")
-            # delete room if empty
-            if not room.members:
-                del cls.LIVE_ROOMS[room_id]
-                logger.info(f"Room {room_id} deleted because it is empty.")
-
-    @classmethod
-    async def snapshot_rooms(cls) -> List[Dict[str, Any]]:
-        async with cls.LIVE_ROOMS_LOCK:
-            # Cleanup empty rooms (zombies or just emptied)
-            now = timezone.now()
-            to_delete = []
-            for rid, room in cls.LIVE_ROOMS.items():
-                if not room.members:
-                    # If empty, check age. 
-                    # Give 10s grace period for creator to connect.
-                    if (now - room.updated_at).total_seconds() > 10:
-                        to_delete.append(rid)
-            
-            for rid in to_delete:
-                del cls.LIVE_ROOMS[rid]
-                logger.info(f"Deleted empty/zombie room {rid} during snapshot")
-
-            return [room.to_dict() for room in cls.LIVE_ROOMS.values()]
+    A client gets ``{"type": "rooms", "seq": n, "data": [...]}`` on connect
+    and then one ``room_added`` / ``room_updated`` / ``room_removed`` message
+    per change, each with the next ``seq``. During bursts changes are
+    coalesced into ``room_events`` messages covering ``from_seq``..``seq``
+    (see ``ts.lobby``). Events with ``seq`` up to the snapshot's are already
+    included in it; a client that sees a gap sends ``{"type": "snapshot"}`` to
+    get the full list again.
+
+    Connections with a binary codec get the snapshot as a table,
+    ``{"type": "rooms", "seq": n, "fields": [...], "rows": [[...], ...]}``,
+    instead of repeating every key for every room.
+    """
+
+    group_name = LOBBY_GROUP
+
+    @staticmethod
+    async def snapshot_message(rooms, compact: bool = False) -> Dict[str, Any]:
+        seq, live_rooms = await rooms.snapshot()
+        data = [room.to_dict() for room in live_rooms]
+        if not compact:
+            return {"type": "rooms", "seq": seq, "data": data}
+        fields = list(data[0]) if data else []
+        return {"type": "rooms", "seq": seq, "fields": fields, "rows": [list(row.values()) for row in data]}
+
+    @staticmethod
+    async def publish(rooms, channel_layer, events: List[RoomEvent]) -> None:
+        await broadcaster(rooms).publish(channel_layer, events)
 
     async def connect(self):
-        print("Lobby sent initial rooms snapshot:")
         await self.channel_layer.group_add(self.group_name, self.channel_name)
         await self.accept()
-        # send current rooms list to the newly connected lobby client
-        rooms = await self.snapshot_rooms()
-        await self.send_json({"type": "rooms", "data": rooms})
-        # log the snapshot on first connect
-        logger.info("Lobby initial rooms snapshot on connect: %s", rooms)
+        snapshot = await self.snapshot_message(self.rooms, compact=self.codec.binary)
+        await self.send_json(snapshot)
+        logger.info(
+            "Lobby initial rooms snapshot on connect: seq=%s rooms=%s",
+            snapshot["seq"], len(snapshot.get("rows", snapshot.get("data", []))),
+        )
 
     async def disconnect(self, code: int):
         await self.channel_layer.group_discard(self.group_name, self.channel_name)
 
-    async def receive_json(self, content: Dict[str, Any], **kwargs: Any):
-        print("Lobby received message:", content)
+    async def receive_json(self, content: Any, **kwargs: Any):
+        error = check_shape(content)
+        if error is not None:
+            await self.send_json(error)
+            return
         message_type: str = str(content.get("type", ""))
         if message_type == "create_room":
             user = self.scope.get("user")
             user_id = getattr(user, "id", None) if getattr(user, "is_authenticated", False) else None
-            room = await self.create_room(player_1=user_id)
-            await self.send_json({"type": "room_created", "data": room.to_dict()})
-            await self.channel_layer.group_send(
-                self.group_name,
-                {
-                    "type": "broadcast",
-                    "message_type": "rooms",
-                    "data": await self.snapshot_rooms(),
-                },
-            )
-        else:
-            pass
+            created = await self.rooms.create(player_1=user_id)
+            await self.send_json({"type": "room_created", "data": created.room.to_dict()})
+            await self.publish(self.rooms, self.channel_layer, [created])
+        elif message_type == "snapshot":
+            await self.send_json(await self.snapshot_message(self.rooms, compact=self.codec.binary))
 
     async def broadcast(self, event: Dict[str, Any]):
         await self.send_json(
@@ -265,6 +282,154 @@ class LobbyConsumer(AsyncJsonWebsocketConsumer):
         )
 
 
+class MatchmakingConsumer(RoomRegistryMixin, CodecMixin, AsyncJsonWebsocketConsumer):
+    """Quick match (``ts.matchmaking``). An authenticated client is queued on
+    connect and told ``{"type": "queued", "data": {"bracket": n}}``; once
+    paired it gets ``{"type": "match_found", "data": <room>}`` and joins that
+    room's socket, or a ``match_failed`` error and a close if the room could not
+    be opened. Closing the socket before that leaves the queue."""
+
+    match_queue = None
+    ticket: Optional[Ticket] = None
+
+    def __init__(self, *args, match_queue=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if match_queue is not None:
+            self.match_queue = match_queue
+
+    @property
+    def queue(self):
+        return self.match_queue or match_queue()
+
+    async def connect(self):
+        user = self.scope.get("user")
+        if not (user and getattr(user, "is_authenticated", False)):
+            await self.close(code=4401)
+            return
+        await self.accept()
+        bracket = bracket_for(await recent_score(user.id))
+        self.ticket = Ticket(user.id, self.channel_name)
+        await self.send_json({"type": "queued", "data": {"bracket": bracket}})
+        pair = await self.queue.enqueue(self.ticket, bracket)
+        if pair is not None:
+            await place_match(*pair, self.rooms, self.channel_layer)
+
+    async def disconnect(self, code: int):
+        if self.ticket is not None:
+            await self.queue.cancel(self.ticket)
+
+    async def match_found(self, event: Dict[str, Any]):
+        self.ticket = None
+        await self.send_json({"type": "match_found", "data": event["room"]})
+
+    async def match_failed(self, event: Dict[str, Any]):
+        # no longer queued; the client reconnects to queue again
+        self.ticket = None
+        await self.send_json({"type": "error", "data": {"code": "match_failed", "detail": "The match could not be started."}})
+        await self.close()
+
+
+class SocketRequest(HttpRequest):
+    """A socket's handshake as an ``HttpRequest``: serializers build absolute
+    URLs from its host and scheme, as they do for REST requests."""
+
+    def __init__(self, scope: Dict[str, Any]):
+        super().__init__()
+        for name, value in scope.get("headers", []):
+            self.META["HTTP_" + name.decode("latin1").upper().replace("-", "_")] = value.decode("latin1")
+        if scope.get("server"):
+            self.META["SERVER_NAME"], self.META["SERVER_PORT"] = scope["server"][0], str(scope["server"][1])
+        self._scheme = "https" if scope.get("scheme") in ("wss", "https") else "http"
+
+    def _get_scheme(self) -> str:
+        return self._scheme
+
+
+def _socket_context(scope: Dict[str, Any]) -> Dict[str, Any]:
+    request = SocketRequest(scope)
+    try:
+        request.get_host()
+    except (DisallowedHost, KeyError):
+        # no usable host: URLs stay relative
+        return {}
+    return {"request": request}
+
+
+def _game_payload(message_type: str, user: Any, data: Dict[str, Any], context: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one single-player action through ``ts.services``; the payloads
+    are the REST actions' (``ts.payloads``)."""
+    if message_type == "start":
+        return payloads.start_payload(services.start_session(user), context)
+
+    session_id = data.get("session")
+    if not isinstance(session_id, int):
+        raise ValidationError({"session": ["A session id is required."]})
+
+    if message_type in ("guess", "guess_and_advance"):
+        serializer = GuessSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        args = dict(serializer.validated_data, session_id=session_id, user=user)
+        if message_type == "guess":
+            return payloads.guess_payload(*services.submit_guess(**args), context)
+        return payloads.guess_and_advance_payload(*services.guess_and_advance(**args), context)
+
+    serializer = VersionNumberSerializer(data=data)
+    serializer.is_valid(raise_exception=True)
+    version = serializer.validated_data["version"]
+    if message_type == "next":
+        return payloads.next_turn_payload(*services.handle_next(session_id, version, user), context)
+    return payloads.end_session_payload(*services.end_session(session_id, version, user), context)
+
+
+class GameSessionConsumer(AsyncJsonWebsocketConsumer):
+    """Single-player game over one socket, authenticated once at connect.
+
+    Client messages are ``{"type": <action>, "data": {...}, "ref": <any>}``
+    with the same fields as the REST bodies plus ``session``. The reply has
+    the same ``type`` and ``ref`` and the REST payload as ``data``; failures
+    reply ``{"type": "error", "data": {"code", "detail"}, "ref"}``. Replies to
+    ``start`` and ``next`` carry the full preloaded turn so the client can
+    load its audio while the current one plays. Song URLs are absolute, built
+    from the handshake's host and scheme like REST builds them from the
+    request's.
+    """
+
+    actions = ("start", "guess", "guess_and_advance", "next", "end")
+
+    async def connect(self):
+        user = self.scope.get("user")
+        if not (user and getattr(user, "is_authenticated", False)):
+            await self.close(code=4401)
+            return
+        self.context = _socket_context(self.scope)
+        await self.accept()
+
+    async def receive_json(self, content: Any, **kwargs: Any):
+        error = check_shape(content)
+        if error is not None:
+            await self.send_json(error)
+            return
+        message_type = str(content.get("type", ""))
+        data = content.get("data") or {}
+        reply: Dict[str, Any] = {"type": message_type}
+        if message_type not in self.actions:
+            reply = {"type": "error", "data": {"code": "unknown_type", "detail": f"Unknown message type: {message_type}"}}
+        else:
+            try:
+                reply["data"] = await db_sync_to_async(_game_payload)(
+                    message_type, self.scope["user"], data, self.context
+                )
+            except APIException as exc:
+                reply = {"type": "error", "data": {"code": exc.get_codes(), "detail": exc.detail}}
+            except Exception:
+                # keep the socket open, as a failed REST request leaves the client's other requests alone
+                logger.exception("Game socket action %s failed", message_type)
+                reply = {"type": "error", "data": {"code": "server_error", "detail": "A server error occurred."}}
+        if "ref" in content:
+            reply["ref"] = content["ref"]
+        await self.send_json(reply)
+
+
 # class LobbyConsumer(AsyncWebsocketConsumer):
 #     async def connect(self):
 #         logger.info("hello worlds")
@@ -0,0 +1,64 @@
+"""Database access from the WebSocket stack.
+
+Channels' ``database_sync_to_async`` is thread-sensitive: every call from every
+consumer of a worker runs on one shared thread, one after another. Lookups
+that have an async ORM form (``afirst``, ``aget``, ``acreate``, ``async for``)
+use it instead, and cache hits never leave the event loop. What stays sync,
+such as the transactional game services, runs through ``db_sync_to_async`` on
+a pool of ``TS_DB_THREADS`` threads, which also bounds the number of database
+connections the sockets of one worker hold. ``db_pool.stats()`` shows how
+saturated that pool is.
+"""
+
+from __future__ import annotations
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+
+
+class BoundedExecutor(ThreadPoolExecutor):
+    """A thread pool that counts running and queued calls."""
+
+    def __init__(self, max_workers: int, **kwargs):
+        super().__init__(max_workers=max_workers, **kwargs)
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.pending = 0
+        self.peak_pending = 0
+
+    def submit(self, fn, /, *args, **kwargs):
+        def run():
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.pending -= 1
+
+        with self._lock:
+            self.submitted += 1
+            self.pending += 1
+            self.peak_pending = max(self.peak_pending, self.pending)
+        return super().submit(run)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "submitted": self.submitted,
+                # running plus waiting for a thread
+                "pending": self.pending,
+                "peak_pending": self.peak_pending,
+            }
+
+
+db_pool = BoundedExecutor(getattr(settings, "TS_DB_THREADS", 8), thread_name_prefix="ts-db")
+
+
+def db_sync_to_async(fn: Callable) -> Callable:
+    """``database_sync_to_async`` on ``db_pool`` instead of the shared thread."""
+    return database_sync_to_async(fn, thread_sensitive=False, executor=db_pool)
@@ -0,0 +1,86 @@
+"""Wrong-answer options for a turn, sampled from memory.
+
+Every title gets a candidate pool made of shared buckets: the titles of the
+same album and the titles of similar length. Distractors are drawn round-robin
+over those tiers (then the whole title list), so one turn mixes a hard,
+same-album option with easier ones, and sampling ``k`` options is O(k).
+"""
+
+from __future__ import annotations
+
+import random
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from ts.catalog import LazyIndex
+from ts.models import SongTitle
+
+LENGTH_BUCKET_WIDTH = 4
+
+_Index = Tuple[List[str], Dict[str, Tuple[List[str], List[str]]]]
+
+
+def _length_bucket(title: str) -> int:
+    return len(title) // LENGTH_BUCKET_WIDTH
+
+
+class DistractorEngine(LazyIndex):
+    def __init__(self, titles: Optional[Sequence[Tuple[str, str]]] = None):
+        """``titles`` is a list of ``(title, album)`` pairs; by default they are
+        loaded from ``SongTitle`` on first use."""
+        super().__init__()
+        self._titles = titles
+
+    def _build(self) -> _Index:
+        rows = self._titles
+        if rows is None:
+            rows = SongTitle.objects.order_by("id").values_list("title", "album")
+        rows = list(rows)
+        by_album: Dict[str, List[str]] = {}
+        by_length: Dict[int, List[str]] = {}
+        for title, album in rows:
+            by_album.setdefault(album, []).append(title)
+            by_length.setdefault(_length_bucket(title), []).append(title)
+        titles = [title for title, _ in rows]
+        pools = {
+            title: (by_album[album], by_length[_length_bucket(title)])
+            for title, album in rows
+        }
+        return titles, pools
+
+    def pool(self, title: str) -> List[str]:
+        """All candidates that the tiered draw can pick for ``title``."""
+        _, pools = self._load()
+        same_album, same_length = pools.get(title, ([], []))
+        return sorted({t for t in same_album + same_length if t != title})
+
+    def sample(self, correct_title: str, k: int = 3) -> List[str]:
+        titles, pools = self._load()
+        tiers = [*pools.get(correct_title, ()), titles]
+        picked: List[str] = []
+        seen = {correct_title}
+        while len(picked) < k and tiers:
+            for tier in list(tiers):
+                choice = self._draw(tier, seen)
+                if choice is None:
+                    tiers.remove(tier)
+                    continue
+                picked.append(choice)
+                seen.add(choice)
+                if len(picked) == k:
+                    break
+        return picked
+
+    @staticmethod
+    def _draw(tier: List[str], seen: set) -> Optional[str]:
+        # Rejection sampling stays O(1) expected while the tier is much larger
+        # than what has been picked; tiny tiers are scanned instead.
+        if len(tier) > 2 * len(seen):
+            for _ in range(8):
+                choice = tier[random.randrange(len(tier))]
+                if choice not in seen:
+                    return choice
+        remaining = [t for t in tier if t not in seen]
+        return random.choice(remaining) if remaining else None
+
+
+distractors = DistractorEngine()
@@ -29,4 +29,16 @@ class OptionInvalid(APIException):
 class TurnAlreadyAnswered(APIException):
     status_code = status.HTTP_409_CONFLICT
     default_detail = "Turn already answered."
-    default_code = "turn_already_answered"
\ No newline at end of file
+    default_code = "turn_already_answered"
+
+
+class SessionNotFound(APIException):
+    status_code = status.HTTP_404_NOT_FOUND
+    default_detail = "Session not found."
+    default_code = "not_found"
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = "Idempotency-Key was already used with a different request body."
+    default_code = "idempotency_key_reused"
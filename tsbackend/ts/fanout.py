@@ -0,0 +1,75 @@
+"""Group broadcasts encoded once instead of once per recipient.
+
+A ``group_send`` of a dict makes every consumer in the group run ``send_json``,
+that is one ``json.dumps`` of the same payload per member. ``group_send_json``
+encodes the payload when it is sent and every member only forwards the text
+frame (``TextFrameMixin.text_frame``).
+
+``TickedSender`` is the throttle of broadcasts that only need the newest state
+(the lobby's room list, the spectators' view of a room): the first change
+after a quiet period is sent at once, later ones when the tick ends.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
+
+
+def encode(payload: Dict[str, Any]) -> str:
+    # the encoding of AsyncJsonWebsocketConsumer.encode_json
+    return json.dumps(payload)
+
+
+def text_frame_message(payload: Dict[str, Any]) -> Dict[str, Any]:
+    return {"type": "text_frame", "text": encode(payload)}
+
+
+async def group_send_json(channel_layer, group: str, payload: Dict[str, Any]) -> None:
+    await channel_layer.group_send(group, text_frame_message(payload))
+
+
+class TextFrameMixin:
+    """Consumers receiving ``group_send_json`` broadcasts. ``send_json_text``
+    is overridden by ``ts.codecs.CodecMixin`` for binary connections."""
+
+    async def text_frame(self, event: Dict[str, Any]):
+        await self.send_json_text(event["text"])
+
+    async def send_json_text(self, text: str) -> None:
+        await self.send(text_data=text)
+
+
+class TickedSender(ABC):
+    """Calls ``flush`` at most once per ``tick_ms``. Subclasses hold what
+    changed, call ``_schedule`` after every change and reset ``_last_flush``
+    in ``flush``."""
+
+    tick_ms: float = 0
+    _last_flush = float("-inf")
+    _timer: Optional[asyncio.Task] = None
+
+    def _timer_pending(self) -> bool:
+        timer = self._timer
+        # a timer left over from a closed event loop never fires
+        return timer is not None and not timer.done() and timer.get_loop() is asyncio.get_running_loop()
+
+    async def _schedule(self) -> None:
+        if self._timer_pending():
+            return
+        wait = self._last_flush + self.tick_ms / 1000 - time.monotonic()
+        if wait <= 0:
+            await self.flush()
+        else:
+            self._timer = asyncio.create_task(self._flush_later(wait))
+
+    async def _flush_later(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        await self.flush()
+
+    @abstractmethod
+    async def flush(self) -> None:
+        """Send what changed since the previous flush."""
@@ -0,0 +1,87 @@
+"""Replay of game action responses for retried requests.
+
+A client may send an ``Idempotency-Key`` header with ``guess``,
+``guess-and-advance``, ``next-turn`` or ``end-session``. The first successful
+response is stored per user, session, action and key; a retry with the same
+key gets that response back without the service function running again (and
+so without a ``VersionConflict``).
+
+``replay_cache`` is a ``TTLCache`` in the worker process. A retry that a load
+balancer sends to another worker is not recognised; it runs the action again
+and gets the ``VersionConflict``.
+
+A digest of the request body is stored with the response. Reusing a key with
+a different body is a client bug, answered with 422 rather than a replay of
+the other request's response.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from functools import wraps
+from typing import Any, Hashable, Optional, Tuple
+
+from django.conf import settings
+from rest_framework.response import Response
+
+from .caching import TTLCache
+from .exceptions import IdempotencyKeyReused
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+replay_cache = TTLCache(
+    max_entries=getattr(settings, "TS_IDEMPOTENCY_MAX_ENTRIES", 10000),
+    ttl=getattr(settings, "TS_IDEMPOTENCY_TTL_SECS", 300),
+)
+
+
+def body_digest(data: Any) -> str:
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def replayed(cache_key: Hashable, data: Any) -> Optional[Tuple[Any, int]]:
+    """The stored ``(response data, status)`` for ``cache_key``, if any.
+
+    Raises ``IdempotencyKeyReused`` when it was stored for another body.
+    """
+    cached = replay_cache.get(cache_key)
+    if cached is None:
+        return None
+    response_data, status_code, digest = cached
+    if digest != body_digest(data):
+        raise IdempotencyKeyReused()
+    return response_data, status_code
+
+
+def remember(cache_key: Hashable, data: Any, response_data: Any, status_code: int) -> None:
+    replay_cache.set(cache_key, (response_data, status_code, body_digest(data)))
+
+
+def idempotent(action_name: str):
+    """Decorate a detail action of ``GameSessionViewSet``."""
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(self, request, pk, *args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if not key:
+                return view(self, request, pk, *args, **kwargs)
+
+            cache_key = (request.user.pk, str(pk), action_name, key)
+            cached = replayed(cache_key, request.data)
+            if cached is not None:
+                data, status_code = cached
+                response = Response(data, status=status_code)
+                response[REPLAYED_HEADER] = "true"
+                return response
+
+            response = view(self, request, pk, *args, **kwargs)
+            if 200 <= response.status_code < 300:
+                remember(cache_key, request.data, response.data, response.status_code)
+            return response
+
+        return wrapper
+
+    return decorator
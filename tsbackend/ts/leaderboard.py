@@ -0,0 +1,176 @@
+"""Weekly leaderboard of best finished sessions.
+
+``WeeklyScore`` holds one row per user and ISO week, upserted when a session
+ends, so the board ranks players rather than sessions: a user with several
+high games appears once, with the best of them. Each worker keeps a sorted
+copy of a week's rows so the top-N and a player's rank are answered with a
+binary search; the copy is reloaded from the table after
+``TS_LEADERBOARD_TTL_SECS`` to pick up other workers' writes. Recording a
+score finds its place by binary search too, but inserting into the list (and
+removing the player's previous entry) shifts the entries after it, which is
+O(n) moves: one ``memmove`` of pointers, cheap for a week's few thousand
+players.
+"""
+
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.models import CustomUser as User
+from ts.models import GameSession, GameSessionStatus, WeeklyScore
+
+_Key = Tuple[int, float, int]
+
+
+def iso_week(moment: Optional[datetime] = None) -> str:
+    year, week, _ = timezone.localtime(moment).isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def week_bounds(week: str) -> Tuple[datetime, datetime]:
+    year, number = week.split("-W")
+    start = timezone.make_aware(datetime.fromisocalendar(int(year), int(number), 1))
+    end = timezone.make_aware(datetime.fromisocalendar(int(year), int(number), 7))
+    return start, end.replace(hour=23, minute=59, second=59, microsecond=999999)
+
+
+def _key(user_id: int, score: int, ended_at: datetime) -> _Key:
+    # best score first; ties go to the most recent session, as before
+    return (-score, -ended_at.timestamp(), user_id)
+
+
+class WeekBoard:
+    def __init__(self, rows):
+        self._by_user: Dict[int, _Key] = {}
+        for user_id, score, ended_at in rows:
+            self._by_user[user_id] = _key(user_id, score, ended_at)
+        self._keys: List[_Key] = sorted(self._by_user.values())
+        self.loaded_at = time.monotonic()
+
+    def offer(self, user_id: int, score: int, ended_at: datetime) -> None:
+        key = _key(user_id, score, ended_at)
+        old = self._by_user.get(user_id)
+        if old is not None:
+            if old <= key:
+                return
+            del self._keys[bisect.bisect_left(self._keys, old)]
+        self._by_user[user_id] = key
+        bisect.insort(self._keys, key)
+
+    def top(self, n: int) -> List[Tuple[int, int]]:
+        return [(-key[0], key[2]) for key in self._keys[:n]]
+
+    def rank(self, user_id: int) -> Optional[Tuple[int, int]]:
+        """``(rank, score)`` of the user's best session this week, 1-based."""
+        key = self._by_user.get(user_id)
+        if key is None:
+            return None
+        return bisect.bisect_left(self._keys, key) + 1, -key[0]
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+class Leaderboard:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._boards: Dict[str, WeekBoard] = {}
+
+    def board(self, week: str) -> WeekBoard:
+        ttl = getattr(settings, "TS_LEADERBOARD_TTL_SECS", 30)
+        board = self._boards.get(week)
+        if board is None or time.monotonic() - board.loaded_at > ttl:
+            rows = WeeklyScore.objects.filter(week=week).values_list(
+                "user_id", "score", "ended_at"
+            )
+            board = WeekBoard(rows)
+            with self._lock:
+                # keep at most the current week and the one just asked for
+                current = iso_week()
+                self._boards = {w: b for w, b in self._boards.items() if w == current}
+                self._boards[week] = board
+        return board
+
+    def invalidate(self, week: Optional[str] = None) -> None:
+        with self._lock:
+            if week is None:
+                self._boards = {}
+            else:
+                self._boards.pop(week, None)
+
+    def _offer(self, week: str, user_id: int, score: int, ended_at: datetime) -> None:
+        board = self._boards.get(week)
+        if board is not None:
+            with self._lock:
+                board.offer(user_id, score, ended_at)
+
+    def record(self, session: GameSession) -> None:
+        """Upsert the user's best score of the week the session ended in.
+
+        Call inside the transaction that ends the session; the in-memory board
+        only sees the score once that transaction commits.
+        """
+        week = iso_week(session.ended_at)
+        better = Q(score__lt=session.score) | Q(score=session.score, ended_at__lt=session.ended_at)
+        values = {"session": session, "score": session.score, "ended_at": session.ended_at}
+        updated = (
+            WeeklyScore.objects.filter(week=week, user_id=session.user_id)
+            .filter(better)
+            .update(**values)
+        )
+        if not updated:
+            WeeklyScore.objects.get_or_create(
+                week=week, user_id=session.user_id, defaults=values
+            )
+        transaction.on_commit(
+            lambda: self._offer(week, session.user_id, session.score, session.ended_at)
+        )
+
+    def top(self, n: int, week: Optional[str] = None) -> List[Tuple[int, User]]:
+        board = self.board(week or iso_week())
+        with self._lock:
+            entries = board.top(n)
+        users = User.objects.prefetch_related("groups").in_bulk(
+            [user_id for _, user_id in entries]
+        )
+        return [(score, users[user_id]) for score, user_id in entries if user_id in users]
+
+    def rank(self, user_id: int, week: Optional[str] = None) -> Optional[Tuple[int, int]]:
+        board = self.board(week or iso_week())
+        with self._lock:
+            return board.rank(user_id)
+
+
+def rebuild_week(week: str) -> int:
+    """Recompute a week's ``WeeklyScore`` rows from ``GameSession`` history."""
+    start, end = week_bounds(week)
+    sessions = (
+        GameSession.objects.filter(
+            status=GameSessionStatus.ENDED, ended_at__range=(start, end)
+        )
+        .order_by("user_id", "-score", "-ended_at")
+        .values_list("id", "user_id", "score", "ended_at")
+    )
+    best: Dict[int, WeeklyScore] = {}
+    for session_id, user_id, score, ended_at in sessions.iterator():
+        if user_id not in best:
+            best[user_id] = WeeklyScore(
+                week=week, user_id=user_id, session_id=session_id, score=score, ended_at=ended_at
+            )
+    with transaction.atomic():
+        WeeklyScore.objects.filter(week=week).delete()
+        WeeklyScore.objects.bulk_create(best.values(), batch_size=1000)
+    leaderboard.invalidate(week)
+    return len(best)
+
+
+leaderboard = Leaderboard()
@@ -0,0 +1,132 @@
+"""Per-connection limits for sockets whose messages are relayed to a group.
+
+``RoomConsumer`` forwards client messages to everyone in the room, so one
+client could flood the room and the channel layer. Incoming frames larger than
+``TS_ROOM_MAX_FRAME_BYTES``, of a type outside ``TS_ROOM_RELAYED_TYPES`` or
+beyond the connection's token bucket (``TS_ROOM_RATE_PER_SEC`` with bursts of
+``TS_ROOM_RATE_BURST``) are refused with an error reply instead of relayed.
+``check_shape`` refuses messages that are not objects with object ``data``;
+the lobby and game sockets use it too.
+
+Outgoing group frames go through a queue of ``TS_ROOM_OUTBOUND_QUEUE`` frames
+per connection. When a slow client lets it fill up, new frames are dropped or,
+with ``TS_ROOM_SLOW_CONSUMER_POLICY = "disconnect"``, the socket is closed.
+The queue only sees backpressure the server's ``send`` applies: Daphne's
+returns once the frame is handed to Twisted, whose write buffer grows without
+bound, so there a slow client rarely fills the queue and is not detected.
+``relay_stats`` counts what was relayed, refused, dropped and closed in this
+worker.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import Counter
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+
+# close code for clients that do not keep up with their room
+SLOW_CONSUMER_CLOSE_CODE = 4408
+
+relay_stats: "Counter[str]" = Counter()
+
+
+class TokenBucket:
+    """``rate`` tokens per second, holding at most ``burst``."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+def _error(code: str, detail: str) -> Dict[str, Any]:
+    return {"type": "error", "data": {"code": code, "detail": detail}}
+
+
+def check_shape(content: Any) -> Optional[Dict[str, Any]]:
+    """The error for a decoded client message that is not ``{"type", "data"}``
+    with an object (or nothing) as ``data``, as every socket expects."""
+    if not isinstance(content, dict) or not isinstance(content.get("data") or {}, dict):
+        relay_stats["malformed"] += 1
+        return _error("bad_message", "Messages are objects with an object as data.")
+    return None
+
+
+class RelayLimitsMixin:
+    """For ``AsyncJsonWebsocketConsumer`` subclasses that relay client messages.
+
+    ``check_frame``, ``check_message`` and ``check_rate`` return the error to
+    reply with, or ``None`` when the message may be relayed; ``send_frame`` queues a JSON
+    group frame for this client, written with ``send_json_text``.
+    """
+
+    _bucket: Optional[TokenBucket] = None
+    _outbox: Optional[asyncio.Queue] = None
+    _writer: Optional[asyncio.Task] = None
+    _closing = False
+
+    def check_frame(self, text_data: Optional[str], bytes_data: Optional[bytes]) -> Optional[Dict[str, Any]]:
+        size = len(text_data.encode()) if text_data is not None else len(bytes_data or b"")
+        max_bytes = getattr(settings, "TS_ROOM_MAX_FRAME_BYTES", 4096)
+        if size > max_bytes:
+            relay_stats["oversized"] += 1
+            return _error("frame_too_large", f"Messages are limited to {max_bytes} bytes.")
+        return None
+
+    def check_message(self, message_type: str) -> Optional[Dict[str, Any]]:
+        if message_type not in getattr(settings, "TS_ROOM_RELAYED_TYPES", ["chat"]):
+            relay_stats["rejected"] += 1
+            return _error("type_not_allowed", f"Message type {message_type!r} is not relayed.")
+        error = self.check_rate()
+        if error is None:
+            relay_stats["relayed"] += 1
+        return error
+
+    def check_rate(self) -> Optional[Dict[str, Any]]:
+        """The token bucket alone, for messages the server handles itself."""
+        if self._bucket is None:
+            self._bucket = TokenBucket(
+                getattr(settings, "TS_ROOM_RATE_PER_SEC", 5), getattr(settings, "TS_ROOM_RATE_BURST", 10)
+            )
+        if not self._bucket.take():
+            relay_stats["throttled"] += 1
+            return _error("throttled", "Too many messages, slow down.")
+        return None
+
+    async def send_frame(self, text: str) -> None:
+        if self._closing:
+            return
+        if self._outbox is None:
+            self._outbox = asyncio.Queue(maxsize=getattr(settings, "TS_ROOM_OUTBOUND_QUEUE", 100))
+            self._writer = asyncio.get_running_loop().create_task(self._write_frames())
+        try:
+            self._outbox.put_nowait(text)
+        except asyncio.QueueFull:
+            if getattr(settings, "TS_ROOM_SLOW_CONSUMER_POLICY", "drop") == "disconnect":
+                relay_stats["disconnected"] += 1
+                self._closing = True
+                await self.close(code=SLOW_CONSUMER_CLOSE_CODE)
+            else:
+                relay_stats["dropped"] += 1
+
+    async def _write_frames(self) -> None:
+        while True:
+            text = await self._outbox.get()
+            await self.send_json_text(text)
+
+    def stop_frames(self) -> None:
+        if self._writer is not None:
+            self._writer.cancel()
@@ -0,0 +1,204 @@
+"""Coalesced publishing of lobby room events.
+
+Joins and leaves come in bursts, and every lobby client would otherwise get one
+message per change. ``LobbyBroadcaster`` publishes at most one update per
+``TS_LOBBY_TICK_MS``: the first change after a quiet period goes out at once
+(flush on idle), later ones are held until the tick ends and only the newest
+state of each room is sent.
+
+Held events are grouped into runs of consecutive ``seq`` numbers. A run with a
+single event is sent as that event; a longer run is sent as
+``{"type": "room_events", "from_seq": a, "seq": b, "data": [events]}`` and
+stands for every change numbered ``a``..``b``. Events numbered by another
+worker split runs, so clients keep detecting gaps as before.
+
+``RoomReaper`` removes rooms that stayed empty past the grace period, every
+``TS_LOBBY_REAP_INTERVAL_SECS``, and publishes their removal. ``RoomReaperApp``
+runs it next to the ASGI application: from the lifespan startup where the
+server sends one, otherwise from the first connection.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+import weakref
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+
+from .fanout import TickedSender, group_send_json
+from .rooms import RoomEvent, registry
+
+logger = logging.getLogger(__name__)
+
+LOBBY_GROUP = "lobby"
+
+
+class _Run:
+    def __init__(self, event: RoomEvent):
+        self.from_seq = self.seq = event.seq
+        self.events: Dict[str, RoomEvent] = {event.room_id: event}
+
+    def message(self) -> Dict[str, Any]:
+        if len(self.events) == 1 and self.from_seq == self.seq:
+            return next(iter(self.events.values())).to_message()
+        return {
+            "type": "room_events",
+            "from_seq": self.from_seq,
+            "seq": self.seq,
+            "data": [event.to_message() for event in self.events.values()],
+        }
+
+
+class LobbyBroadcaster(TickedSender):
+    def __init__(self, group: str = LOBBY_GROUP, tick_ms: Optional[int] = None):
+        self.group = group
+        self.tick_ms = tick_ms if tick_ms is not None else getattr(settings, "TS_LOBBY_TICK_MS", 100)
+        self._runs: List[_Run] = []
+        self._channel_layer = None
+        self.events = 0
+        self.coalesced = 0
+        self.messages = 0
+        self.flushes = 0
+        self.max_coalesced_per_tick = 0
+        self._tick_coalesced = 0
+
+    def _add(self, event: RoomEvent) -> None:
+        self.events += 1
+        run = self._runs[-1] if self._runs else None
+        if run is None or event.seq != run.seq + 1:
+            self._runs.append(_Run(event))
+            return
+        if event.room_id in run.events:
+            self.coalesced += 1
+            self._tick_coalesced += 1
+        run.events[event.room_id] = event
+        run.seq = event.seq
+
+    async def publish(self, channel_layer, events: List[RoomEvent]) -> None:
+        self._channel_layer = channel_layer
+        for event in events:
+            self._add(event)
+        if self._runs:
+            await self._schedule()
+
+    async def flush(self) -> None:
+        runs, self._runs = self._runs, []
+        self._last_flush = time.monotonic()
+        if not runs:
+            return
+        self.flushes += 1
+        self.max_coalesced_per_tick = max(self.max_coalesced_per_tick, self._tick_coalesced)
+        self._tick_coalesced = 0
+        for run in runs:
+            self.messages += 1
+            await group_send_json(self._channel_layer, self.group, run.message())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tick_ms": self.tick_ms,
+            "events": self.events,
+            "messages": self.messages,
+            "flushes": self.flushes,
+            "coalesced": self.coalesced,
+            "coalesced_per_flush": self.coalesced / self.flushes if self.flushes else 0.0,
+            "max_coalesced_per_tick": self.max_coalesced_per_tick,
+        }
+
+
+_broadcasters: "weakref.WeakKeyDictionary[Any, LobbyBroadcaster]" = weakref.WeakKeyDictionary()
+
+
+def broadcaster(rooms) -> LobbyBroadcaster:
+    """The broadcaster for a room registry: one per worker, like the registry."""
+    lobby = _broadcasters.get(rooms)
+    if lobby is None:
+        lobby = _broadcasters[rooms] = LobbyBroadcaster()
+    return lobby
+
+
+class RoomReaper:
+    def __init__(self, rooms=None, interval_secs: Optional[float] = None, grace_secs: Optional[float] = None):
+        self._rooms = rooms
+        self.interval_secs = (
+            interval_secs if interval_secs is not None else getattr(settings, "TS_LOBBY_REAP_INTERVAL_SECS", 5)
+        )
+        self.grace_secs = grace_secs
+        self._task: Optional[asyncio.Task] = None
+        self.sweeps = 0
+        self.reaped = 0
+
+    @property
+    def rooms(self):
+        return self._rooms or registry()
+
+    @property
+    def running(self) -> bool:
+        task = self._task
+        return task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop()
+
+    def start(self) -> None:
+        """Start sweeping in the running event loop, unless already started."""
+        if not self.running:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self.running:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_secs)
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("Sweeping empty lobby rooms failed")
+
+    async def sweep(self) -> List[RoomEvent]:
+        from channels.layers import get_channel_layer
+
+        events = await self.rooms.reap(self.grace_secs)
+        self.sweeps += 1
+        self.reaped += len(events)
+        if events:
+            await broadcaster(self.rooms).publish(get_channel_layer(), events)
+        return events
+
+    def stats(self) -> Dict[str, Any]:
+        return {"interval_secs": self.interval_secs, "sweeps": self.sweeps, "reaped": self.reaped}
+
+
+reaper = RoomReaper()
+
+
+class RoomReaperApp:
+    """ASGI wrapper that runs ``reaper`` alongside ``app``."""
+
+    def __init__(self, app, reaper: RoomReaper = reaper):
+        self.app = app
+        self.reaper = reaper
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+        # servers without lifespan support (Daphne) start it here
+        self.reaper.start()
+        return await self.app(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self.reaper.start()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.reaper.stop()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
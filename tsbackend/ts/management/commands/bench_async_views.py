@@ -0,0 +1,96 @@
+import asyncio
+import json
+import threading
+import time
+
+from channels.db import database_sync_to_async
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient
+from django.test.utils import override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.models import CustomUser as User
+from ts.bench import format_row, summarize
+from ts.db import db_pool
+from ts.models import GameSession, GameTurn, Song, SongTitle
+
+
+def correct_option(turn_id):
+    return GameTurn.objects.values_list('correct_option', flat=True).get(id=turn_id)
+
+
+class Command(BaseCommand):
+    help = (
+        'Game-session throughput under ASGI with many concurrent players: the sync '
+        'viewset bridged to threads vs ts.async_views'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, default=500)
+        parser.add_argument('--turns', type=int, default=5, help='Correct guess + next turn per player')
+
+    def handle(self, *args, **kwargs):
+        if connection.vendor == 'sqlite':
+            # deferred sqlite transactions that both upgrade to writes fail at
+            # once instead of waiting; make the threads' connections queue up
+            connection.settings_dict.setdefault('OPTIONS', {}).update(transaction_mode='IMMEDIATE', timeout=120)
+            connection.close()
+        titles = [SongTitle.objects.create(title=f'bench async {i}', album='bench') for i in range(8)]
+        songs = [Song.objects.create(file=f'songs/bench-async-{i}.mp3', song_title=t) for i, t in enumerate(titles)]
+        User.objects.bulk_create([User(username=f'bench_async_{i}') for i in range(kwargs['players'])])
+        users = User.objects.filter(username__startswith='bench_async_')
+        tokens = [str(RefreshToken.for_user(user).access_token) for user in users]
+        try:
+            for label, urlconf in (('sync viewset', None), ('async views', 'tsbackend.asgi_urls')):
+                with override_settings(TS_ASGI_URLCONF=urlconf, TS_REVEAL_DELAY_MS=0, ALLOWED_HOSTS=['testserver']):
+                    submitted = db_pool.stats()['submitted']
+                    samples, wall, threads = asyncio.run(self.play_all(tokens, kwargs['turns']))
+                self.stdout.write(self.style.SUCCESS(f'{label}: {len(tokens)} players, {kwargs["turns"]} turns each'))
+                self.stdout.write(
+                    f'  {len(samples) / wall:,.0f} requests/s over {wall:.1f}s, '
+                    f'db_pool calls={db_pool.stats()["submitted"] - submitted} peak threads={threads}'
+                )
+                self.stdout.write('  ' + format_row('request latency', summarize(samples)))
+        finally:
+            GameSession.objects.filter(user__in=users).delete()
+            users.delete()
+            for song in songs:
+                song.delete()
+            for title in titles:
+                title.delete()
+
+    async def play_all(self, tokens, turns):
+        samples = []
+
+        async def post(client, headers, url, body=None):
+            start = time.perf_counter()
+            response = await client.post(url, json.dumps(body or {}), content_type='application/json', headers=headers)
+            samples.append((time.perf_counter() - start) * 1000)
+            assert response.status_code in (200, 201), response.content
+            return response.json()
+
+        async def play(token):
+            client, headers = AsyncClient(), {'Authorization': f'Bearer {token}'}
+            session = (await post(client, headers, '/ts/game-sessions/'))['session']
+            base = f"/ts/game-sessions/{session['id']}"
+            for _ in range(turns):
+                option = await database_sync_to_async(correct_option)(session['current_turn'])
+                guess = {'option': option, 'version': session['version'], 'elapsed_time_ms': 0}
+                version = (await post(client, headers, f'{base}/guess/', guess))['session']['version']
+                session = (await post(client, headers, f'{base}/next-turn/', {'version': version}))['session']
+
+        peak_threads = threading.active_count()
+
+        async def count_threads():
+            nonlocal peak_threads
+            while True:
+                peak_threads = max(peak_threads, threading.active_count())
+                await asyncio.sleep(0.05)
+
+        sampler = asyncio.create_task(count_threads())
+        started = time.perf_counter()
+        await asyncio.gather(*[play(token) for token in tokens])
+        wall = time.perf_counter() - started
+        sampler.cancel()
+        return samples, wall, peak_threads
@@ -0,0 +1,43 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from ts.bench import format_row, measure
+from ts.codecs import CODECS
+from ts.consumers import LobbyConsumer
+from ts.rooms import InMemoryRoomRegistry
+
+
+class Command(BaseCommand):
+    help = (
+        'Size and encode/decode time of lobby snapshots in each available codec, '
+        'with one object per room and as a table (binary connections)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, nargs='+', default=[50, 500])
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **kwargs):
+        for room_count in kwargs['rooms']:
+            snapshots = asyncio.run(self.snapshots(room_count))
+            self.stdout.write(self.style.SUCCESS(f'{room_count} rooms ({", ".join(CODECS)} available)'))
+            for codec in CODECS.values():
+                for layout, snapshot in snapshots.items():
+                    frame = codec.encode(snapshot)
+                    label = f'{codec.subprotocol} {layout}'
+                    self.stdout.write(f'  {label:<24} bytes={len(frame):,}')
+                    self.stdout.write('    ' + format_row('encode', measure(lambda: codec.encode(snapshot), kwargs['repeat'])))
+                    self.stdout.write('    ' + format_row('decode', measure(lambda: codec.decode(frame), kwargs['repeat'])))
+
+    async def snapshots(self, room_count):
+        registry = InMemoryRoomRegistry()
+        for i in range(room_count):
+            room = (await registry.create(player_1=i)).room
+            await registry.join(room.id, f'specific.channel!host-{i}')
+            if i % 3 == 0:
+                await registry.join(room.id, f'specific.channel!guest-{i}')
+        return {
+            'objects': await LobbyConsumer.snapshot_message(registry),
+            'table': await LobbyConsumer.snapshot_message(registry, compact=True),
+        }
@@ -0,0 +1,88 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections, connection
+from django.test.utils import override_settings
+
+from core.models import CustomUser as User
+from ts.bench import format_row, summarize
+from ts.exceptions import VersionConflict
+from ts.models import GameSession, Song, SongTitle
+from ts.services import start_session, submit_guess
+
+
+class Command(BaseCommand):
+    help = (
+        'Contention benchmark for submit_guess: many concurrent guessers on one session '
+        'and on many sessions, with row locking vs optimistic single-statement updates'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--guessers', type=int, default=32)
+        parser.add_argument('--guesses', type=int, default=50, help='Guesses per guesser')
+        parser.add_argument('--modes', nargs='+', default=['locking', 'optimistic'])
+
+    def handle(self, *args, **kwargs):
+        guessers = kwargs['guessers']
+        title = SongTitle.objects.create(title='bench contention title', album='bench')
+        song = Song.objects.create(file='songs/bench-contention.mp3', song_title=title)
+        users = [User.objects.create_user(username=f'bench_contention_{i}') for i in range(guessers)]
+        try:
+            for mode in kwargs['modes']:
+                with override_settings(TS_SESSION_CONCURRENCY=mode):
+                    for layout in ('one session', 'many sessions'):
+                        sessions = (
+                            [start_session(users[0])] * guessers
+                            if layout == 'one session'
+                            else [start_session(user) for user in users]
+                        )
+                        self.run_layout(mode, layout, sessions, kwargs['guesses'])
+        finally:
+            GameSession.objects.filter(user__in=users).delete()
+            User.objects.filter(id__in=[u.id for u in users]).delete()
+            song.delete()
+            title.delete()
+
+    def run_layout(self, mode, layout, sessions, guesses):
+        samples, counters = [], {'ok': 0, 'conflict': 0, 'error': 0}
+        lock = threading.Lock()
+        barrier = threading.Barrier(len(sessions))
+
+        def guesser(session):
+            local, local_counts = [], {'ok': 0, 'conflict': 0, 'error': 0}
+            barrier.wait()
+            for _ in range(guesses):
+                # Wrong answers at score 0 keep the turn pending, so every guess
+                # is a version-bumping write on the same row.
+                version = GameSession.objects.values_list('version', flat=True).get(id=session.id)
+                start = time.perf_counter()
+                try:
+                    submit_guess(session.id, '__wrong__', 0, version, session.user)
+                    local_counts['ok'] += 1
+                except VersionConflict:
+                    local_counts['conflict'] += 1
+                except OperationalError:
+                    local_counts['error'] += 1
+                local.append((time.perf_counter() - start) * 1000)
+            connection.close()
+            with lock:
+                samples.extend(local)
+                for key, value in local_counts.items():
+                    counters[key] += value
+
+        threads = [threading.Thread(target=guesser, args=(session,)) for session in sessions]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+        close_old_connections()
+
+        self.stdout.write(self.style.SUCCESS(f'{mode} / {layout} ({len(sessions)} guessers)'))
+        self.stdout.write('  ' + format_row('submit_guess', summarize(samples)))
+        self.stdout.write(
+            f"  committed={counters['ok']} conflicts={counters['conflict']} "
+            f"db_errors={counters['error']} throughput={counters['ok'] / wall:.0f} writes/s"
+        )
@@ -0,0 +1,63 @@
+import asyncio
+import json
+import time
+
+from channels.layers import InMemoryChannelLayer
+from django.core.management.base import BaseCommand
+
+from ts.bench import format_row, summarize
+from ts.fanout import text_frame_message
+from ts.rooms import LiveRoom
+
+
+class Command(BaseCommand):
+    help = (
+        'CPU per group broadcast of a lobby room event: encoded by every recipient '
+        '(group_send + send_json) vs encoded once (ts.fanout.group_send_json)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000])
+        parser.add_argument('--broadcasts', type=int, default=50)
+
+    def handle(self, *args, **kwargs):
+        room = LiveRoom(id='abcd1234', player_1=1, player_2=2, members={'a', 'b'})
+        payload = {'type': 'room_updated', 'seq': 1, 'data': room.to_dict()}
+        for size in kwargs['sizes']:
+            self.stdout.write(self.style.SUCCESS(f'group of {size}'))
+            for mode in ('per recipient', 'once'):
+                encode_ms, total_ms = asyncio.run(self.run(mode, size, kwargs['broadcasts'], payload))
+                self.stdout.write('  ' + format_row(f'{mode}, encode', summarize(encode_ms)))
+                self.stdout.write('  ' + format_row(f'{mode}, send + deliver', summarize(total_ms)))
+
+    async def run(self, mode, size, broadcasts, payload):
+        layer = InMemoryChannelLayer()
+        members = [await layer.new_channel() for _ in range(size)]
+        for channel in members:
+            await layer.group_add('bench', channel)
+
+        encode_samples, total_samples = [], []
+        for _ in range(broadcasts):
+            encode_cpu = 0.0
+            started = time.process_time()
+            if mode == 'once':
+                # group_send_json, with the encode timed apart from the layer
+                before = time.process_time()
+                message = text_frame_message(payload)
+                encode_cpu += time.process_time() - before
+                await layer.group_send('bench', message)
+            else:
+                await layer.group_send('bench', {'type': 'broadcast', 'payload': payload})
+            for channel in members:
+                message = await layer.receive(channel)
+                if mode == 'once':
+                    frame = message['text']
+                else:
+                    # what send_json does in each consumer of the group
+                    before = time.process_time()
+                    frame = json.dumps(message['payload'])
+                    encode_cpu += time.process_time() - before
+                assert frame
+            total_samples.append((time.process_time() - started) * 1000)
+            encode_samples.append(encode_cpu * 1000)
+        return encode_samples, total_samples
@@ -0,0 +1,82 @@
+import asyncio
+import json
+import random
+import time
+
+from channels.layers import InMemoryChannelLayer
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ts.consumers import LobbyConsumer
+from ts.lobby import LobbyBroadcaster
+from ts.rooms import InMemoryRoomRegistry
+
+
+class Command(BaseCommand):
+    help = (
+        'Lobby fan-out cost per room change with many rooms and lobby clients: '
+        'full room-list broadcasts vs sequenced room events, sent one per change '
+        'or coalesced per TS_LOBBY_TICK_MS during a burst'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=500)
+        parser.add_argument('--clients', type=int, default=2000)
+        parser.add_argument('--changes', type=int, default=20, help='Joins/leaves to broadcast')
+
+    def handle(self, *args, **kwargs):
+        for mode in ('snapshot', 'delta', 'coalesced'):
+            asyncio.run(self.run(mode, kwargs['rooms'], kwargs['clients'], kwargs['changes']))
+
+    async def run(self, mode, room_count, client_count, changes):
+        registry = InMemoryRoomRegistry()
+        room_ids = []
+        for i in range(room_count):
+            room = (await registry.create(player_1=i)).room
+            await registry.join(room.id, f'host-{i}')
+            room_ids.append(room.id)
+
+        layer = InMemoryChannelLayer(capacity=changes + 10)
+        clients = [await layer.new_channel() for _ in range(client_count)]
+        for channel in clients:
+            await layer.group_add(LobbyConsumer.group_name, channel)
+
+        tick_ms = settings.TS_LOBBY_TICK_MS if mode == 'coalesced' else 0
+        lobby = LobbyBroadcaster(tick_ms=tick_ms)
+        rng = random.Random(0)
+        sent_bytes = 0
+        cpu_started, wall_started = time.process_time(), time.perf_counter()
+        # all changes arrive within one tick, as in a burst of joins
+        for i in range(changes):
+            room_id = rng.choice(room_ids)
+            if i % 2 == 0:
+                event = await registry.join(room_id, f'guest-{i}')
+            else:
+                event = await registry.leave(room_id, f'guest-{i - 1}')
+            if mode == 'snapshot':
+                # what every join/leave/create used to send to every lobby client
+                snapshot = await LobbyConsumer.snapshot_message(registry)
+                await layer.group_send(
+                    LobbyConsumer.group_name,
+                    {'type': 'broadcast', 'message_type': 'rooms', 'data': snapshot['data']},
+                )
+            else:
+                await lobby.publish(layer, [event])
+        await lobby.flush()
+        messages = changes if mode == 'snapshot' else lobby.messages
+        for channel in clients:
+            for _ in range(messages):
+                message = await layer.receive(channel)
+                if message['type'] == 'text_frame':
+                    sent_bytes += len(message['text'])
+                else:
+                    # each lobby consumer encodes its copy, as send_json does
+                    sent_bytes += len(json.dumps({'type': message['message_type'], 'data': message['data']}))
+        cpu = time.process_time() - cpu_started
+        wall = time.perf_counter() - wall_started
+
+        self.stdout.write(self.style.SUCCESS(f'{mode}: {room_count} rooms, {client_count} lobby clients, {changes} changes'))
+        self.stdout.write(
+            f'  messages/client={messages} bytes/change={sent_bytes / changes:,.0f} total={sent_bytes / 1e6:,.1f}MB '
+            f'cpu/change={cpu / changes * 1000:.1f}ms wall/change={wall / changes * 1000:.1f}ms'
+        )
@@ -0,0 +1,78 @@
+import asyncio
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from ts.bench import format_row, summarize
+from ts.matchmaking import InMemoryMatchQueue, RedisMatchQueue, Ticket, bracket_for
+
+
+class Command(BaseCommand):
+    help = (
+        'Quick-match queue simulation: players with random recent scores arrive one by one '
+        'and are paired in one bracket or in score brackets, in memory and in Redis'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, default=10000)
+        parser.add_argument('--bracket-width', type=int, default=10)
+        parser.add_argument('--cancel', type=float, default=0.1, help='Share of players who leave while waiting')
+        parser.add_argument('--redis-url', default='', help='Defaults to an in-process fakeredis server')
+
+    def handle(self, *args, **kwargs):
+        for backend in ('memory', 'redis'):
+            for width in (0, kwargs['bracket_width']):
+                queue = self.queue(backend, kwargs['redis_url'])
+                asyncio.run(self.run(backend, queue, width, kwargs['players'], kwargs['cancel']))
+
+    def queue(self, backend, redis_url):
+        if backend == 'memory':
+            return InMemoryMatchQueue()
+        if redis_url:
+            queue = RedisMatchQueue.from_url(redis_url, prefix=f'bench:quickmatch:{time.time_ns()}:')
+        else:
+            import fakeredis
+
+            queue = RedisMatchQueue(fakeredis.aioredis.FakeRedis())
+        return queue
+
+    async def run(self, backend, queue, width, players, cancel_share):
+        rng = random.Random(0)
+        # recent scores: most players are casual, a few are very good
+        scores = [int(rng.expovariate(1 / 12)) for _ in range(players)]
+        waiting = {}
+        samples, waits, gaps, cancelled = [], [], [], 0
+        started = time.perf_counter()
+        for user, score in enumerate(scores):
+            ticket = Ticket(user, f'channel-{user}')
+            start = time.perf_counter()
+            pair = await queue.enqueue(ticket, bracket_for(score, width))
+            samples.append((time.perf_counter() - start) * 1000)
+            if pair is None:
+                waiting[user] = ticket
+            else:
+                opponent = waiting.pop(pair[0].user)
+                waits.append(user - opponent.user)
+                gaps.append(abs(scores[opponent.user] - score))
+            if waiting and rng.random() < cancel_share:
+                # at most one player per bracket is waiting, so this list stays short
+                leaving = waiting.pop(rng.choice(list(waiting)))
+                cancelled += await queue.cancel(leaving)
+        wall = time.perf_counter() - started
+
+        bracket = f'brackets of {width}' if width else 'one bracket'
+        self.stdout.write(self.style.SUCCESS(f'{backend}, {bracket}: {players} players'))
+        self.stdout.write(
+            f'  {len(waits)} pairs, {cancelled} left the queue, {await queue.waiting_count()} still waiting; '
+            f'{players / wall:,.0f} enqueues/s'
+        )
+        tenth = max(1, players // 10)
+        self.stdout.write('  ' + format_row('enqueue, first 10%', summarize(samples[:tenth])))
+        self.stdout.write('  ' + format_row('enqueue, last 10%', summarize(samples[-tenth:])))
+        if waits:
+            self.stdout.write(
+                f'  wait (arrivals until paired) mean={statistics.mean(waits):.1f} max={max(waits)}; '
+                f'score gap mean={statistics.mean(gaps):.1f} max={max(gaps)}'
+            )
@@ -0,0 +1,60 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from ts.bench import format_row, measure, rolled_back
+from ts.distractors import DistractorEngine
+from ts.models import SongTitle
+
+
+def legacy_build_options(correct_title, k=3):
+    titles = list(
+        SongTitle.objects.exclude(title=correct_title)
+        .values_list("title", flat=True)
+        .order_by("?")[:k]
+    )
+    titles.append(correct_title)
+    random.shuffle(titles)
+    return titles
+
+
+def engine_build_options(engine, correct_title, k=3):
+    titles = engine.sample(correct_title, k)
+    titles.append(correct_title)
+    random.shuffle(titles)
+    return titles
+
+
+class Command(BaseCommand):
+    help = 'Compare per-turn option generation: ORDER BY RAND() query vs in-memory distractor pools'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+        parser.add_argument('--turns', type=int, default=200, help='Turns generated per size')
+        parser.add_argument('--albums', type=int, default=40)
+
+    def handle(self, *args, **kwargs):
+        for size in kwargs['sizes']:
+            # Rows are inserted inside a rolled back transaction; nothing is kept.
+            with rolled_back():
+                rows = [(f'bench title {i:06d}' + 'x' * (i % 23), f'bench album {i % kwargs["albums"]}') for i in range(size)]
+                SongTitle.objects.all().delete()
+                SongTitle.objects.bulk_create(
+                    [SongTitle(title=title, album=album) for title, album in rows],
+                    batch_size=5000,
+                )
+                titles = [title for title, _ in rows]
+
+                legacy = measure(lambda: legacy_build_options(random.choice(titles)), kwargs['turns'])
+
+                engine = DistractorEngine()
+                start = time.perf_counter()
+                len(engine.pool(titles[0]))
+                build_ms = (time.perf_counter() - start) * 1000
+                pooled = measure(lambda: engine_build_options(engine, random.choice(titles)), kwargs['turns'])
+
+            self.stdout.write(self.style.SUCCESS(f'{size} titles (pool build {build_ms:.1f}ms, once per worker)'))
+            self.stdout.write('  ' + format_row('order_by("?") query', legacy))
+            self.stdout.write('  ' + format_row('distractor pools', pooled))
+            self.stdout.write(f'  speedup x{legacy["mean"] / max(pooled["mean"], 1e-9):.0f}')
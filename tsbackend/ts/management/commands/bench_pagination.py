@@ -0,0 +1,76 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from core.models import CustomUser as User
+from ts.bench import format_row, measure, rolled_back
+from ts.models import GameSession, GameSessionStatus, GameTurn, GameTurnOutcome, Song, SongTitle
+from ts.pagination import KeysetPagination
+
+ORDERING = ('session_id', 'sequence_index')
+
+
+class TurnKeyset(KeysetPagination):
+    ordering = ORDERING
+
+
+def page_number(queryset, page):
+    request = Request(APIRequestFactory().get('/ts/game-turns/', {'page': page}))
+    return PageNumberPagination().paginate_queryset(queryset.order_by(*ORDERING), request)
+
+
+def keyset(queryset, cursor):
+    params = {'cursor': cursor} if cursor else {}
+    request = Request(APIRequestFactory().get('/ts/game-turns/', params))
+    return TurnKeyset().paginate_queryset(queryset, request)
+
+
+class Command(BaseCommand):
+    help = 'Latency of game-turns pages at increasing depth, page number (COUNT + OFFSET) vs keyset cursor'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--turns', type=int, default=10_000_000)
+        parser.add_argument('--turns-per-session', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def handle(self, *args, **kwargs):
+        total, per_session = kwargs['turns'], kwargs['turns_per_session']
+        page_size = PageNumberPagination.page_size or 10
+        with rolled_back():
+            title = SongTitle.objects.create(title='bench pagination', album='bench')
+            song = Song.objects.create(file='songs/bench-pagination.mp3', song_title=title)
+            user = User.objects.create_user(username='bench_pagination')
+            now = timezone.now()
+            sessions = total // per_session
+            for start in range(0, sessions, 1000):
+                created = GameSession.objects.bulk_create(
+                    [GameSession(user=user, status=GameSessionStatus.ENDED, ended_at=now) for _ in range(min(1000, sessions - start))]
+                )
+                ids = [s.id for s in created] if created[0].id else list(
+                    GameSession.objects.filter(user=user).order_by('-id').values_list('id', flat=True)[:len(created)]
+                )
+                GameTurn.objects.bulk_create(
+                    [
+                        GameTurn(session_id=sid, sequence_index=i, song=song, correct_option='x', outcome=GameTurnOutcome.CORRECT)
+                        for sid in ids
+                        for i in range(1, per_session + 1)
+                    ],
+                    batch_size=5000,
+                )
+            queryset = GameTurn.objects.filter(session__user=user)
+            rows = queryset.count()
+            self.stdout.write(self.style.SUCCESS(f'{rows} turns in {sessions} sessions'))
+
+            pages = max(1, rows // page_size)
+            for label, page in (('first page', 1), ('middle page', pages // 2 or 1), ('last page', pages)):
+                offset = (page - 1) * page_size
+                cursor = None
+                if offset:
+                    # position of the row just before the page, as a "next" link would carry it
+                    before = queryset.order_by(*ORDERING).values_list(*ORDERING)[offset - 1]
+                    cursor = TurnKeyset().encode_cursor(False, list(before))
+                for name, fn, arg in (('page number', page_number, page), ('keyset', keyset, cursor)):
+                    stats = measure(lambda: fn(queryset, arg), kwargs['repeat'])
+                    self.stdout.write('  ' + format_row(f'{name}, {label}', stats))
@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import CustomUser as User
+from ts.bench import format_row, measure, rolled_back
+from ts.models import GameSession, GameSessionStatus, GameTurn, GameTurnOutcome, Song, SongTitle
+from ts.serializers import SongSerializer
+from ts.views import previous_results_data, previous_results_queryset
+
+
+def legacy_previous_results(user, offset, page_size):
+    qs = (
+        GameSession.objects.filter(user=user)
+        .filter(status=GameSessionStatus.ENDED)
+        .order_by("-ended_at", "id")
+    )
+    qs.count()
+    results = []
+    for session in qs[offset:offset + page_size]:
+        last_turn = (
+            session.turns.filter(outcome=GameTurnOutcome.WRONG)
+            .order_by("-sequence_index")
+            .first()
+        )
+        results.append({
+            "session_id": session.id,
+            "score": session.score,
+            "ended_at": session.ended_at,
+            "last_correct_song": SongSerializer(last_turn.song).data if last_turn else None,
+        })
+    return results
+
+
+def annotated_previous_results(user, offset, page_size):
+    qs = previous_results_queryset(user)
+    qs.count()
+    return previous_results_data(qs[offset:offset + page_size])
+
+
+class Command(BaseCommand):
+    help = 'Latency of previous-results pages for a user with many finished sessions, N+1 loop vs annotated query'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', type=int, default=5000)
+        parser.add_argument('--page-sizes', type=int, nargs='+', default=[10, 100])
+        parser.add_argument('--repeat', type=int, default=30)
+
+    def handle(self, *args, **kwargs):
+        total = kwargs['sessions']
+        with rolled_back():
+            title = SongTitle.objects.create(title='bench previous results', album='bench', lyrics='la ' * 2000)
+            song = Song.objects.create(file='songs/bench-previous-results.mp3', song_title=title)
+            user = User.objects.create_user(username='bench_previous_results')
+            now = timezone.now()
+            GameSession.objects.bulk_create(
+                [GameSession(user=user, score=i % 40, status=GameSessionStatus.ENDED, ended_at=now) for i in range(total)],
+                batch_size=1000,
+            )
+            sessions = GameSession.objects.filter(user=user).values_list('id', flat=True)
+            GameTurn.objects.bulk_create(
+                [
+                    GameTurn(session_id=sid, sequence_index=1, song=song, correct_option='x', outcome=GameTurnOutcome.WRONG)
+                    for sid in sessions
+                ],
+                batch_size=1000,
+            )
+
+            self.stdout.write(self.style.SUCCESS(f'{total} finished sessions'))
+            for page_size in kwargs['page_sizes']:
+                for label, offset in (('first page', 0), ('last page', max(0, total - page_size))):
+                    for name, fn in (('N+1 loop', legacy_previous_results), ('annotated', annotated_previous_results)):
+                        stats = measure(lambda: fn(user, offset, page_size), kwargs['repeat'])
+                        self.stdout.write('  ' + format_row(f'{name}, {page_size}/page, {label}', stats))
@@ -0,0 +1,109 @@
+import asyncio
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ts.bench import format_row, summarize
+from ts.fanout import group_send_json
+from ts.rooms import LiveRoom
+from ts.spectators import SpectatorFeed, spectator_group
+
+
+class QueueLayer:
+    """Group sends as one queue put per member, like a Redis layer's per-channel
+    pushes. ``InMemoryChannelLayer`` sweeps all channels and groups on every
+    receive, which with thousands of receivers would dominate the timings."""
+
+    def __init__(self):
+        self.queues = {}
+        self.groups = {}
+
+    async def new_channel(self):
+        channel = f'bench.{len(self.queues)}'
+        self.queues[channel] = asyncio.Queue()
+        return channel
+
+    async def group_add(self, group, channel):
+        self.groups.setdefault(group, []).append(channel)
+
+    async def group_send(self, group, message):
+        for channel in self.groups.get(group, []):
+            self.queues[channel].put_nowait(message)
+
+    async def receive(self, channel):
+        return await self.queues[channel].get()
+
+
+class Command(BaseCommand):
+    help = (
+        'Latency of room broadcasts to the two players of a room: without spectators, '
+        'with the spectators in the room group, and with them on the throttled ts.spectators feed'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--spectators', type=int, default=5000)
+        parser.add_argument('--messages', type=int, default=200)
+        parser.add_argument('--interval-ms', type=float, default=5, help='Time between room messages')
+
+    def handle(self, *args, **kwargs):
+        for mode in ('no spectators', 'spectators in room group', 'spectator feed'):
+            spectators = 0 if mode == 'no spectators' else kwargs['spectators']
+            samples, frames, wall = asyncio.run(
+                self.run(mode, spectators, kwargs['messages'], kwargs['interval_ms'])
+            )
+            self.stdout.write(self.style.SUCCESS(f'{mode}: {spectators} spectators'))
+            self.stdout.write('  ' + format_row('player broadcast latency', summarize(samples)))
+            self.stdout.write(
+                f'  max={max(samples):.2f}ms; {frames:,} frames to spectators ({frames / wall:,.0f}/s)'
+            )
+
+    async def run(self, mode, spectators, messages, interval_ms):
+        layer = QueueLayer()
+        room_group = 'room_bench'
+        players = [await layer.new_channel() for _ in range(2)]
+        watchers = [await layer.new_channel() for _ in range(spectators)]
+        for channel in players:
+            await layer.group_add(room_group, channel)
+        for channel in watchers:
+            await layer.group_add(room_group if mode == 'spectators in room group' else spectator_group('bench'), channel)
+
+        received = {}
+        frames = 0
+
+        async def player(channel):
+            # RoomConsumer.text_frame forwards the frame; the client decodes it
+            while True:
+                payload = json.loads((await layer.receive(channel))['text'])
+                received[payload['data']['i']] = time.perf_counter()
+
+        async def spectator(channel):
+            nonlocal frames
+            while True:
+                assert (await layer.receive(channel))['text']
+                frames += 1
+
+        readers = [asyncio.create_task(player(players[1]))]
+        readers += [asyncio.create_task(spectator(channel)) for channel in watchers]
+        await asyncio.sleep(0)
+
+        feed = SpectatorFeed('bench', tick_ms=settings.TS_SPECTATOR_TICK_MS)
+        room = LiveRoom(id='bench', player_1=1, player_2=2, members={'a', 'b'})
+        sent = {}
+        started = time.perf_counter()
+        for i in range(messages):
+            sent[i] = time.perf_counter()
+            await group_send_json(layer, room_group, {'type': 'chat', 'data': {'i': i, 'text': 'go!'}, 'sender': 1})
+            if mode == 'spectator feed':
+                # what a score change passes on to the spectators
+                room.player_1_score = i
+                await feed.update(layer, room=room.to_dict())
+            await asyncio.sleep(interval_ms / 1000)
+        # let the last messages and the last view arrive
+        await asyncio.sleep(max(0.2, settings.TS_SPECTATOR_TICK_MS / 1000 * 2))
+        wall = time.perf_counter() - started
+        feed.stop()
+        for reader in readers:
+            reader.cancel()
+        return [(received[i] - sent[i]) * 1000 for i in received], frames, wall
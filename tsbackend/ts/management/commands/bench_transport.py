@@ -0,0 +1,100 @@
+import asyncio
+import json
+import time
+
+from channels.db import database_sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.models import CustomUser as User
+from ts.bench import format_row, summarize
+from ts.models import GameSession, GameTurn, Song, SongTitle
+from tsbackend.asgi import application
+
+
+def correct_option(turn_id):
+    return GameTurn.objects.values_list('correct_option', flat=True).get(id=turn_id)
+
+
+class Command(BaseCommand):
+    help = (
+        'Per-turn latency of the single-player loop (correct guess + next turn) over '
+        'REST with JWT per request vs one authenticated WebSocket, both in-process'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--turns', type=int, default=200)
+
+    def handle(self, *args, **kwargs):
+        turns = kwargs['turns']
+        titles = [SongTitle.objects.create(title=f'bench transport {i}', album='bench') for i in range(8)]
+        songs = [Song.objects.create(file=f'songs/bench-transport-{i}.mp3', song_title=t) for i, t in enumerate(titles)]
+        user = User.objects.create_user(username='bench_transport')
+        token = str(RefreshToken.for_user(user).access_token)
+        try:
+            with override_settings(TS_REVEAL_DELAY_MS=0):
+                for combined in (False, True):
+                    label = 'guess-and-advance' if combined else 'guess + next'
+                    self.report(f'REST, {label}', self.rest(token, turns, combined))
+                    self.report(f'WebSocket, {label}', asyncio.run(self.websocket(token, turns, combined)))
+        finally:
+            GameSession.objects.filter(user=user).delete()
+            user.delete()
+            for song in songs:
+                song.delete()
+            for title in titles:
+                title.delete()
+
+    def report(self, label, samples):
+        self.stdout.write('  ' + format_row(label, summarize(samples)))
+
+    def rest(self, token, turns, combined):
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {token}', HTTP_HOST='localhost')
+
+        def post(url, body):
+            response = client.post(url, json.dumps(body), content_type='application/json')
+            assert response.status_code in (200, 201), response.content
+            return response.json()
+
+        session = post('/ts/game-sessions/', {})['session']
+        samples = []
+        for _ in range(turns):
+            guess = {'option': correct_option(session['current_turn']), 'version': session['version'], 'elapsed_time_ms': 0}
+            base = f"/ts/game-sessions/{session['id']}"
+            start = time.perf_counter()
+            if combined:
+                session = post(f'{base}/guess-and-advance/', guess)['session']
+            else:
+                version = post(f'{base}/guess/', guess)['session']['version']
+                session = post(f'{base}/next-turn/', {'version': version})['session']
+            samples.append((time.perf_counter() - start) * 1000)
+        return samples
+
+    async def websocket(self, token, turns, combined):
+        communicator = WebsocketCommunicator(application, f'/ws/ts/game/?token={token}')
+        connected, _ = await communicator.connect()
+        assert connected
+
+        async def send(message_type, data):
+            await communicator.send_json_to({'type': message_type, 'data': data})
+            reply = await communicator.receive_json_from(timeout=10)
+            assert reply['type'] == message_type, reply
+            return reply['data']
+
+        session = (await send('start', {}))['session']
+        samples = []
+        for _ in range(turns):
+            option = await database_sync_to_async(correct_option)(session['current_turn'])
+            guess = {'session': session['id'], 'option': option, 'version': session['version'], 'elapsed_time_ms': 0}
+            start = time.perf_counter()
+            if combined:
+                session = (await send('guess_and_advance', guess))['session']
+            else:
+                version = (await send('guess', guess))['session']['version']
+                session = (await send('next', {'session': session['id'], 'version': version}))['session']
+            samples.append((time.perf_counter() - start) * 1000)
+        await communicator.disconnect()
+        return samples
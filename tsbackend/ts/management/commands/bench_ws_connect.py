@@ -0,0 +1,84 @@
+import asyncio
+import time
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from rest_framework_simplejwt.tokens import RefreshToken
+
+import ts.routing
+from core.models import CustomUser as User
+from ts.authentication import user_cache, user_for_token
+from ts.bench import format_row, summarize
+from ts.middleware import get_user
+
+
+@database_sync_to_async
+def thread_hop_get_user(token_key):
+    # how JwtAuthMiddleware resolved tokens before: always on the shared thread
+    return user_for_token(token_key) or AnonymousUser()
+
+
+class MeasuredJwtAuthMiddleware:
+    """``JwtAuthMiddleware`` with a pluggable resolver, counting how many
+    resolutions are in progress at once (the backlog of the thread they wait on)."""
+
+    def __init__(self, app, resolve):
+        self.app = app
+        self.resolve = resolve
+        self.waiting = self.peak = 0
+
+    async def __call__(self, scope, receive, send):
+        token = parse_qs(scope["query_string"].decode())["token"][0]
+        self.waiting += 1
+        self.peak = max(self.peak, self.waiting)
+        try:
+            scope["user"] = await self.resolve(token)
+        finally:
+            self.waiting -= 1
+        return await self.app(scope, receive, send)
+
+
+class Command(BaseCommand):
+    help = (
+        'Latency of simultaneous authenticated WebSocket connects: token resolved on the '
+        'database_sync_to_async thread vs on the event loop with the async ORM'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connects', type=int, default=1000)
+        parser.add_argument('--users', type=int, default=1000)
+
+    def handle(self, *args, **kwargs):
+        User.objects.bulk_create([User(username=f'bench_connect_{i}') for i in range(kwargs['users'])])
+        users = list(User.objects.filter(username__startswith='bench_connect_'))
+        tokens = [str(RefreshToken.for_user(user).access_token) for user in users]
+        tokens = [tokens[i % len(tokens)] for i in range(kwargs['connects'])]
+        try:
+            for label, resolve in (('sync_to_async thread', thread_hop_get_user), ('async ORM', get_user)):
+                for cache in ('cold', 'warm'):
+                    if cache == 'cold':
+                        user_cache.clear()
+                    app = MeasuredJwtAuthMiddleware(URLRouter(ts.routing.websocket_urlpatterns), resolve)
+                    samples = asyncio.run(self.connect_all(app, tokens))
+                    self.stdout.write(
+                        '  ' + format_row(f'{label}, {cache} cache', summarize(samples))
+                        + f' max={max(samples):8.1f}ms peak waiting={app.peak}'
+                    )
+        finally:
+            User.objects.filter(username__startswith='bench_connect_').delete()
+
+    async def connect_all(self, app, tokens):
+        async def connect(token):
+            communicator = WebsocketCommunicator(app, f'/ws/ts/game/?token={token}')
+            start = time.perf_counter()
+            connected, _ = await communicator.connect(timeout=60)
+            elapsed = (time.perf_counter() - start) * 1000
+            assert connected
+            await communicator.disconnect()
+            return elapsed
+
+        return await asyncio.gather(*[connect(token) for token in tokens])
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from ts.leaderboard import iso_week, rebuild_week
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the weekly leaderboard of an ISO week (e.g. 2026-W42) from game session history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('weeks', nargs='*', type=str, help='ISO weeks to rebuild, defaults to the current week')
+
+    def handle(self, *args, **kwargs):
+        for week in kwargs['weeks'] or [iso_week()]:
+            count = rebuild_week(week)
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {week}: {count} players'))
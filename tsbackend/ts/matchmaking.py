@@ -0,0 +1,220 @@
+"""Quick match: pairing waiting players without the lobby.
+
+A player who opens ``ws/ts/quickmatch/`` is queued in a score bracket. If
+somebody is already waiting in that bracket, the longest-waiting player becomes
+the opponent; otherwise the player waits at the end of the bracket. Either way
+an enqueue is one pop or one push, however many players wait.
+
+Brackets are ``TS_MATCH_BRACKET_WIDTH`` points wide, by the mean score of the
+player's last ``TS_MATCH_RECENT_SESSIONS`` finished single-player sessions. A
+width of 0 puts everyone in one bracket.
+
+A pair gets a ``GameRoom`` and a lobby ``LiveRoom`` with the ``GameRoom``'s id,
+both players already seated, and both sockets are sent ``match_found`` with the
+room to connect to. The match result is saved to that ``GameRoom``
+(``ts.rounds.save_match``). When the room cannot be opened, both are sent
+``match_failed`` and have to queue again.
+
+``InMemoryMatchQueue`` only pairs players of one worker; ``RedisMatchQueue``
+pairs them across workers. ``TS_MATCHMAKING_QUEUE`` selects the backend and
+``match_queue()`` returns the worker's instance.
+"""
+
+from __future__ import annotations
+
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+
+from .lobby import broadcaster
+from .models import GameRoom, GameSession, GameSessionStatus
+from .rooms import LiveRoom
+
+logger = logging.getLogger(__name__)
+
+Pair = Tuple["Ticket", "Ticket"]
+
+
+@dataclass(frozen=True)
+class Ticket:
+    """A queued player and the socket to tell about the match."""
+
+    user: int
+    channel: str
+
+    def encode(self) -> str:
+        return f"{self.user} {self.channel}"
+
+    @classmethod
+    def decode(cls, raw) -> "Ticket":
+        user, channel = (raw.decode() if isinstance(raw, bytes) else raw).split(" ", 1)
+        return cls(int(user), channel)
+
+
+def bracket_for(score: int, width: Optional[int] = None) -> int:
+    width = getattr(settings, "TS_MATCH_BRACKET_WIDTH", 0) if width is None else width
+    return score // width if width else 0
+
+
+async def recent_score(user_id: int) -> int:
+    """Mean score of the player's last ``TS_MATCH_RECENT_SESSIONS`` finished sessions."""
+    count = getattr(settings, "TS_MATCH_RECENT_SESSIONS", 5)
+    sessions = GameSession.objects.filter(user_id=user_id, status=GameSessionStatus.ENDED).order_by("-id")
+    scores = [score async for score in sessions.values_list("score", flat=True)[:count]]
+    return sum(scores) // len(scores) if scores else 0
+
+
+class InMemoryMatchQueue:
+    """Per bracket, the waiting players in arrival order."""
+
+    def __init__(self):
+        self.brackets: Dict[int, "OrderedDict[int, Ticket]"] = {}
+        self.waiting: Dict[int, int] = {}  # user -> bracket
+
+    async def enqueue(self, ticket: Ticket, bracket: int = 0) -> Optional[Pair]:
+        """Pair ``ticket`` with the longest-waiting player of ``bracket`` and
+        return ``(opponent, ticket)``, or queue it and return ``None``."""
+        # a player queued again (another socket) replaces their old ticket
+        self._remove(ticket.user)
+        queue = self.brackets.get(bracket)
+        if queue:
+            _, opponent = queue.popitem(last=False)
+            del self.waiting[opponent.user]
+            if not queue:
+                del self.brackets[bracket]
+            return opponent, ticket
+        self.brackets.setdefault(bracket, OrderedDict())[ticket.user] = ticket
+        self.waiting[ticket.user] = bracket
+        return None
+
+    async def cancel(self, ticket: Ticket) -> bool:
+        """Leave the queue, unless ``ticket`` was paired or replaced meanwhile."""
+        bracket = self.waiting.get(ticket.user)
+        if bracket is None or self.brackets[bracket][ticket.user] != ticket:
+            return False
+        self._remove(ticket.user)
+        return True
+
+    def _remove(self, user: int) -> None:
+        bracket = self.waiting.pop(user, None)
+        if bracket is not None:
+            queue = self.brackets[bracket]
+            del queue[user]
+            if not queue:
+                del self.brackets[bracket]
+
+    async def waiting_count(self) -> int:
+        return len(self.waiting)
+
+
+class RedisMatchQueue:
+    """Per bracket a list ``<prefix>bracket:<n>`` of encoded tickets, and the
+    current ticket of every waiting player in the hash ``<prefix>waiting``.
+
+    Cancelling only deletes the hash entry; list entries that no longer match
+    it are dropped when they reach the head. Pairing reads the head under
+    ``WATCH`` and pops it in ``MULTI``, so two workers never take the same
+    opponent.
+    """
+
+    def __init__(self, client, prefix: str = "ts:quickmatch:"):
+        self.redis = client
+        self.waiting_key = f"{prefix}waiting"
+        self.prefix = f"{prefix}bracket:"
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisMatchQueue":
+        from redis.asyncio import Redis
+
+        return cls(Redis.from_url(url), **kwargs)
+
+    async def enqueue(self, ticket: Ticket, bracket: int = 0) -> Optional[Pair]:
+        from redis.exceptions import WatchError
+
+        key = f"{self.prefix}{bracket}"
+        raw = ticket.encode()
+        async with self.redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(key, self.waiting_key)
+                    head = await pipe.lindex(key, 0)
+                    if head is None:
+                        pipe.multi()
+                        pipe.rpush(key, raw)
+                        pipe.hset(self.waiting_key, str(ticket.user), raw)
+                        await pipe.execute()
+                        return None
+                    opponent = Ticket.decode(head)
+                    current = await pipe.hget(self.waiting_key, str(opponent.user))
+                    pipe.multi()
+                    pipe.lpop(key)
+                    if current != head or opponent.user == ticket.user:
+                        # cancelled, or this player's own earlier ticket
+                        await pipe.execute()
+                        continue
+                    pipe.hdel(self.waiting_key, str(opponent.user), str(ticket.user))
+                    await pipe.execute()
+                    return opponent, ticket
+                except WatchError:
+                    continue
+
+    async def cancel(self, ticket: Ticket) -> bool:
+        from redis.exceptions import WatchError
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(self.waiting_key)
+                    current = await pipe.hget(self.waiting_key, str(ticket.user))
+                    if current is None or Ticket.decode(current) != ticket:
+                        await pipe.unwatch()
+                        return False
+                    pipe.multi()
+                    pipe.hdel(self.waiting_key, str(ticket.user))
+                    await pipe.execute()
+                    return True
+                except WatchError:
+                    continue
+
+    async def waiting_count(self) -> int:
+        return await self.redis.hlen(self.waiting_key)
+
+
+async def place_match(opponent: Ticket, ticket: Ticket, rooms, channel_layer) -> Optional[LiveRoom]:
+    """Seat a pair in a new room and tell both sockets where it is. If the room
+    cannot be opened, the ``GameRoom`` is deleted again and both sockets are
+    sent ``match_failed`` instead; returns ``None`` then."""
+    game_room = await GameRoom.objects.acreate(player_1_id=opponent.user, player_2_id=ticket.user)
+    try:
+        event = await rooms.create(
+            player_1=opponent.user, player_2=ticket.user, room_id=str(game_room.pk), game_room_id=game_room.pk
+        )
+    except Exception:
+        logger.exception("Quick match: could not open room %s for users %s and %s", game_room.pk, opponent.user, ticket.user)
+        await game_room.adelete()
+        for seated in (opponent, ticket):
+            await channel_layer.send(seated.channel, {"type": "match_failed"})
+        return None
+    await broadcaster(rooms).publish(channel_layer, [event])
+    for seated in (opponent, ticket):
+        await channel_layer.send(seated.channel, {"type": "match_found", "room": event.room.to_dict()})
+    logger.info("Quick match: users %s and %s in room %s", opponent.user, ticket.user, event.room_id)
+    return event.room
+
+
+_queue = None
+
+
+def match_queue():
+    """The quick-match queue of this worker, built from ``TS_MATCHMAKING_QUEUE``."""
+    global _queue
+    if _queue is None:
+        backend = getattr(settings, "TS_MATCHMAKING_QUEUE", "memory")
+        if backend == "redis":
+            _queue = RedisMatchQueue.from_url(settings.TS_REDIS_URL)
+        else:
+            _queue = InMemoryMatchQueue()
+    return _queue
@@ -1,27 +1,13 @@
-from channels.db import database_sync_to_async
-from django.contrib.auth.models import AnonymousUser
-from rest_framework_simplejwt.tokens import UntypedToken
-from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
-from jwt import decode as jwt_decode
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.conf import settings
-from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
 from urllib.parse import parse_qs
 
-User = get_user_model()
+from .authentication import auser_for_token
 
-@database_sync_to_async
-def get_user(token_key):
-    try:
-        UntypedToken(token_key)
-    except (InvalidToken, TokenError) as e:
-        return AnonymousUser()
 
-    decoded_data = jwt_decode(token_key, settings.SECRET_KEY, algorithms=["HS256"])
-    user_id = decoded_data.get("user_id")
-    try:
-        return User.objects.get(id=user_id)
-    except User.DoesNotExist:
-        return AnonymousUser()
+async def get_user(token_key):
+    return await auser_for_token(token_key) or AnonymousUser()
 
 class JwtAuthMiddleware:
     def __init__(self, app):
@@ -38,3 +24,29 @@ class JwtAuthMiddleware:
             scope["user"] = AnonymousUser()
 
         return await self.app(scope, receive, send)
+
+
+class AsgiUrlconfMiddleware:
+    """Resolve POSTs through ``TS_ASGI_URLCONF`` when Django runs the request
+    asynchronously (under an ASGI server), so the game actions are served by
+    ``ts.async_views``; under WSGI requests pass through unchanged."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        urlconf = getattr(settings, "TS_ASGI_URLCONF", None)
+        if urlconf and request.method == "POST":
+            request.urlconf = urlconf
+        return await self.get_response(request)
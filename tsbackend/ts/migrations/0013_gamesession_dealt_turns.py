@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ts', '0012_gameroom'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gamesession',
+            name='dealt_turns',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ts', '0013_gamesession_dealt_turns'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WeeklyScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week', models.CharField(max_length=8)),
+                ('score', models.PositiveIntegerField(default=0)),
+                ('ended_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ('week', '-score', '-ended_at'),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='gamesession',
+            index=models.Index(fields=['status', 'ended_at'], name='ts_gamesess_status_a9db23_idx'),
+        ),
+        migrations.AddField(
+            model_name='weeklyscore',
+            name='session',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='ts.gamesession'),
+        ),
+        migrations.AddField(
+            model_name='weeklyscore',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='weekly_scores', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='weeklyscore',
+            index=models.Index(fields=['week', '-score', '-ended_at'], name='ts_weeklysc_week_fae4d1_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='weeklyscore',
+            unique_together={('week', 'user')},
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ts', '0014_weeklyscore'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='gameroom',
+            index=models.Index(fields=['created_at', 'id'], name='ts_gameroom_created_1b9f8c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gamesession',
+            index=models.Index(fields=['user', 'status', 'ended_at', 'id'], name='ts_gamesess_user_id_d03381_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ts', '0015_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gamesession',
+            name='reveal_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -96,6 +96,10 @@ class GameSession(models.Model):
         related_name="+",
     )
     health = models.PositiveIntegerField(default=3)
+    # highest sequence_index generated so far (turns are dealt ahead in deck mode)
+    dealt_turns = models.PositiveIntegerField(default=0)
+    # set by guess-and-advance: the new current turn accepts no guess before this
+    reveal_until = models.DateTimeField(null=True, blank=True)
     started_at = models.DateTimeField(auto_now_add=True)
     ended_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -105,6 +109,10 @@ class GameSession(models.Model):
         ordering = ("-created_at",)
         indexes = [
             models.Index(fields=("user", "status")),
+            # weekly leaderboard rebuild: ENDED sessions within an ended_at range
+            models.Index(fields=("status", "ended_at")),
+            # previous-results, paged by (ended_at, id)
+            models.Index(fields=("user", "status", "ended_at", "id")),
         ]
 
     def __str__(self):
@@ -157,6 +165,34 @@ class GameTurn(models.Model):
         self.answered_at = timezone.now()
 
 
+class WeeklyScore(models.Model):
+    """Best finished session of a user in an ISO week (e.g. "2026-W42").
+
+    Maintained when a session ends and rebuilt from ``GameSession`` history by
+    ``manage.py rebuild_leaderboard``.
+    """
+
+    week = models.CharField(max_length=8)
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="weekly_scores"
+    )
+    session = models.ForeignKey(
+        GameSession, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    score = models.PositiveIntegerField(default=0)
+    ended_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ("week", "-score", "-ended_at")
+        unique_together = (("week", "user"),)
+        indexes = [
+            models.Index(fields=("week", "-score", "-ended_at")),
+        ]
+
+    def __str__(self):
+        return f"{self.week} user={self.user_id} score={self.score}"
+
+
 class GameRoom(models.Model):
     status = models.CharField(
         max_length=16,
@@ -188,6 +224,7 @@ class GameRoom(models.Model):
         indexes = [
             models.Index(fields=("status",)),
             models.Index(fields=("player_1", "player_2")),
+            models.Index(fields=("created_at", "id")),
         ]
 
     def __str__(self):
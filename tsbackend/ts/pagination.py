@@ -0,0 +1,163 @@
+"""Keyset (cursor) pagination over composite orderings.
+
+``PageNumberPagination`` runs a ``COUNT(*)`` and an ``OFFSET`` scan for every
+page, which gets linear on deep pages of large tables. ``KeysetPagination``
+instead remembers the ordering values of the last row it returned and asks
+for the rows after them, which an index on the ordering columns answers
+directly. Orderings may mix directions (``-ended_at, id``), so "after" is
+spelled out column by column rather than as a row-value comparison:
+``created_at < ? OR (created_at = ? AND id < ?)``.
+
+A viewset opts in with ``pagination_class`` and names its ordering in
+``keyset_ordering`` (or ``get_keyset_ordering()``); the last column must be
+unique, typically ``id``. ``PageNumberOrKeysetPagination`` keeps the page
+numbers and ``count`` of the default pagination and only pages by keyset
+when the client passes ``?cursor=``.
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Sequence
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = "cursor"
+    ordering: Sequence[str] = ("-created_at", "-id")
+    invalid_cursor_message = "Invalid cursor"
+
+    def get_ordering(self, view) -> Sequence[str]:
+        if hasattr(view, "get_keyset_ordering"):
+            return view.get_keyset_ordering()
+        return getattr(view, "keyset_ordering", self.ordering)
+
+    def paginate_queryset(self, queryset, request, view=None) -> Optional[List[Any]]:
+        self.request = request
+        self.ordering = tuple(self.get_ordering(view))
+        reverse, position = self.decode_cursor(request, queryset.model)
+
+        ordering = self._reversed(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._after(ordering, position))
+
+        rows = list(queryset[: self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+        if reverse:
+            rows.reverse()
+
+        # Going back from a cursor means there is a next page, and vice versa.
+        self.has_next = has_more if not reverse else True
+        self.has_previous = has_more if reverse else position is not None
+        self.first_position = self._position(rows[0]) if rows else position
+        self.last_position = self._position(rows[-1]) if rows else position
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_next_link(self) -> Optional[str]:
+        if not self.has_next or self.last_position is None:
+            return None
+        return self._link(False, self.last_position)
+
+    def get_previous_link(self) -> Optional[str]:
+        if not self.has_previous or self.first_position is None:
+            return None
+        return self._link(True, self.first_position)
+
+    def _link(self, reverse: bool, position: List[Any]) -> str:
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(reverse, position))
+
+    def encode_cursor(self, reverse: bool, position: List[Any]) -> str:
+        payload = {"r": int(reverse), "p": [v.isoformat() if isinstance(v, datetime) else v for v in position]}
+        return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return False, None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            position = payload["p"]
+            if not isinstance(position, list) or len(position) != len(self.ordering):
+                raise ValueError
+            # a cursor is client input: values that do not fit their column
+            # would otherwise fail inside the query
+            position = [
+                model._meta.get_field(field.lstrip("-")).to_python(value)
+                for field, value in zip(self.ordering, position)
+            ]
+            if None in position:
+                raise ValueError
+            return bool(payload.get("r")), position
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _position(self, row) -> List[Any]:
+        return [getattr(row, field.lstrip("-")) for field in self.ordering]
+
+    @staticmethod
+    def _reversed(ordering: Sequence[str]) -> tuple:
+        return tuple(f[1:] if f.startswith("-") else f"-{f}" for f in ordering)
+
+    @staticmethod
+    def _after(ordering: Sequence[str], position: List[Any]) -> Q:
+        # (a, b, c) after (x, y, z)  ==  a>x OR (a=x AND b>y) OR (a=x AND b=y AND c>z)
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, position):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        return condition
+
+
+class PageNumberOrKeysetPagination(PageNumberPagination):
+    """Page numbers by default; keyset pagination when the request carries a
+    ``cursor`` parameter (an empty one asks for the first page)."""
+
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.keyset_class.cursor_query_param in request.query_params:
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,53 @@
+"""Response bodies of the single-player game actions.
+
+``GameSessionViewSet``, ``ts.async_views`` and the game socket serve the same
+actions; they build their bodies here so the transports cannot drift apart.
+``context`` is the serializer context: it carries the request that absolute
+song and poster URLs are built from.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Optional
+
+from .serializers import GameSessionSerlaiizer, GameTurnSerializer
+from .services import reveal_delay_ms
+
+
+def turn_data(turn, context: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    return GameTurnSerializer(turn, context=context).data if turn is not None else None
+
+
+def start_payload(session, context: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "session": GameSessionSerlaiizer(session).data,
+        "turn": turn_data(session.current_turn, context),
+        "preloaded_turn": turn_data(session.next_turn, context),
+    }
+
+
+def guess_payload(turn, session, context: Dict[str, Any]) -> Dict[str, Any]:
+    return {"turn": turn_data(turn, context), "session": GameSessionSerlaiizer(session).data}
+
+
+def guess_and_advance_payload(turn, session, new_turn, preloaded_turn, context: Dict[str, Any]) -> Dict[str, Any]:
+    advanced = new_turn is not None
+    return {
+        "turn": turn_data(turn, context),
+        "session": GameSessionSerlaiizer(session).data,
+        "new_turn": turn_data(new_turn, context),
+        "preloaded_turn": turn_data(preloaded_turn, context) if advanced else None,
+        "reveal_ms": reveal_delay_ms() if advanced else 0,
+    }
+
+
+def next_turn_payload(session, new_turn, preloaded_turn, context: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "session": GameSessionSerlaiizer(session).data,
+        "new_turn": turn_data(new_turn, context),
+        "preloaded_turn": turn_data(preloaded_turn, context),
+    }
+
+
+def end_session_payload(session, turn, context: Dict[str, Any]) -> Dict[str, Any]:
+    return {"session": GameSessionSerlaiizer(session).data, "turn": turn_data(turn, context)}
@@ -0,0 +1,427 @@
+"""Registry of live dual-mode rooms shown in the lobby.
+
+``InMemoryRoomRegistry`` keeps the rooms in a dict of the worker process, which
+is only correct with a single worker. ``RedisRoomRegistry`` keeps one JSON
+document per room in Redis and applies create/join/leave with ``WATCH``/
+``MULTI``, so several workers see and change the same rooms atomically.
+``TS_ROOM_REGISTRY`` selects the backend; ``registry()`` returns the worker's
+instance.
+
+Every change returns a ``RoomEvent`` numbered by a lobby-wide sequence, and
+``snapshot()`` returns the sequence it is current up to, so lobby clients can
+apply events on top of a snapshot and detect missed ones.
+
+Both registries keep an expiry index of empty rooms ordered by ``updated_at``
+(a heap, or a Redis sorted set), so ``reap()`` only looks at rooms that have
+been empty for longer than the grace period. ``ts.lobby.RoomReaper`` calls it
+in the background.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import json
+import logging
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import RoomStatus
+
+logger = logging.getLogger(__name__)
+
+
+def empty_room_grace_secs() -> float:
+    """Seconds an empty room survives, so its creator has time to connect."""
+    return getattr(settings, "TS_LOBBY_EMPTY_ROOM_GRACE_SECS", 10)
+
+
+@dataclass
+class LiveRoom:
+    id: str
+    status: str = RoomStatus.WAITING
+    player_1: Optional[int] = None
+    player_2: Optional[int] = None
+    player_1_score: int = 0
+    player_2_score: int = 0
+    current_song: Optional[int] = None
+    # the GameRoom the room was opened for, which the match result updates
+    game_room_id: Optional[int] = None
+    # players who asked to start the match
+    ready: List[int] = field(default_factory=list)
+    members: Set[str] = field(default_factory=set)
+    created_at: Any = field(default_factory=timezone.now)
+    updated_at: Any = field(default_factory=timezone.now)
+
+    def add_member(self, channel_name: str, user: Any = None) -> None:
+        self.members.add(channel_name)
+        self.updated_at = timezone.now()
+        if user and getattr(user, "is_authenticated", False):
+            # Assign slots
+            if user.id in (self.player_1, self.player_2):
+                pass
+            elif self.player_1 is None:
+                self.player_1 = user.id
+            elif self.player_2 is None:
+                self.player_2 = user.id
+
+    def remove_member(self, channel_name: str) -> None:
+        self.members.discard(channel_name)
+        self.updated_at = timezone.now()
+
+    def mark_ready(self, user_id: int) -> bool:
+        """Record that ``user_id`` is ready; once both players are, the match
+        starts. Returns whether anything changed."""
+        if self.status != RoomStatus.WAITING or user_id not in (self.player_1, self.player_2):
+            return False
+        if user_id not in self.ready:
+            self.ready.append(user_id)
+        if self.player_1 is not None and self.player_2 is not None and len(self.ready) == 2:
+            self.status = RoomStatus.IN_GAME
+        self.updated_at = timezone.now()
+        return True
+
+    def is_stale(self, now: datetime, grace_secs: float) -> bool:
+        return not self.members and (now - self.updated_at).total_seconds() > grace_secs
+
+    def to_dict(self) -> Dict[str, Any]:
+        status_value = getattr(self.status, "value", self.status)
+        return {
+            "id": self.id,
+            "status": status_value,
+            "player_1": self.player_1,
+            "player_2": self.player_2,
+            "player_1_score": self.player_1_score,
+            "player_2_score": self.player_2_score,
+            "current_song": self.current_song,
+            "game_room_id": self.game_room_id,
+            "ready": list(self.ready),
+            "members": len(self.members),
+            "created_at": self.created_at.isoformat(),
+            "updated_at": self.updated_at.isoformat(),
+        }
+
+    def to_json(self) -> str:
+        data = self.to_dict()
+        data["members"] = sorted(self.members)
+        return json.dumps(data)
+
+    @classmethod
+    def from_json(cls, raw: Any) -> "LiveRoom":
+        data = json.loads(raw)
+        data["members"] = set(data["members"])
+        data["created_at"] = datetime.fromisoformat(data["created_at"])
+        data["updated_at"] = datetime.fromisoformat(data["updated_at"])
+        return cls(**data)
+
+
+@dataclass
+class RoomEvent:
+    """A change to one room, numbered by the registry's lobby sequence."""
+
+    type: str  # "room_added", "room_updated" or "room_removed"
+    seq: int
+    room_id: str
+    room: Optional[LiveRoom] = None
+
+    def to_message(self) -> Dict[str, Any]:
+        data = self.room.to_dict() if self.room is not None else {"id": self.room_id}
+        return {"type": self.type, "seq": self.seq, "data": data}
+
+
+def _event_type(existed: bool, exists: bool) -> Optional[str]:
+    if not exists:
+        return "room_removed" if existed else None
+    return "room_updated" if existed else "room_added"
+
+
+def _new_room_id() -> str:
+    # 8-char random id
+    return uuid.uuid4().hex[:8]
+
+
+class InMemoryRoomRegistry:
+    def __init__(self):
+        self.rooms: Dict[str, LiveRoom] = {}
+        self.seq = 0
+        self.lock = asyncio.Lock()
+        # (updated_at, room_id) of rooms that were empty at that time; entries
+        # of rooms changed since are skipped when they come up
+        self.expiry: List[Tuple[datetime, str]] = []
+
+    def _event(self, event_type: Optional[str], room_id: str, room: Optional[LiveRoom]) -> Optional[RoomEvent]:
+        if event_type is None:
+            return None
+        if room is not None and not room.members:
+            heapq.heappush(self.expiry, (room.updated_at, room_id))
+        self.seq += 1
+        return RoomEvent(event_type, self.seq, room_id, room)
+
+    async def create(
+        self, *, player_1: Optional[int] = None, player_2: Optional[int] = None, room_id: Optional[str] = None,
+        game_room_id: Optional[int] = None,
+    ) -> RoomEvent:
+        """A new room, with a random id unless ``room_id`` (which must be free) is
+        given; ``game_room_id`` is the ``GameRoom`` it was opened for, if any."""
+        async with self.lock:
+            if room_id is not None and room_id in self.rooms:
+                raise ValueError(f"Room {room_id} already exists.")
+            while room_id is None or room_id in self.rooms:
+                room_id = _new_room_id()
+            room = self.rooms[room_id] = LiveRoom(
+                id=room_id, player_1=player_1, player_2=player_2, game_room_id=game_room_id
+            )
+            return self._event("room_added", room_id, room)
+
+    async def join(self, room_id: str, channel_name: str, user: Any = None) -> RoomEvent:
+        async with self.lock:
+            room = self.rooms.get(room_id)
+            event_type = "room_updated"
+            if room is None:
+                # create adhoc room if joined directly by id
+                room = self.rooms[room_id] = LiveRoom(id=room_id)
+                event_type = "room_added"
+                logger.info("Created adhoc room %s", room_id)
+            room.add_member(channel_name, user)
+            return self._event(event_type, room_id, room)
+
+    async def leave(self, room_id: str, channel_name: str) -> Optional[RoomEvent]:
+        async with self.lock:
+            room = self.rooms.get(room_id)
+            if room is None:
+                logger.warning("Attempted to remove member from non-existent room %s", room_id)
+                return None
+            room.remove_member(channel_name)
+            if not room.members:
+                del self.rooms[room_id]
+                logger.info("Room %s deleted because it is empty.", room_id)
+                return self._event("room_removed", room_id, None)
+            return self._event("room_updated", room_id, room)
+
+    async def ready(self, room_id: str, user_id: int) -> Optional[RoomEvent]:
+        """Mark a player ready. The event's room is ``IN_GAME`` only for the
+        call that made the second player ready."""
+        async with self.lock:
+            room = self.rooms.get(room_id)
+            if room is None or not room.mark_ready(user_id):
+                return None
+            return self._event("room_updated", room_id, room)
+
+    async def update(self, room_id: str, **fields: Any) -> Optional[RoomEvent]:
+        """Set fields (scores, ``current_song``, ``status``) of an existing room."""
+        async with self.lock:
+            room = self.rooms.get(room_id)
+            if room is None:
+                return None
+            for name, value in fields.items():
+                setattr(room, name, value)
+            room.updated_at = timezone.now()
+            return self._event("room_updated", room_id, room)
+
+    async def snapshot(self) -> Tuple[int, List[LiveRoom]]:
+        async with self.lock:
+            return self.seq, list(self.rooms.values())
+
+    async def reap(self, grace_secs: Optional[float] = None) -> List[RoomEvent]:
+        """Remove rooms that have been empty for longer than ``grace_secs``."""
+        grace_secs = empty_room_grace_secs() if grace_secs is None else grace_secs
+        async with self.lock:
+            now = timezone.now()
+            cutoff = now - timedelta(seconds=grace_secs)
+            events = []
+            while self.expiry and self.expiry[0][0] < cutoff:
+                updated_at, room_id = heapq.heappop(self.expiry)
+                room = self.rooms.get(room_id)
+                if room is None or room.updated_at != updated_at or not room.is_stale(now, grace_secs):
+                    continue
+                del self.rooms[room_id]
+                logger.info("Deleted empty/zombie room %s", room_id)
+                events.append(self._event("room_removed", room_id, None))
+            return events
+
+
+class _RoomIdTaken(Exception):
+    pass
+
+
+class _Unchanged(Exception):
+    pass
+
+
+class RedisRoomRegistry:
+    """Rooms as ``<prefix>room:<id>`` JSON strings plus a ``<prefix>rooms`` id set,
+    and the ids of empty rooms in ``<prefix>expiry`` scored by ``updated_at``.
+
+    Every change reads the room under ``WATCH`` and writes it in ``MULTI``
+    together with an ``INCR`` of ``<prefix>seq``, so event numbers follow the
+    order in which workers changed rooms. A concurrent change from another
+    worker aborts the write, which is then retried on the new value.
+    """
+
+    def __init__(self, client, prefix: str = "ts:lobby:"):
+        self.redis = client
+        self.index_key = f"{prefix}rooms"
+        self.seq_key = f"{prefix}seq"
+        self.expiry_key = f"{prefix}expiry"
+        self.prefix = f"{prefix}room:"
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisRoomRegistry":
+        from redis.asyncio import Redis
+
+        return cls(Redis.from_url(url), **kwargs)
+
+    def _key(self, room_id: str) -> str:
+        return f"{self.prefix}{room_id}"
+
+    async def _update(
+        self, room_id: str, change: Callable[[Optional[LiveRoom]], Optional[LiveRoom]]
+    ) -> Optional[RoomEvent]:
+        """Apply ``change`` to the stored room atomically; ``None`` deletes it
+        and raising ``_Unchanged`` leaves it as it is."""
+        from redis.exceptions import WatchError
+
+        key = self._key(room_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(key)
+                    raw = await pipe.get(key)
+                    try:
+                        room = change(LiveRoom.from_json(raw) if raw is not None else None)
+                    except _Unchanged:
+                        await pipe.unwatch()
+                        return None
+                    event_type = _event_type(raw is not None, room is not None)
+                    if event_type is None:
+                        await pipe.unwatch()
+                        return None
+                    pipe.multi()
+                    if room is None:
+                        pipe.delete(key)
+                        pipe.srem(self.index_key, room_id)
+                        pipe.zrem(self.expiry_key, room_id)
+                    else:
+                        pipe.set(key, room.to_json())
+                        pipe.sadd(self.index_key, room_id)
+                        if room.members:
+                            pipe.zrem(self.expiry_key, room_id)
+                        else:
+                            pipe.zadd(self.expiry_key, {room_id: room.updated_at.timestamp()})
+                    pipe.incr(self.seq_key)
+                    seq = (await pipe.execute())[-1]
+                    return RoomEvent(event_type, seq, room_id, room)
+                except WatchError:
+                    continue
+
+    async def create(
+        self, *, player_1: Optional[int] = None, player_2: Optional[int] = None, room_id: Optional[str] = None,
+        game_room_id: Optional[int] = None,
+    ) -> RoomEvent:
+        def change(room):
+            if room is not None:
+                raise _RoomIdTaken
+            return LiveRoom(id=new_id, player_1=player_1, player_2=player_2, game_room_id=game_room_id)
+
+        while True:
+            new_id = room_id or _new_room_id()
+            try:
+                return await self._update(new_id, change)
+            except _RoomIdTaken:
+                if room_id is not None:
+                    raise ValueError(f"Room {room_id} already exists.")
+
+    async def join(self, room_id: str, channel_name: str, user: Any = None) -> RoomEvent:
+        def change(room):
+            room = room or LiveRoom(id=room_id)
+            room.add_member(channel_name, user)
+            return room
+
+        return await self._update(room_id, change)
+
+    async def leave(self, room_id: str, channel_name: str) -> Optional[RoomEvent]:
+        def change(room):
+            if room is None:
+                return None
+            room.remove_member(channel_name)
+            return room if room.members else None
+
+        return await self._update(room_id, change)
+
+    async def ready(self, room_id: str, user_id: int) -> Optional[RoomEvent]:
+        def change(room):
+            if room is None or not room.mark_ready(user_id):
+                raise _Unchanged
+            return room
+
+        return await self._update(room_id, change)
+
+    async def update(self, room_id: str, **fields: Any) -> Optional[RoomEvent]:
+        def change(room):
+            if room is None:
+                raise _Unchanged
+            for name, value in fields.items():
+                setattr(room, name, value)
+            room.updated_at = timezone.now()
+            return room
+
+        return await self._update(room_id, change)
+
+    async def _rooms(self) -> List[Tuple[str, Optional[LiveRoom]]]:
+        members = await self.redis.smembers(self.index_key)
+        room_ids = sorted(v.decode() if isinstance(v, bytes) else v for v in members)
+        if not room_ids:
+            return []
+        raws = await self.redis.mget([self._key(rid) for rid in room_ids])
+        return [(rid, LiveRoom.from_json(raw) if raw is not None else None) for rid, raw in zip(room_ids, raws)]
+
+    async def snapshot(self) -> Tuple[int, List[LiveRoom]]:
+        # Read the sequence first: a change racing with the read is then also
+        # delivered as an event numbered after the snapshot, and re-applying it
+        # is harmless.
+        seq = int(await self.redis.get(self.seq_key) or 0)
+        rooms = [room for _, room in await self._rooms() if room is not None]
+        rooms.sort(key=lambda room: room.created_at)
+        return seq, rooms
+
+    async def reap(self, grace_secs: Optional[float] = None) -> List[RoomEvent]:
+        """Remove rooms that have been empty for longer than ``grace_secs``."""
+        grace_secs = empty_room_grace_secs() if grace_secs is None else grace_secs
+        now = timezone.now()
+        cutoff = (now - timedelta(seconds=grace_secs)).timestamp()
+
+        def change(room):
+            # re-checked under WATCH: a member may have joined meanwhile
+            if room is not None and not room.is_stale(now, grace_secs):
+                raise _Unchanged
+            return None
+
+        events = []
+        for room_id in await self.redis.zrangebyscore(self.expiry_key, "-inf", f"({cutoff}"):
+            room_id = room_id.decode() if isinstance(room_id, bytes) else room_id
+            event = await self._update(room_id, change)
+            if event is not None:
+                events.append(event)
+            elif not await self.redis.exists(self._key(room_id)):
+                await self.redis.zrem(self.expiry_key, room_id)
+        return events
+
+
+_registry = None
+
+
+def registry():
+    """The room registry of this worker, built from ``TS_ROOM_REGISTRY``."""
+    global _registry
+    if _registry is None:
+        backend = getattr(settings, "TS_ROOM_REGISTRY", "memory")
+        if backend == "redis":
+            _registry = RedisRoomRegistry.from_url(settings.TS_REDIS_URL)
+        else:
+            _registry = InMemoryRoomRegistry()
+    return _registry
@@ -0,0 +1,326 @@
+"""Dual-mode matches run by the server.
+
+Once both players of a room have sent ``{"type": "ready"}``, the worker that
+saw the second one starts a ``RoundEngine`` for the room. The engine owns the
+match: it deals every round through ``ts.services``, decides who answered
+first and keeps the scores, so clients only play what they are sent and
+answer.
+
+Before the first round the engine pings the room ``TS_MATCH_CLOCK_SAMPLES``
+times. Clients reply ``{"type": "pong", "data": {"server_ms": <echoed>,
+"client_ms": <their clock>}}`` and ``ClockSync`` estimates each player's clock
+offset from the reply with the shortest round trip. A round is announced once
+to the whole room with its start time in server time (``server_play_at``) and
+in each player's clock (``play_at``), at least ``TS_MATCH_LEAD_MS`` and two
+round trips ahead, so both players have the audio loaded and start together.
+
+The first correct ``{"type": "answer", "data": {"round": i, "option": ...}}``
+to reach the engine wins the round; a wrong answer locks the player out of
+it. The lobby's ``LiveRoom`` gets the scores after every round, the
+``GameRoom`` gets them in one write when the match is over.
+
+Engine messages reach the room as ``round_frame`` group messages carrying the
+engine's own channel, to which ``RoomConsumer`` forwards pongs and answers.
+Players connected to another worker thus reach the engine as well.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import services
+from .db import db_sync_to_async
+from .fanout import encode
+from .lobby import broadcaster
+from .models import GameRoom, RoomStatus
+from .rooms import LiveRoom, RoomEvent
+from .spectators import publish_room, spectator_feed
+
+logger = logging.getLogger(__name__)
+
+# client messages RoomConsumer forwards to the room's engine
+ROUND_INPUT_TYPES = ("pong", "answer")
+
+
+def now_ms() -> float:
+    return time.time() * 1000
+
+
+class ClockSync:
+    """Offset of one client's clock from the server's, from ping round trips.
+
+    The client reads its clock about halfway through a round trip; the
+    shortest trip bounds that guess best, so its sample is used.
+    """
+
+    def __init__(self, keep: int = 8):
+        self.samples: Deque[Tuple[float, float]] = deque(maxlen=keep)
+
+    def add(self, sent_ms: float, client_ms: float, received_ms: float) -> None:
+        rtt = received_ms - sent_ms
+        self.samples.append((rtt, client_ms - (sent_ms + rtt / 2)))
+
+    @property
+    def rtt_ms(self) -> float:
+        return min(self.samples)[0] if self.samples else 0.0
+
+    @property
+    def offset_ms(self) -> float:
+        """Client clock minus server clock."""
+        return min(self.samples)[1] if self.samples else 0.0
+
+    def to_client(self, server_ms: float) -> float:
+        return server_ms + self.offset_ms
+
+
+@dataclass
+class Round:
+    index: int
+    song: int
+    audio_url: str
+    snippet_start_sec: int
+    options: List[str]
+    correct_option: str
+    time_limit_secs: int
+    play_at: float = 0.0  # server clock, ms
+    winner: Optional[int] = None
+    answered: Set[int] = field(default_factory=set)
+
+    @property
+    def deadline(self) -> float:
+        return self.play_at + self.time_limit_secs * 1000
+
+
+def deal_round(index: int, score: int, exclude: Set[int], context: Optional[Dict[str, Any]] = None) -> Round:
+    """A round as ``services`` deals single-player turns, at the difficulty of
+    the leading player's ``score``. With a ``request`` in ``context`` the
+    audio URL is absolute, as in REST turn payloads."""
+    song = services.pick_song(score, exclude)
+    title = song.song_title.title
+    request = (context or {}).get("request")
+    return Round(
+        index=index,
+        song=song.id,
+        audio_url=request.build_absolute_uri(song.file.url) if request else song.file.url,
+        snippet_start_sec=services.pick_snippet_start(score),
+        options=services.build_options(title),
+        correct_option=title,
+        time_limit_secs=services.calc_time_limit(score),
+    )
+
+
+def save_match(
+    game_room_id: Optional[int], player_1: int, player_2: int, player_1_score: int, player_2_score: int,
+    current_song: Optional[int],
+) -> int:
+    """Write the result with a single query: an ``UPDATE`` of the ``GameRoom``
+    the live room was opened for, otherwise an ``INSERT``. Returns the
+    ``GameRoom`` id."""
+    values = {
+        "status": RoomStatus.FINISHED,
+        "player_1_score": player_1_score,
+        "player_2_score": player_2_score,
+        "current_song_id": current_song,
+    }
+    if game_room_id is not None:
+        rooms = GameRoom.objects.filter(pk=game_room_id, player_1_id=player_1)
+        if rooms.update(player_2_id=player_2, updated_at=timezone.now(), **values):
+            return game_room_id
+    return GameRoom.objects.create(player_1_id=player_1, player_2_id=player_2, **values).pk
+
+
+# matches running in this worker, by room id
+engines: Dict[str, "RoundEngine"] = {}
+
+
+class RoundEngine:
+    """One match of ``TS_MATCH_ROUNDS`` rounds in the room ``room``.
+
+    ``context`` is the serializer context of the socket that started the
+    match; its request gives audio URLs their host.
+    """
+
+    def __init__(
+        self, room: LiveRoom, channel_layer, rooms, rounds: Optional[int] = None,
+        context: Optional[Dict[str, Any]] = None,
+    ):
+        self.room_id = room.id
+        self.game_room_id = room.game_room_id
+        self.players = (room.player_1, room.player_2)
+        self.channel_layer = channel_layer
+        self.rooms = rooms
+        self.rounds = rounds or getattr(settings, "TS_MATCH_ROUNDS", 10)
+        self.context = context or {}
+        self.group = f"room_{room.id}"
+        self.channel: Optional[str] = None
+        self.clocks = {player: ClockSync() for player in self.players}
+        self.scores = {player: 0 for player in self.players}
+        self.round: Optional[Round] = None
+        self.task: Optional[asyncio.Task] = None
+        self._round_over = asyncio.Event()
+
+    async def start(self) -> None:
+        self.channel = await self.channel_layer.new_channel("round.")
+        engines[self.room_id] = self
+        self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def run(self) -> None:
+        listener = asyncio.get_running_loop().create_task(self._listen())
+        try:
+            await self.sync_clocks()
+            last_song = None
+            dealt: Set[int] = set()
+            for index in range(self.rounds):
+                played = await self.play_round(index, dealt)
+                if played is None:
+                    break
+                last_song = played.song
+                if index + 1 < self.rounds:
+                    await asyncio.sleep(services.reveal_delay_ms() / 1000)
+            await self.finish(last_song)
+        except Exception:
+            logger.exception("Match in room %s failed", self.room_id)
+        finally:
+            listener.cancel()
+            engines.pop(self.room_id, None)
+
+    async def _listen(self) -> None:
+        while True:
+            message = await self.channel_layer.receive(self.channel)
+            self.handle(message, now_ms())
+
+    def handle(self, message: Dict[str, Any], received_ms: float) -> None:
+        user, data = message.get("user"), message.get("data") or {}
+        if user not in self.scores:
+            return
+        if message.get("message_type") == "pong":
+            try:
+                self.clocks[user].add(float(data["server_ms"]), float(data["client_ms"]), received_ms)
+            except (KeyError, TypeError, ValueError):
+                pass
+        elif message.get("message_type") == "answer":
+            self.answer(user, data, received_ms)
+
+    def answer(self, user: int, data: Dict[str, Any], received_ms: float) -> None:
+        current = self.round
+        if current is None or current.winner is not None:
+            return
+        if data.get("round") != current.index or user in current.answered:
+            return
+        # an answer given at the deadline arrives up to one trip later
+        if received_ms > current.deadline + self.clocks[user].rtt_ms / 2:
+            return
+        current.answered.add(user)
+        if data.get("option") == current.correct_option:
+            current.winner = user
+            self.scores[user] += 1
+        if current.winner is not None or len(current.answered) == len(self.players):
+            self._round_over.set()
+
+    async def send(self, payload: Dict[str, Any]) -> None:
+        await self.channel_layer.group_send(
+            self.group, {"type": "round_frame", "engine": self.channel, "text": encode(payload)}
+        )
+
+    async def publish(self, event: Optional[RoomEvent]) -> None:
+        if event is not None:
+            await broadcaster(self.rooms).publish(self.channel_layer, [event])
+            await publish_room(self.channel_layer, event)
+
+    async def show_round(self, current: Round) -> None:
+        """The round as spectators see it: no options, the answer once it is over."""
+        await spectator_feed(self.room_id).update(self.channel_layer, round={
+            "round": current.index,
+            "rounds": self.rounds,
+            "server_play_at": current.play_at,
+            "time_limit_secs": current.time_limit_secs,
+            "winner": current.winner,
+            "correct_option": current.correct_option if self.round is None else None,
+        })
+
+    def score_map(self) -> Dict[str, int]:
+        return {str(player): score for player, score in self.scores.items()}
+
+    def max_rtt_ms(self) -> float:
+        return max(clock.rtt_ms for clock in self.clocks.values())
+
+    async def sync_clocks(self) -> None:
+        interval = getattr(settings, "TS_MATCH_PING_INTERVAL_MS", 100) / 1000
+        for _ in range(getattr(settings, "TS_MATCH_CLOCK_SAMPLES", 5)):
+            await self.send({"type": "ping", "data": {"server_ms": now_ms()}})
+            await asyncio.sleep(interval)
+
+    async def play_round(self, index: int, dealt: Set[int]) -> Optional[Round]:
+        """Play one round; ``None`` when the room is gone."""
+        current = await db_sync_to_async(deal_round)(index, max(self.scores.values()), dealt, self.context)
+        dealt.add(current.song)
+        lead_ms = max(getattr(settings, "TS_MATCH_LEAD_MS", 1500), 2 * self.max_rtt_ms())
+        current.play_at = now_ms() + lead_ms
+        self._round_over.clear()
+        self.round = current
+        await self.send({
+            "type": "round",
+            "data": {
+                "round": index,
+                "rounds": self.rounds,
+                "song": {
+                    "id": current.song,
+                    "audio_url": current.audio_url,
+                    "snippet_start_sec": current.snippet_start_sec,
+                },
+                "options": current.options,
+                "time_limit_secs": current.time_limit_secs,
+                "server_play_at": current.play_at,
+                "play_at": {str(p): self.clocks[p].to_client(current.play_at) for p in self.players},
+            },
+        })
+        await self.show_round(current)
+        timeout = (current.deadline + self.max_rtt_ms() / 2 - now_ms()) / 1000
+        try:
+            await asyncio.wait_for(self._round_over.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self.round = None
+        await self.send({
+            "type": "round_result",
+            "data": {
+                "round": index,
+                "winner": current.winner,
+                "correct_option": current.correct_option,
+                "scores": self.score_map(),
+            },
+        })
+        await self.show_round(current)
+        player_1, player_2 = self.players
+        event = await self.rooms.update(
+            self.room_id,
+            player_1_score=self.scores[player_1],
+            player_2_score=self.scores[player_2],
+            current_song=current.song,
+        )
+        await self.publish(event)
+        return current if event is not None else None
+
+    async def finish(self, last_song: Optional[int]) -> None:
+        player_1, player_2 = self.players
+        game_room = await db_sync_to_async(save_match)(
+            self.game_room_id, player_1, player_2, self.scores[player_1], self.scores[player_2], last_song
+        )
+        await self.publish(await self.rooms.update(self.room_id, status=RoomStatus.FINISHED))
+        scores = sorted(self.scores.items(), key=lambda item: item[1], reverse=True)
+        await self.send({
+            "type": "match_over",
+            "data": {
+                "scores": self.score_map(),
+                "winner": scores[0][0] if scores[0][1] > scores[1][1] else None,
+                "game_room": game_room,
+            },
+        })
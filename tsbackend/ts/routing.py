@@ -1,6 +1,6 @@
 from django.urls import re_path
 
-from .consumers import RoomConsumer, LobbyConsumer
+from .consumers import GameSessionConsumer, LobbyConsumer, MatchmakingConsumer, RoomConsumer
 
 
 websocket_urlpatterns = [
@@ -8,4 +8,8 @@ websocket_urlpatterns = [
     re_path(r"^ws/ts/dualmode/(?P<room_id>[\w-]+)/$", RoomConsumer.as_asgi()),
     # Global lobby broadcast
     re_path(r"^ws/ts/lobby/$", LobbyConsumer.as_asgi()),
+    # Quick match: queued until paired, then sent the room to join
+    re_path(r"^ws/ts/quickmatch/$", MatchmakingConsumer.as_asgi()),
+    # Single-player game actions (REST game-sessions endpoints remain available)
+    re_path(r"^ws/ts/game/$", GameSessionConsumer.as_asgi()),
 ]
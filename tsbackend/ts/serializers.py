@@ -1,6 +1,6 @@
 from rest_framework import serializers
 
-from .models import Song, SongTitle, Poster, Comment, GameSession, GameTurn, GameRoom
+from .models import Song, SongTitle, Poster, Comment, GameSession, GameTurn, GameTurnOutcome, GameRoom
 from core.serializer import UserSerializer
 
 
@@ -25,6 +25,21 @@ class SongSerializer(serializers.ModelSerializer):
         fields = ["id", "file", "song_title"]
 
 
+class SongTitleSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SongTitle
+        fields = ["id", "title", "album"]
+
+
+class SongSummarySerializer(serializers.ModelSerializer):
+    """A song for listings: no lyrics and no poster ids."""
+
+    song_title = SongTitleSummarySerializer()
+
+    class Meta:
+        model = Song
+        fields = ["id", "file", "song_title"]
+
 
 class CommentSerializer(serializers.ModelSerializer):
     class Meta:
@@ -33,17 +48,39 @@ class CommentSerializer(serializers.ModelSerializer):
 
 
 class GameTurnSerializer(serializers.ModelSerializer):
+    # The reveal poster is chosen when the turn is dealt; it would give the
+    # answer away, so it is only shown once the turn was answered correctly.
+    poster_url = serializers.SerializerMethodField()
+    # What the client needs to play the turn, so it does not have to fetch the
+    # song (whose title is the answer) separately.
+    song_data = serializers.SerializerMethodField()
+
     class Meta:
         model = GameTurn
         fields = [
             "id",
             "song",
+            "song_data",
             "options",
             "time_limit_secs",
             "poster_url",
             "outcome"
         ]
 
+    def get_poster_url(self, turn):
+        if turn.outcome != GameTurnOutcome.CORRECT:
+            return None
+        return turn.poster_url or None
+
+    def get_song_data(self, turn):
+        url = turn.song.file.url
+        request = self.context.get("request")
+        return {
+            "id": turn.song_id,
+            "audio_url": request.build_absolute_uri(url) if request else url,
+            "snippet_start_sec": turn.snippet_start_sec,
+        }
+
 
 class GameSessionSerlaiizer(serializers.ModelSerializer):
     class Meta:
@@ -1,11 +1,12 @@
 from __future__ import annotations
 
 import random
-from typing import List, Tuple
+from datetime import timedelta
+from typing import Dict, List, Optional, Set, Tuple
 
-from django.db import transaction
+from django.conf import settings
+from django.db import IntegrityError, transaction
 from django.utils import timezone
-from datetime import timedelta
 
 from ts.models import (
     GameSession,
@@ -13,31 +14,27 @@ from ts.models import (
     GameSessionStatus,
     GameTurnOutcome,
     Song,
-    SongTitle,
 )
+from .catalog import catalog, posters
+from .db import db_sync_to_async
+from .distractors import distractors
+from .leaderboard import leaderboard
 from .exceptions import (
     VersionConflict,
     InvalidState,
+    SessionNotFound,
     TurnAlreadyAnswered,
 )
 from core.models import CustomUser as User
 
-def pick_song(score) -> Song:
+def pick_song(score, exclude: Optional[Set[int]] = None) -> Song:
     era = None
     if score == 0:
         era = "The Life of a Showgirl"
     elif score <=5:
         if random.randint(1,10)>4:
             era = "The Life of a Showgirl"    
-    qs = Song.objects.all()
-    if era:
-        qs = qs.filter(song_title__album=era)
-    count = qs.count()
-    offset = random.randint(0, max(0, count - 1))
-    song = qs[offset]
-    if song.song_title is None:
-        song = pick_song(score)
-    return song
+    return catalog.sample(era, exclude).to_song()
 
 def calc_time_limit(score:int)->int:
     if score >= 35:
@@ -49,34 +46,122 @@ def calc_time_limit(score:int)->int:
     else:
         return 20
 
+def pick_snippet_start(score: int) -> int:
+    """Seconds into the track to start playback; later turns usually skip the
+    intro. The client clamps this to the track's duration."""
+    if score >= 5 and random.random() > 0.25:
+        return random.randint(0, 90)
+    return 0
+
+
 def build_options(correct_title: str, k: int = 3) -> List[str]:
-    titles = list(
-        SongTitle.objects.exclude(title=correct_title)
-        .values_list("title", flat=True)
-        .order_by("?")[:k]
-    )
+    titles = distractors.sample(correct_title, k)
     titles.append(correct_title)
     random.shuffle(titles)
     return titles
 
 
-def _create_turn(session: GameSession, sequence_index: int) -> GameTurn:
+def _build_turn(
+    session: GameSession, sequence_index: int, score: int, exclude: Optional[Set[int]] = None
+) -> GameTurn:
 
-    song = pick_song(session.score)
-    time_limit_sec = calc_time_limit(session.score)
+    song = pick_song(score, exclude)
+    time_limit_sec = calc_time_limit(score)
 
-    return GameTurn.objects.create(
+    return GameTurn(
         session=session,
         sequence_index=sequence_index,
         song=song,
         options=build_options(song.song_title.title),
         correct_option=song.song_title.title,
+        poster_url=posters.choice(song.song_title.id) or "",
         selected_option=None,
-        snippet_start_sec=0,
+        snippet_start_sec=pick_snippet_start(score),
         time_limit_secs=time_limit_sec,
     )
 
 
+def _create_turn(session: GameSession, sequence_index: int) -> GameTurn:
+    turn = _build_turn(session, sequence_index, session.score)
+    turn.save(force_insert=True)
+    return turn
+
+
+def _deck_size() -> int:
+    return getattr(settings, "TS_TURN_DECK_SIZE", 0)
+
+
+def _deal_turns(session: GameSession, count: int) -> Dict[int, GameTurn]:
+    """Pre-generate ``count`` turns after ``session.dealt_turns`` with a single
+    ``bulk_create``. Songs are sampled without replacement within the batch.
+
+    A turn is only reached after a correct answer, so the score at
+    ``sequence_index`` is known in advance; difficulty uses the same score the
+    one-at-a-time path would have seen when creating that turn.
+    """
+    first = session.dealt_turns + 1
+    used: Set[int] = set()
+    turns = []
+    for sequence_index in range(first, first + count):
+        turn = _build_turn(session, sequence_index, max(0, sequence_index - 2), used)
+        used.add(turn.song_id)
+        turns.append(turn)
+    GameTurn.objects.bulk_create(turns)
+    if turns[0].pk is None:
+        # MySQL does not return primary keys from a bulk insert.
+        ids = dict(
+            GameTurn.objects.filter(
+                session=session, sequence_index__gte=first
+            ).values_list("sequence_index", "id")
+        )
+        for turn in turns:
+            turn.pk = ids[turn.sequence_index]
+    session.dealt_turns = first + count - 1
+    return {turn.sequence_index: turn for turn in turns}
+
+
+def _optimistic() -> bool:
+    return getattr(settings, "TS_SESSION_CONCURRENCY", "locking") == "optimistic"
+
+
+def _get_session(session_id: int, user: User, *related: str) -> GameSession:
+    qs = GameSession.objects.select_related(*related)
+    if not _optimistic():
+        qs = qs.select_for_update()
+    try:
+        return qs.get(id=session_id, user=user)
+    except GameSession.DoesNotExist:
+        raise SessionNotFound()
+
+
+def _check_version(session: GameSession, version: int) -> None:
+    if version != session.version:
+        raise VersionConflict(
+            f"Stale version received: {version}, expected: {session.version}"
+        )
+
+
+def _save_session(session: GameSession, version: int, update_fields: List[str]) -> None:
+    """Write ``update_fields`` and bump ``version``.
+
+    With row locking the version was already checked against the locked row.
+    In optimistic mode the write is a single ``UPDATE ... WHERE version=?`` and
+    no affected row means another request got there first.
+    """
+    if not _optimistic():
+        session.version += 1
+        session.save(update_fields=[*update_fields, "version"])
+        return
+    session.increment_version()
+    values = {field: getattr(session, field) for field in update_fields}
+    updated = GameSession.objects.filter(id=session.id, version=version).update(
+        version=session.version, **values
+    )
+    session.version = version + 1
+    if not updated:
+        raise VersionConflict(f"Stale version received: {version}, session changed concurrently")
+
+
 @transaction.atomic
 def start_session(user) -> GameSession:
     session = GameSession.objects.create(
@@ -85,26 +170,22 @@ def start_session(user) -> GameSession:
         score=0,
     )
 
-    session.current_turn = _create_turn(session, sequence_index=1)
-    session.next_turn = _create_turn(session, sequence_index=2)
+    deck_size = _deck_size()
+    if deck_size:
+        deck = _deal_turns(session, max(deck_size, 2))
+        session.current_turn = deck[1]
+        session.next_turn = deck[2]
+    else:
+        session.current_turn = _create_turn(session, sequence_index=1)
+        session.next_turn = _create_turn(session, sequence_index=2)
+        session.dealt_turns = 2
 
-    session.save(update_fields=["current_turn", "next_turn"])
+    session.save(update_fields=["current_turn", "next_turn", "dealt_turns"])
     return session
 
 
-@transaction.atomic
-def submit_guess(session_id: int, option: str, elapsed_time_ms: int, version: int,user:User):
-    session = (
-        GameSession.objects.select_for_update()
-        .select_related("current_turn")
-        .get(id=session_id,user=user)
-    )
-
-    if version != session.version:
-        raise VersionConflict(
-            f"Stale version received: {version}, expected: {session.version}"
-        )
-
+def _apply_guess(session: GameSession, option: str, elapsed_time_ms: int) -> GameTurn:
+    """Score ``option`` against the current turn, updating session and turn in memory."""
     if session.status != GameSessionStatus.IN_PROGRESS:
         raise InvalidState(f"Session is not in progress: {session.status}")
 
@@ -114,6 +195,9 @@ def submit_guess(session_id: int, option: str, elapsed_time_ms: int, version: in
         raise TurnAlreadyAnswered(f"Turn already answered. state {turn.outcome}")
 
     now = timezone.now()
+    if session.reveal_until and now < session.reveal_until:
+        raise InvalidState("Turn has not started yet: previous answer is still being revealed")
+
     if elapsed_time_ms > turn.time_limit_secs * 1000:
         outcome = GameTurnOutcome.TIMEOUT
     elif option == turn.correct_option:
@@ -124,15 +208,14 @@ def submit_guess(session_id: int, option: str, elapsed_time_ms: int, version: in
     turn.selected_option = option
     turn.answered_at = now
 
-    session.version += 1
     if outcome == GameTurnOutcome.CORRECT:
         turn.outcome = outcome
         session.score += 1
         session.status = GameSessionStatus.REVEALING
-        poster_url = (
-            turn.song.song_title.poster_pics.all().order_by("?").first().image.url
-        )
-        turn.poster_url = poster_url
+        if turn.poster_url is None:
+            # turns dealt before reveal posters were chosen up front
+            title_id = Song.objects.values_list("song_title_id", flat=True).get(id=turn.song_id)
+            turn.poster_url = posters.choice(title_id) or ""
     elif session.score == 0:
         turn.outcome = GameTurnOutcome.PENDING
     else:
@@ -141,66 +224,124 @@ def submit_guess(session_id: int, option: str, elapsed_time_ms: int, version: in
             turn.outcome = outcome
             session.status = GameSessionStatus.ENDED
             session.ended_at = now
-        poster_url = None
+    return turn
 
-    turn.save(update_fields=["selected_option", "outcome", "answered_at", "poster_url"])
-    session.save(update_fields=["score", "status", "ended_at", "version","health"])
-    return turn, session
-
-@transaction.atomic
-def handle_next(session_id:int, version:int,user:User) -> Tuple[GameSession, GameTurn, GameTurn]:
-    session = (
-        GameSession.objects.select_for_update()
-        .select_related("current_turn","next_turn")
-        .get(id=session_id,user=user)
-    )
-
-    if version != session.version:
-        raise VersionConflict(
-            f"Stale version received: {version}, expected: {session.version}"
-        )
 
+def _advance(session: GameSession, version: int) -> GameTurn:
+    """Move the preloaded turn to current and deal the one after it."""
     if session.status != GameSessionStatus.REVEALING:
         raise InvalidState(f"Session is not in reavaling: {session.status}")
 
     preloaded_turn_index = session.current_turn.sequence_index + 2
-    preloaded_turn = _create_turn(session, sequence_index=preloaded_turn_index)
+    deck_size = _deck_size()
+    try:
+        if deck_size:
+            preloaded_turn = _next_from_deck(session, preloaded_turn_index, deck_size)
+        else:
+            preloaded_turn = _create_turn(session, sequence_index=preloaded_turn_index)
+            session.dealt_turns = preloaded_turn_index
+    except IntegrityError:
+        # Without the row lock a concurrent "next" may insert the same turns first.
+        raise VersionConflict(f"Stale version received: {version}, session changed concurrently")
     session.current_turn = session.next_turn
     session.next_turn = preloaded_turn
     session.status = GameSessionStatus.IN_PROGRESS
-    session.version += 1
-    session.save(update_fields=["current_turn", "next_turn", "status", "version"])
+    return preloaded_turn
+
+
+_GUESS_FIELDS = ["score", "status", "ended_at", "health"]
+_ADVANCE_FIELDS = ["current_turn", "next_turn", "status", "dealt_turns"]
+_TURN_FIELDS = ["selected_option", "outcome", "answered_at", "poster_url"]
+
+
+@transaction.atomic
+def submit_guess(session_id: int, option: str, elapsed_time_ms: int, version: int,user:User):
+    session = _get_session(session_id, user, "current_turn__song")
+    _check_version(session, version)
+    turn = _apply_guess(session, option, elapsed_time_ms)
+    _save_session(session, version, _GUESS_FIELDS)
+    turn.save(update_fields=_TURN_FIELDS)
+    if session.status == GameSessionStatus.ENDED:
+        leaderboard.record(session)
+    return turn, session
+
+@transaction.atomic
+def handle_next(session_id:int, version:int,user:User) -> Tuple[GameSession, GameTurn, GameTurn]:
+    session = _get_session(session_id, user, "current_turn", "next_turn__song")
+    _check_version(session, version)
+    preloaded_turn = _advance(session, version)
+    _save_session(session, version, _ADVANCE_FIELDS)
     return session, session.current_turn, preloaded_turn
 
+
+def reveal_delay_ms() -> int:
+    return getattr(settings, "TS_REVEAL_DELAY_MS", 2000)
+
+
+@transaction.atomic
+def guess_and_advance(
+    session_id: int, option: str, elapsed_time_ms: int, version: int, user: User
+) -> Tuple[GameTurn, GameSession, Optional[GameTurn], Optional[GameTurn]]:
+    """``submit_guess`` and, when the answer was correct, ``handle_next`` in one
+    transaction with one version bump.
+
+    The new current turn only accepts guesses after ``TS_REVEAL_DELAY_MS``, the
+    time the client shows the revealed answer. Returns ``(answered turn,
+    session, new turn, preloaded turn)``; the last two are ``None`` unless the
+    session advanced.
+    """
+    session = _get_session(session_id, user, "current_turn__song", "next_turn__song")
+    _check_version(session, version)
+    turn = _apply_guess(session, option, elapsed_time_ms)
+    if session.status != GameSessionStatus.REVEALING:
+        _save_session(session, version, _GUESS_FIELDS)
+        turn.save(update_fields=_TURN_FIELDS)
+        if session.status == GameSessionStatus.ENDED:
+            leaderboard.record(session)
+        return turn, session, None, None
+
+    preloaded_turn = _advance(session, version)
+    session.reveal_until = turn.answered_at + timedelta(milliseconds=reveal_delay_ms())
+    _save_session(session, version, [*_GUESS_FIELDS, "current_turn", "next_turn", "dealt_turns", "reveal_until"])
+    turn.save(update_fields=_TURN_FIELDS)
+    return turn, session, session.current_turn, preloaded_turn
+
+
+def _next_from_deck(session: GameSession, sequence_index: int, deck_size: int) -> GameTurn:
+    # Sessions started before decks existed have not recorded what was dealt.
+    session.dealt_turns = max(session.dealt_turns, sequence_index - 1)
+    refill_at = getattr(settings, "TS_TURN_DECK_REFILL_AT", 2)
+    if session.dealt_turns - sequence_index < refill_at:
+        deck = _deal_turns(session, deck_size)
+        if sequence_index in deck:
+            return deck[sequence_index]
+    return GameTurn.objects.select_related("song").get(session=session, sequence_index=sequence_index)
+
+
 @transaction.atomic
 def end_session(session_id:int, version:int,user:User):
-    session = GameSession.objects.select_for_update().get(id=session_id,user=user)
-    if version != session.version:
-        raise VersionConflict(
-            f"Stale version received: {version}, expected: {session.version}"
-        )
+    session = _get_session(session_id, user, "current_turn__song")
+    _check_version(session, version)
     session.status = GameSessionStatus.ENDED
     session.ended_at = timezone.now()
-    session.version += 1
 
     turn = session.current_turn
     turn.outcome = GameTurnOutcome.TIMEOUT
-    session.save(update_fields=["status", "ended_at", "version"])
+    _save_session(session, version, ["status", "ended_at"])
     turn.save(update_fields=["outcome"])
+    leaderboard.record(session)
     return session, turn
 
 
-def get_top_score_of_current_week() -> Tuple[List[Tuple[int, User]], int]:
+# For async callers (the ASGI game views). The ORM has no async transactions,
+# so each action still runs as one sync transaction, on ``ts.db.db_pool``.
+astart_session = db_sync_to_async(start_session)
+asubmit_guess = db_sync_to_async(submit_guess)
+ahandle_next = db_sync_to_async(handle_next)
+aguess_and_advance = db_sync_to_async(guess_and_advance)
+aend_session = db_sync_to_async(end_session)
 
-    local_now = timezone.localtime()
-    start_of_week = (local_now - timedelta(days=local_now.weekday())).replace(
-        hour=0, minute=0, second=0, microsecond=0
-    )
-    qs = (
-        GameSession.objects.filter(ended_at__gte=start_of_week, status=GameSessionStatus.ENDED)
-        .order_by("-score", "-ended_at")
-        .select_related("user")
-    )
-    page_qs = qs[0 : 13]
-    items: List[Tuple[int, User]] = [(s.score, s.user) for s in page_qs]
-    return items
\ No newline at end of file
+
+def get_top_score_of_current_week() -> List[Tuple[int, User]]:
+    """The week's 13 best players, each with their best session's score."""
+    return leaderboard.top(13)
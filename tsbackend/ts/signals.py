@@ -0,0 +1,41 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import CustomUser as User
+from .authentication import invalidate_user
+from .catalog import catalog, posters
+from .distractors import distractors
+from .models import Poster, Song, SongTitle
+
+
+@receiver(post_save, sender=Song)
+@receiver(post_delete, sender=Song)
+@receiver(post_save, sender=SongTitle)
+@receiver(post_delete, sender=SongTitle)
+def invalidate_song_catalog(sender, using=None, **kwargs):
+    # after commit: a rebuild that ran before it would keep the old rows
+    transaction.on_commit(catalog.invalidate, using=using)
+
+
+@receiver(post_save, sender=SongTitle)
+@receiver(post_delete, sender=SongTitle)
+def invalidate_distractors(sender, using=None, **kwargs):
+    transaction.on_commit(distractors.invalidate, using=using)
+
+
+@receiver(m2m_changed, sender=SongTitle.poster_pics.through)
+@receiver(post_save, sender=Poster)
+@receiver(post_delete, sender=Poster)
+@receiver(post_delete, sender=SongTitle)
+def invalidate_posters(sender, using=None, **kwargs):
+    transaction.on_commit(posters.invalidate, using=using)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, using=None, **kwargs):
+    # covers deactivation, password and avatar changes made through save();
+    # after commit, so a request in between cannot cache the old row again
+    pk = instance.pk
+    transaction.on_commit(lambda: invalidate_user(pk), using=using)
@@ -0,0 +1,118 @@
+"""Spectators of dual-mode rooms.
+
+A connection to a room that does not hold one of its two player slots is a
+spectator. Spectators are not in the room's group, so relayed messages and
+match frames fan out to the players only; a room with thousands of watchers
+costs its players nothing per message.
+
+Spectators are in ``room_<id>_spectators`` instead and get
+``{"type": "room_view", "data": {...}}`` at most every ``TS_SPECTATOR_TICK_MS``
+from the room's ``SpectatorFeed``: ``room`` (players, scores, status, current
+song, audience) and ``round`` (the match's current round), whichever changed
+since the previous view, each in its newest state. On connect a spectator gets
+every part the feed of its worker knows.
+
+Feeds live in the worker that changed the room. A room's removal may happen in
+another worker (or its reaper), so besides dropping the feed on removals it
+sees, a worker also drops feeds unused for ``TS_SPECTATOR_FEED_IDLE_SECS``.
+"""
+
+from __future__ import annotations
+
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+
+from .fanout import TickedSender, group_send_json
+from .rooms import RoomEvent
+
+
+# room changes passed to feeds, and views sent to spectator groups, in this worker
+spectator_stats: "Counter[str]" = Counter()
+
+
+def spectator_group(room_id: str) -> str:
+    return f"room_{room_id}_spectators"
+
+
+class SpectatorFeed(TickedSender):
+    def __init__(self, room_id: str, tick_ms: Optional[int] = None):
+        self.group = spectator_group(room_id)
+        self.tick_ms = tick_ms if tick_ms is not None else getattr(settings, "TS_SPECTATOR_TICK_MS", 500)
+        self.state: Dict[str, Any] = {}
+        self._changed: Dict[str, Any] = {}
+        self._channel_layer = None
+        self.used_at = time.monotonic()
+
+    async def update(self, channel_layer, **parts: Any) -> None:
+        self._channel_layer = channel_layer
+        spectator_stats["updates"] += 1
+        self.state.update(parts)
+        self._changed.update(parts)
+        await self._schedule()
+
+    async def flush(self) -> None:
+        changed, self._changed = self._changed, {}
+        self._last_flush = time.monotonic()
+        if not changed:
+            return
+        spectator_stats["views"] += 1
+        await group_send_json(self._channel_layer, self.group, {"type": "room_view", "data": changed})
+
+    def stop(self) -> None:
+        if self._timer_pending():
+            self._timer.cancel()
+
+
+# feeds of the rooms with activity in this worker, by room id, least recently used first
+feeds: "OrderedDict[str, SpectatorFeed]" = OrderedDict()
+
+
+def feed_idle_secs() -> float:
+    return getattr(settings, "TS_SPECTATOR_FEED_IDLE_SECS", 600)
+
+
+def evict_idle_feeds(now: Optional[float] = None) -> None:
+    """Drop feeds unused for ``TS_SPECTATOR_FEED_IDLE_SECS``, oldest first."""
+    cutoff = (time.monotonic() if now is None else now) - feed_idle_secs()
+    while feeds:
+        room_id, feed = next(iter(feeds.items()))
+        if feed.used_at > cutoff:
+            break
+        del feeds[room_id]
+        feed.stop()
+        spectator_stats["evicted"] += 1
+
+
+def spectator_feed(room_id: str) -> SpectatorFeed:
+    evict_idle_feeds()
+    feed = feeds.get(room_id)
+    if feed is None:
+        feed = feeds[room_id] = SpectatorFeed(room_id)
+    else:
+        feeds.move_to_end(room_id)
+    feed.used_at = time.monotonic()
+    return feed
+
+
+async def publish_room(channel_layer, event: Optional[RoomEvent]) -> None:
+    """Pass a registry change of a room on to its spectators."""
+    if event is None:
+        return
+    if event.room is None:
+        # nobody is left to watch
+        feed = feeds.pop(event.room_id, None)
+        if feed is not None:
+            feed.stop()
+        return
+    await spectator_feed(event.room_id).update(channel_layer, room=event.room.to_dict())
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        "tick_ms": getattr(settings, "TS_SPECTATOR_TICK_MS", 500),
+        "feeds": len(feeds),
+        **spectator_stats,
+    }
@@ -0,0 +1,14 @@
+from typing import List
+
+from ts.models import Poster, Song, SongTitle
+
+
+def make_catalog(n: int) -> List[Song]:
+    """``n`` songs titled "Song 0".. of one album, all with the same poster."""
+    poster = Poster.objects.create(poster_name="folklore", image="posters/folklore.jpg")
+    songs = []
+    for i in range(n):
+        title = SongTitle.objects.create(title=f"Song {i}", album="folklore")
+        title.poster_pics.add(poster)
+        songs.append(Song.objects.create(file=f"songs/{i}.mp3", song_title=title))
+    return songs
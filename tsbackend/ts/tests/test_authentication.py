@@ -0,0 +1,87 @@
+import asyncio
+
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.models import CustomUser as User
+from ts.authentication import auser_for_token, user_cache, user_for_token
+from ts.db import BoundedExecutor
+
+
+class TestCachedJwtAuthentication(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.user = User.objects.create_user(username="swiftie")
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token}")
+
+    def user_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/ts/game-sessions/")
+        self.assertEqual(response.status_code, 200)
+        return [q for q in ctx.captured_queries if 'FROM "core_customuser"' in q["sql"]]
+
+    def test_user_is_loaded_once_per_ttl(self):
+        hits = user_cache.hits
+        self.assertEqual(len(self.user_queries()), 1)
+        self.assertEqual(self.user_queries(), [])
+        self.assertEqual(user_cache.hits, hits + 1)
+        # the socket middleware shares the entry
+        self.assertEqual(user_for_token(self.token).pk, self.user.pk)
+        self.assertEqual(user_cache.hits, hits + 2)
+
+    def test_deactivated_user_is_rejected_within_ttl(self):
+        self.user_queries()
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.user.save()
+            # still cached until the change is committed
+            self.assertTrue(user_for_token(self.token).is_active)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.client.get("/ts/game-sessions/").status_code, 401)
+        self.assertIsNone(user_for_token(self.token))
+
+    def test_profile_changes_are_seen_immediately(self):
+        self.user_queries()
+        self.user.cat_name = "Meredith"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(user_for_token(self.token).cat_name, "Meredith")
+
+    def test_bad_token_resolves_to_nobody(self):
+        self.assertIsNone(user_for_token("not-a-token"))
+
+
+class TestAsyncTokenResolution(TransactionTestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.user = User.objects.create_user(username="swiftie")
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+
+    def test_shares_the_cache_with_the_sync_path(self):
+        user = asyncio.run(auser_for_token(self.token))
+        self.assertEqual(user.pk, self.user.pk)
+        hits = user_cache.hits
+        self.assertEqual(user_for_token(self.token).pk, self.user.pk)
+        self.assertEqual(asyncio.run(auser_for_token(self.token)).pk, self.user.pk)
+        self.assertEqual(user_cache.hits, hits + 2)
+
+    def test_inactive_user_and_bad_token_resolve_to_nobody(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertIsNone(asyncio.run(auser_for_token(self.token)))
+        self.assertIsNone(asyncio.run(auser_for_token("not-a-token")))
+
+
+class TestBoundedExecutor(TestCase):
+    def test_counts_calls_waiting_for_a_thread(self):
+        pool = BoundedExecutor(1)
+        futures = [pool.submit(sum, [i, 1]) for i in range(3)]
+        self.assertEqual([f.result() for f in futures], [1, 2, 3])
+        pool.shutdown()
+        stats = pool.stats()
+        self.assertEqual((stats["submitted"], stats["pending"]), (3, 0))
+        self.assertGreaterEqual(stats["peak_pending"], 1)
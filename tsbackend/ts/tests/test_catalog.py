@@ -0,0 +1,49 @@
+from django.test import TestCase
+
+from ts.catalog import catalog
+from ts.models import Song, SongTitle
+from ts.services import pick_song
+
+
+class TestSongCatalog(TestCase):
+    """The per-worker song index behind ``pick_song``."""
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.showgirl = SongTitle.objects.create(
+                title="The Fate of Ophelia", album="The Life of a Showgirl"
+            )
+            self.folklore = SongTitle.objects.create(title="cardigan", album="folklore")
+            Song.objects.create(file="songs/ophelia.mp3", song_title=self.showgirl)
+            Song.objects.create(file="songs/cardigan.mp3", song_title=self.folklore)
+            Song.objects.create(file="songs/orphan.mp3", song_title=None)
+
+    def test_pick_song_runs_no_queries_once_built(self):
+        len(catalog)
+        with self.assertNumQueries(0):
+            for _ in range(20):
+                song = pick_song(0)
+                self.assertEqual(song.song_title.album, "The Life of a Showgirl")
+
+    def test_songs_without_title_are_never_picked(self):
+        files = {pick_song(10).file.name for _ in range(50)}
+        self.assertNotIn("songs/orphan.mp3", files)
+        self.assertEqual(len(catalog), 2)
+
+    def test_missing_album_falls_back_to_whole_catalog(self):
+        self.showgirl.album = "Midnights"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.showgirl.save()
+        self.assertIsNotNone(pick_song(0).song_title)
+
+    def test_changes_bump_catalog_version_on_commit(self):
+        before = catalog.version
+        with self.captureOnCommitCallbacks(execute=True):
+            SongTitle.objects.create(title="august", album="folklore")
+            # a rebuild before the commit would not see the change yet
+            self.assertEqual(catalog.version, before)
+        self.assertEqual(catalog.version, before + 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Song.objects.filter(file="songs/orphan.mp3").get().delete()
+        self.assertEqual(catalog.version, before + 2)
+        self.assertEqual(catalog.albums(), {"The Life of a Showgirl": 1, "folklore": 1})
@@ -0,0 +1,70 @@
+import asyncio
+import unittest
+
+from channels.testing import WebsocketCommunicator
+from django.test import SimpleTestCase
+
+from ts.codecs import CODECS, JSON, from_json_text, negotiate
+from ts.rooms import InMemoryRoomRegistry
+from ts.tests.test_rooms import worker
+
+
+class TestNegotiation(SimpleTestCase):
+    def test_json_unless_a_supported_codec_is_offered(self):
+        self.assertIs(negotiate([]), JSON)
+        self.assertIs(negotiate(["graphql-ws"]), JSON)
+        for name in CODECS:
+            self.assertEqual(negotiate(["graphql-ws", name]).subprotocol, name)
+
+    def test_json_frames_are_transcoded(self):
+        for codec in CODECS.values():
+            frame = from_json_text(codec, '{"type": "chat", "data": {"text": "hi"}}')
+            self.assertEqual(codec.decode(frame), {"type": "chat", "data": {"text": "hi"}})
+            self.assertEqual(isinstance(frame, bytes), codec.binary)
+
+
+@unittest.skipUnless("ts.msgpack" in CODECS and "ts.cbor" in CODECS, "msgpack and cbor2 are optional")
+class TestBinarySockets(SimpleTestCase):
+    def test_lobby_over_msgpack(self):
+        async def inner():
+            msgpack = CODECS["ts.msgpack"]
+            app = worker(InMemoryRoomRegistry())
+            lobby = WebsocketCommunicator(app, "/ws/ts/lobby/", subprotocols=["ts.msgpack", "ts.json"])
+            connected, subprotocol = await lobby.connect()
+            self.assertEqual((connected, subprotocol), (True, "ts.msgpack"))
+            self.assertEqual(msgpack.decode(await lobby.receive_from()), {"type": "rooms", "seq": 0, "fields": [], "rows": []})
+
+            await lobby.send_to(bytes_data=msgpack.encode({"type": "create_room"}))
+            created = msgpack.decode(await lobby.receive_from())
+            added = msgpack.decode(await lobby.receive_from())
+            self.assertEqual((created["type"], added["type"]), ("room_created", "room_added"))
+
+            await lobby.send_to(bytes_data=msgpack.encode({"type": "snapshot"}))
+            snapshot = msgpack.decode(await lobby.receive_from())
+            row = dict(zip(snapshot["fields"], snapshot["rows"][0]))
+            self.assertEqual(row, created["data"])
+            await lobby.disconnect()
+
+        asyncio.run(inner())
+
+    def test_room_relay_mixes_codecs(self):
+        async def inner():
+            cbor = CODECS["ts.cbor"]
+            app = worker(InMemoryRoomRegistry())
+            binary = WebsocketCommunicator(app, "/ws/ts/dualmode/abc/", subprotocols=["ts.cbor"])
+            text = WebsocketCommunicator(app, "/ws/ts/dualmode/abc/")
+            await binary.connect()
+            self.assertEqual(cbor.decode(await binary.receive_from())["type"], "room_state")
+            self.assertEqual(cbor.decode(await binary.receive_from())["type"], "player_joined")
+            await text.connect()
+            await text.receive_json_from()
+            await text.receive_json_from()
+            await binary.receive_from()  # the second player joined
+
+            await binary.send_to(bytes_data=cbor.encode({"type": "chat", "data": {"text": "hi"}}))
+            self.assertEqual((await text.receive_json_from())["data"], {"text": "hi"})
+            self.assertEqual(cbor.decode(await binary.receive_from())["data"], {"text": "hi"})
+            for communicator in (binary, text):
+                await communicator.disconnect()
+
+        asyncio.run(inner())
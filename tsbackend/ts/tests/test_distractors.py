@@ -0,0 +1,60 @@
+from django.test import SimpleTestCase, TestCase
+
+from ts.catalog import LazyIndex
+from ts.distractors import DistractorEngine, distractors
+from ts.models import SongTitle
+from ts.services import build_options
+
+TITLES = [
+    ("cardigan", "folklore"),
+    ("august", "folklore"),
+    ("exile", "folklore"),
+    ("willow", "evermore"),
+    ("champagne problems", "evermore"),
+    ("Anti-Hero", "Midnights"),
+]
+
+
+class TestDistractorEngine(SimpleTestCase):
+    def test_sample_is_unique_and_excludes_answer(self):
+        engine = DistractorEngine(TITLES)
+        for _ in range(50):
+            picked = engine.sample("cardigan", 3)
+            self.assertEqual(len(picked), 3)
+            self.assertEqual(len(set(picked)), 3)
+            self.assertNotIn("cardigan", picked)
+
+    def test_first_tier_is_same_album(self):
+        engine = DistractorEngine(TITLES)
+        for _ in range(20):
+            self.assertEqual(engine.sample("willow", 3)[0], "champagne problems")
+
+    def test_small_catalog_returns_what_exists(self):
+        engine = DistractorEngine(TITLES[:2])
+        self.assertEqual(engine.sample("cardigan", 3), ["august"])
+
+    def test_indexes_must_implement_build(self):
+        class Unbuilt(LazyIndex):
+            pass
+
+        with self.assertRaises(TypeError):
+            Unbuilt()
+
+
+class TestBuildOptions(TestCase):
+    def test_shape_and_no_queries_once_built(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for title, album in TITLES:
+                SongTitle.objects.create(title=title, album=album)
+        build_options("exile")
+        with self.assertNumQueries(0):
+            options = build_options("exile")
+        self.assertEqual(len(options), 4)
+        self.assertIn("exile", options)
+
+    def test_title_changes_reset_the_pools_on_commit(self):
+        before = distractors.version
+        with self.captureOnCommitCallbacks(execute=True):
+            SongTitle.objects.create(title="the 1", album="folklore")
+            self.assertEqual(distractors.version, before)
+        self.assertEqual(distractors.version, before + 1)
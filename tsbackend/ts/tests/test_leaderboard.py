@@ -0,0 +1,88 @@
+from datetime import timedelta
+
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.models import CustomUser as User
+from ts.leaderboard import WeekBoard, iso_week, leaderboard, rebuild_week
+from ts.models import GameSession, GameSessionStatus, WeeklyScore
+
+
+class TestWeekBoard(SimpleTestCase):
+    def test_rank_and_top_follow_score_then_recency(self):
+        now = timezone.now()
+        board = WeekBoard([(1, 5, now), (2, 9, now), (3, 5, now + timedelta(seconds=1))])
+        self.assertEqual(board.top(3), [(9, 2), (5, 3), (5, 1)])
+        self.assertEqual(board.rank(1), (3, 5))
+        self.assertIsNone(board.rank(4))
+
+    def test_offer_keeps_only_the_best_entry_per_user(self):
+        now = timezone.now()
+        board = WeekBoard([(1, 5, now), (2, 9, now)])
+        board.offer(1, 3, now)
+        self.assertEqual(board.rank(1), (2, 5))
+        board.offer(1, 12, now)
+        self.assertEqual(board.rank(1), (1, 12))
+        self.assertEqual(len(board), 2)
+
+
+class TestWeeklyLeaderboard(TestCase):
+    def setUp(self):
+        leaderboard.invalidate()
+        self.users = [User.objects.create_user(username=f"player{i}") for i in range(15)]
+
+    def end(self, user, score, ended_at=None):
+        session = GameSession.objects.create(
+            user=user, score=score, status=GameSessionStatus.ENDED, ended_at=ended_at or timezone.now()
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            leaderboard.record(session)
+        return session
+
+    def test_records_best_session_per_user(self):
+        self.end(self.users[0], 4)
+        self.end(self.users[0], 7)
+        self.end(self.users[0], 2)
+        entry = WeeklyScore.objects.get(week=iso_week(), user=self.users[0])
+        self.assertEqual(entry.score, 7)
+        self.assertEqual(leaderboard.rank(self.users[0].id), (1, 7))
+
+    def test_top_week_scores_query_count_is_constant(self):
+        for score, user in enumerate(self.users):
+            self.end(user, score)
+        client = APIClient()
+        client.force_authenticate(self.users[0])
+        leaderboard.invalidate()
+        with self.assertNumQueries(3):  # board, users, groups
+            response = client.get("/ts/game-sessions/top-week-scores/")
+        self.assertEqual(len(response.data), 13)
+        self.assertEqual(response.data[0]["score"], 14)
+
+        rank = client.get("/ts/game-sessions/my-week-rank/").data
+        self.assertEqual((rank["rank"], rank["score"]), (15, 0))
+
+    def test_top_week_scores_lists_each_player_once(self):
+        for score in (9, 8, 7):
+            self.end(self.users[0], score)
+        self.end(self.users[1], 5)
+        client = APIClient()
+        client.force_authenticate(self.users[1])
+        response = client.get("/ts/game-sessions/top-week-scores/")
+        self.assertEqual(
+            [(entry["score"], entry["user"]["id"]) for entry in response.data],
+            [(9, self.users[0].id), (5, self.users[1].id)],
+        )
+
+    def test_rebuild_from_history(self):
+        GameSession.objects.create(
+            user=self.users[1], score=3, status=GameSessionStatus.ENDED, ended_at=timezone.now()
+        )
+        GameSession.objects.create(
+            user=self.users[1], score=8, status=GameSessionStatus.ENDED, ended_at=timezone.now()
+        )
+        GameSession.objects.create(
+            user=self.users[2], score=20, status=GameSessionStatus.IN_PROGRESS, ended_at=timezone.now()
+        )
+        self.assertEqual(rebuild_week(iso_week()), 1)
+        self.assertEqual(leaderboard.rank(self.users[1].id), (1, 8))
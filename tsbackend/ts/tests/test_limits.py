@@ -0,0 +1,110 @@
+import asyncio
+
+from channels.testing import WebsocketCommunicator
+from django.test import SimpleTestCase, override_settings
+
+from ts.limits import SLOW_CONSUMER_CLOSE_CODE, RelayLimitsMixin, relay_stats
+from ts.rooms import InMemoryRoomRegistry
+from ts.tests.test_rooms import worker
+
+
+class TestRoomRelayLimits(SimpleTestCase):
+    def setUp(self):
+        relay_stats.clear()
+
+    @override_settings(TS_ROOM_RATE_PER_SEC=0.001, TS_ROOM_RATE_BURST=2, TS_ROOM_MAX_FRAME_BYTES=100)
+    def test_refused_messages_are_not_relayed(self):
+        async def inner():
+            room = WebsocketCommunicator(worker(InMemoryRoomRegistry()), "/ws/ts/dualmode/abc/")
+            await room.connect()
+            self.assertEqual((await room.receive_json_from())["type"], "room_state")
+            self.assertEqual((await room.receive_json_from())["type"], "player_joined")
+
+            await room.send_json_to({"type": "start_game", "data": {}})
+            self.assertEqual((await room.receive_json_from())["data"]["code"], "type_not_allowed")
+            await room.send_json_to({"type": "chat", "data": {"text": "x" * 200}})
+            self.assertEqual((await room.receive_json_from())["data"]["code"], "frame_too_large")
+
+            for text in ("a", "b", "c"):
+                await room.send_json_to({"type": "chat", "data": {"text": text}})
+            replies = [await room.receive_json_from() for _ in range(3)]
+            self.assertEqual(
+                [(r["type"], r["data"].get("text") or r["data"]["code"]) for r in replies],
+                [("chat", "a"), ("chat", "b"), ("error", "throttled")],
+            )
+            self.assertTrue(await room.receive_nothing())
+            await room.disconnect()
+            self.assertEqual(
+                dict(relay_stats), {"rejected": 1, "oversized": 1, "relayed": 2, "throttled": 1}
+            )
+
+        asyncio.run(inner())
+
+    def test_malformed_messages_are_refused_by_room_and_lobby(self):
+        async def inner():
+            app = worker(InMemoryRoomRegistry())
+            room = WebsocketCommunicator(app, "/ws/ts/dualmode/abc/")
+            await room.connect()
+            await room.receive_json_from()
+            await room.receive_json_from()
+            lobby = WebsocketCommunicator(app, "/ws/ts/lobby/")
+            await lobby.connect()
+            await lobby.receive_json_from()
+            for communicator in (room, lobby):
+                for message in ([1], "chat", {"type": "ready", "data": "x"}, {"type": "chat", "data": [1]}):
+                    await communicator.send_json_to(message)
+                    self.assertEqual((await communicator.receive_json_from())["data"]["code"], "bad_message")
+                await communicator.disconnect()
+            self.assertEqual(relay_stats["malformed"], 8)
+
+        asyncio.run(inner())
+
+
+class StalledClient(RelayLimitsMixin):
+    def __init__(self):
+        self.sent = []
+        self.closed = None
+        self.unblock = asyncio.Event()
+
+    async def send_json_text(self, text):
+        await self.unblock.wait()
+        self.sent.append(text)
+
+    async def close(self, code=None):
+        self.closed = code
+
+
+@override_settings(TS_ROOM_OUTBOUND_QUEUE=2)
+class TestOutboundQueue(SimpleTestCase):
+    def setUp(self):
+        relay_stats.clear()
+
+    async def fill(self, client):
+        for i in range(5):
+            await client.send_frame(str(i))
+            await asyncio.sleep(0)
+
+    def test_frames_beyond_the_queue_are_dropped(self):
+        async def inner():
+            client = StalledClient()
+            await self.fill(client)
+            client.unblock.set()
+            await asyncio.sleep(0.01)
+            # one frame was being written when the queue filled up
+            self.assertEqual(client.sent, ["0", "1", "2"])
+            self.assertEqual(relay_stats["dropped"], 2)
+            self.assertIsNone(client.closed)
+            client.stop_frames()
+
+        asyncio.run(inner())
+
+    @override_settings(TS_ROOM_SLOW_CONSUMER_POLICY="disconnect")
+    def test_slow_client_can_be_disconnected(self):
+        async def inner():
+            client = StalledClient()
+            await self.fill(client)
+            self.assertEqual(client.closed, SLOW_CONSUMER_CLOSE_CODE)
+            self.assertEqual(relay_stats["disconnected"], 1)
+            client.stop_frames()
+
+        asyncio.run(inner())
@@ -0,0 +1,145 @@
+import asyncio
+
+import fakeredis
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.urls import re_path
+
+from core.models import CustomUser as User
+from ts.consumers import MatchmakingConsumer
+from ts.matchmaking import InMemoryMatchQueue, RedisMatchQueue, Ticket, bracket_for
+from ts.models import GameRoom, GameSession, GameSessionStatus
+from ts.rooms import InMemoryRoomRegistry
+
+
+class TestMatchQueues(SimpleTestCase):
+    def queues(self):
+        server = fakeredis.FakeServer()
+        return [
+            ("memory", InMemoryMatchQueue(), None),
+            ("redis", *[RedisMatchQueue(fakeredis.aioredis.FakeRedis(server=server)) for _ in range(2)]),
+        ]
+
+    def test_pairs_the_longest_waiting_player_of_the_bracket(self):
+        async def inner():
+            for name, queue, other in self.queues():
+                other = other or queue
+                with self.subTest(name):
+                    a, b, c, d, e = [Ticket(i, f"channel-{i}") for i in range(1, 6)]
+                    self.assertIsNone(await queue.enqueue(a, bracket=0))
+                    self.assertIsNone(await other.enqueue(b, bracket=1))
+                    self.assertEqual(await other.enqueue(c, bracket=0), (a, c))
+                    self.assertEqual(await queue.waiting_count(), 1)
+
+                    self.assertIsNone(await queue.enqueue(d, bracket=0))
+                    self.assertTrue(await other.cancel(d))
+                    self.assertFalse(await queue.cancel(a))
+                    # d's cancelled ticket is skipped
+                    self.assertIsNone(await queue.enqueue(e, bracket=0))
+                    self.assertEqual(await other.enqueue(Ticket(6, "channel-6"), bracket=1), (b, Ticket(6, "channel-6")))
+                    self.assertEqual(await queue.waiting_count(), 1)
+
+        asyncio.run(inner())
+
+    def test_a_player_queued_again_is_not_paired_with_themselves(self):
+        async def inner():
+            for name, queue, _ in self.queues():
+                with self.subTest(name):
+                    old, new = Ticket(1, "old-socket"), Ticket(1, "new-socket")
+                    self.assertIsNone(await queue.enqueue(old))
+                    self.assertIsNone(await queue.enqueue(new))
+                    # the old socket closing does not take the player out of the queue
+                    self.assertFalse(await queue.cancel(old))
+                    self.assertEqual(await queue.enqueue(Ticket(2, "other")), (new, Ticket(2, "other")))
+                    self.assertEqual(await queue.waiting_count(), 0)
+
+        asyncio.run(inner())
+
+    def test_concurrent_workers_pair_every_player_once(self):
+        async def inner():
+            server = fakeredis.FakeServer()
+            workers = [RedisMatchQueue(fakeredis.aioredis.FakeRedis(server=server)) for _ in range(4)]
+            pairs = await asyncio.gather(*[
+                workers[i % 4].enqueue(Ticket(i, f"channel-{i}")) for i in range(40)
+            ])
+            seated = [ticket.user for pair in pairs if pair for ticket in pair]
+            self.assertEqual(sorted(seated), list(range(40)))
+            self.assertEqual(await workers[0].waiting_count(), 0)
+
+        asyncio.run(inner())
+
+    def test_brackets(self):
+        self.assertEqual([bracket_for(score, 10) for score in (0, 9, 10, 35)], [0, 0, 1, 3])
+        self.assertEqual(bracket_for(35, 0), 0)
+
+
+class TestMatchmakingConsumer(TransactionTestCase):
+    def app(self, rooms, queue):
+        return URLRouter([
+            re_path(r"^ws/ts/quickmatch/$", MatchmakingConsumer.as_asgi(room_registry=rooms, match_queue=queue)),
+        ])
+
+    async def connect(self, app, user):
+        communicator = WebsocketCommunicator(app, "/ws/ts/quickmatch/")
+        communicator.scope["user"] = user
+        connected, code = await communicator.connect()
+        return communicator, connected, code
+
+    @override_settings(TS_MATCH_BRACKET_WIDTH=10)
+    def test_pairs_players_of_a_bracket_into_a_new_room(self):
+        alice, bob, carol = [User.objects.create_user(username=name, password="pw") for name in ("alice", "bob", "carol")]
+        GameSession.objects.create(user=carol, score=25, status=GameSessionStatus.ENDED)
+
+        async def inner():
+            rooms, queue = InMemoryRoomRegistry(), InMemoryMatchQueue()
+            app = self.app(rooms, queue)
+            _, connected, code = await self.connect(app, AnonymousUser())
+            self.assertEqual((connected, code), (False, 4401))
+
+            sockets = {}
+            for user in (alice, carol, bob):
+                sockets[user.username], _, _ = await self.connect(app, user)
+            queued = [(await sockets[name].receive_json_from())["data"] for name in ("alice", "carol", "bob")]
+            self.assertEqual(queued, [{"bracket": 0}, {"bracket": 2}, {"bracket": 0}])
+
+            found = [(await sockets[name].receive_json_from())["data"] for name in ("alice", "bob")]
+            self.assertEqual(found[0], found[1])
+            self.assertEqual((found[0]["player_1"], found[0]["player_2"]), (alice.id, bob.id))
+            self.assertTrue(await sockets["carol"].receive_nothing())
+            self.assertEqual(await queue.waiting_count(), 1)
+
+            await sockets["carol"].disconnect()
+            self.assertEqual(await queue.waiting_count(), 0)
+            for name in ("alice", "bob"):
+                await sockets[name].disconnect()
+            _, live_rooms = await rooms.snapshot()
+            self.assertEqual([room.id for room in live_rooms], [found[0]["id"]])
+            return found[0]["id"]
+
+        room_id = asyncio.run(inner())
+        room = GameRoom.objects.get(pk=int(room_id))
+        self.assertEqual((room.player_1_id, room.player_2_id), (alice.id, bob.id))
+
+    def test_a_room_that_cannot_be_opened_fails_the_match_and_is_deleted(self):
+        alice, bob = [User.objects.create_user(username=name, password="pw") for name in ("alice", "bob")]
+        taken = GameRoom.objects.create(player_1=alice)
+        next_id = taken.pk + 1
+        taken.delete()
+
+        async def inner():
+            rooms, queue = InMemoryRoomRegistry(), InMemoryMatchQueue()
+            await rooms.create(room_id=str(next_id))
+            app = self.app(rooms, queue)
+            sockets = [(await self.connect(app, user))[0] for user in (alice, bob)]
+            for communicator in sockets:
+                self.assertEqual((await communicator.receive_json_from())["type"], "queued")
+                failed = await communicator.receive_json_from()
+                self.assertEqual((failed["type"], failed["data"]["code"]), ("error", "match_failed"))
+                self.assertEqual((await communicator.receive_output())["type"], "websocket.close")
+            self.assertEqual(await queue.waiting_count(), 0)
+
+        with self.assertLogs("ts.matchmaking", "ERROR"):
+            asyncio.run(inner())
+        self.assertFalse(GameRoom.objects.exists())
@@ -0,0 +1,254 @@
+import asyncio
+import json
+
+import fakeredis
+from channels.routing import URLRouter
+from channels.testing import ApplicationCommunicator, WebsocketCommunicator
+from django.test import SimpleTestCase
+from django.urls import re_path
+
+from ts.consumers import LobbyConsumer, RoomConsumer
+from ts.fanout import TickedSender
+from ts.lobby import LobbyBroadcaster, RoomReaper, RoomReaperApp
+from ts.rooms import InMemoryRoomRegistry, RedisRoomRegistry, RoomEvent
+
+
+def worker(registry):
+    """One ASGI application, as a separate Daphne process would run it."""
+    return URLRouter([
+        re_path(r"^ws/ts/dualmode/(?P<room_id>[\w-]+)/$", RoomConsumer.as_asgi(room_registry=registry)),
+        re_path(r"^ws/ts/lobby/$", LobbyConsumer.as_asgi(room_registry=registry)),
+    ])
+
+
+class TestRoomRegistries(SimpleTestCase):
+    def registries(self):
+        server = fakeredis.FakeServer()
+        return [
+            ("memory", InMemoryRoomRegistry(), None),
+            ("redis", *[RedisRoomRegistry(fakeredis.aioredis.FakeRedis(server=server)) for _ in range(2)]),
+        ]
+
+    def test_join_and_leave(self):
+        async def inner():
+            for name, registry, other in self.registries():
+                other = other or registry
+                with self.subTest(name):
+                    room = (await registry.create(player_1=1)).room
+                    await other.join(room.id, "a")
+                    joined = await registry.join(room.id, "b")
+                    seq, rooms = await other.snapshot()
+                    self.assertEqual(seq, joined.seq)
+                    self.assertEqual([r.to_dict()["members"] for r in rooms], [2])
+                    events = [await other.leave(room.id, "a"), await registry.leave(room.id, "b")]
+                    self.assertEqual([e.type for e in events], ["room_updated", "room_removed"])
+                    self.assertEqual([e.seq for e in events], [seq + 1, seq + 2])
+                    self.assertEqual(await registry.snapshot(), (seq + 2, []))
+
+        asyncio.run(inner())
+
+    def test_concurrent_joins_are_not_lost(self):
+        async def inner():
+            server = fakeredis.FakeServer()
+            workers = [RedisRoomRegistry(fakeredis.aioredis.FakeRedis(server=server)) for _ in range(4)]
+            room = (await workers[0].create()).room
+            events = await asyncio.gather(*[
+                workers[i % 4].join(room.id, f"member-{i}") for i in range(40)
+            ])
+            seq, [stored] = await workers[1].snapshot()
+            self.assertEqual(len(stored.members), 40)
+            self.assertEqual(sorted(e.seq for e in events), list(range(2, 42)))
+            self.assertEqual(seq, 41)
+
+        asyncio.run(inner())
+
+    def test_two_workers_see_the_same_lobby(self):
+        async def inner():
+            server = fakeredis.FakeServer()
+            app_a, app_b = (worker(RedisRoomRegistry(fakeredis.aioredis.FakeRedis(server=server))) for _ in range(2))
+            for app in (app_a, app_b):
+                for route in app.routes:
+                    # the consumer each connection gets
+                    consumer = route.callback.consumer_class(**route.callback.consumer_initkwargs)
+                    self.assertIsInstance(consumer.rooms, RedisRoomRegistry)
+            redis = fakeredis.aioredis.FakeRedis(server=server)
+
+            lobby_a = WebsocketCommunicator(app_a, "/ws/ts/lobby/")
+            await lobby_a.connect()
+            self.assertEqual(await lobby_a.receive_json_from(), {"type": "rooms", "seq": 0, "data": []})
+            await lobby_a.send_json_to({"type": "create_room"})
+            created = (await lobby_a.receive_json_from())["data"]
+            self.assertEqual((await lobby_a.receive_json_from())["type"], "room_added")
+
+            # a player served by the other worker joins the room
+            player = WebsocketCommunicator(app_b, f"/ws/ts/dualmode/{created['id']}/")
+            await player.connect()
+            state = (await player.receive_json_from())["data"]
+            self.assertEqual((state["id"], state["members"]), (created["id"], 1))
+            self.assertTrue(await redis.exists(f"ts:lobby:room:{created['id']}"))
+
+            # the first lobby client got the change as a delta
+            updated = await lobby_a.receive_json_from()
+            self.assertEqual((updated["type"], updated["seq"], updated["data"]["members"]), ("room_updated", 2, 1))
+
+            lobby_b = WebsocketCommunicator(app_b, "/ws/ts/lobby/")
+            await lobby_b.connect()
+            snapshot_b = await lobby_b.receive_json_from()
+            lobby_c = WebsocketCommunicator(app_a, "/ws/ts/lobby/")
+            await lobby_c.connect()
+            snapshot_a = await lobby_c.receive_json_from()
+            self.assertEqual(snapshot_a, snapshot_b)
+            self.assertEqual(snapshot_a["seq"], 2)
+            self.assertEqual([(r["id"], r["members"]) for r in snapshot_a["data"]], [(created["id"], 1)])
+
+            for communicator in (player, lobby_a, lobby_b, lobby_c):
+                await communicator.disconnect()
+
+        asyncio.run(inner())
+
+
+    def test_reap_removes_only_rooms_left_empty(self):
+        async def inner():
+            for name, registry, other in self.registries():
+                other = other or registry
+                with self.subTest(name):
+                    abandoned = (await registry.create()).room
+                    joined = (await registry.create()).room
+                    await other.join(joined.id, "a")
+                    self.assertEqual(await other.reap(grace_secs=60), [])
+                    await asyncio.sleep(0.01)
+                    events = await other.reap(grace_secs=0)
+                    self.assertEqual([(e.type, e.room_id) for e in events], [("room_removed", abandoned.id)])
+                    self.assertEqual(await registry.reap(grace_secs=0), [])
+                    seq, rooms = await registry.snapshot()
+                    self.assertEqual([r.id for r in rooms], [joined.id])
+                    await registry.leave(joined.id, "a")
+
+        asyncio.run(inner())
+
+
+class TestLobbyEvents(SimpleTestCase):
+    def test_events_follow_the_snapshot_and_gaps_can_resync(self):
+        async def inner():
+            app = worker(InMemoryRoomRegistry())
+            lobby = WebsocketCommunicator(app, "/ws/ts/lobby/")
+            await lobby.connect()
+            self.assertEqual((await lobby.receive_json_from())["seq"], 0)
+
+            player = WebsocketCommunicator(app, "/ws/ts/dualmode/abc/")
+            await player.connect()
+            await player.receive_json_from()
+            await player.disconnect()
+
+            added = await lobby.receive_json_from()
+            removed = await lobby.receive_json_from()
+            self.assertEqual((added["type"], added["seq"], added["data"]["id"]), ("room_added", 1, "abc"))
+            self.assertEqual((removed["type"], removed["seq"], removed["data"]), ("room_removed", 2, {"id": "abc"}))
+
+            await lobby.send_json_to({"type": "snapshot"})
+            self.assertEqual(await lobby.receive_json_from(), {"type": "rooms", "seq": 2, "data": []})
+            await lobby.disconnect()
+
+        asyncio.run(inner())
+
+
+class TestRoomReaper(SimpleTestCase):
+    def test_abandoned_room_is_removed_without_lobby_traffic(self):
+        async def inner():
+            registry = InMemoryRoomRegistry()
+            app = worker(registry)
+            lobby = WebsocketCommunicator(app, "/ws/ts/lobby/")
+            await lobby.connect()
+            await lobby.receive_json_from()
+            await lobby.send_json_to({"type": "create_room"})
+            created = (await lobby.receive_json_from())["data"]
+            self.assertEqual((await lobby.receive_json_from())["type"], "room_added")
+
+            reaper = RoomReaper(registry, interval_secs=0.01, grace_secs=0.05)
+            reaper.start()
+            removed = await lobby.receive_json_from()
+            self.assertEqual((removed["type"], removed["data"]), ("room_removed", {"id": created["id"]}))
+            self.assertEqual(reaper.reaped, 1)
+            await reaper.stop()
+            await lobby.disconnect()
+
+        asyncio.run(inner())
+
+    def test_started_and_stopped_with_the_asgi_lifespan(self):
+        async def inner():
+            reaper = RoomReaper(InMemoryRoomRegistry(), interval_secs=60)
+            lifespan = ApplicationCommunicator(RoomReaperApp(None, reaper), {"type": "lifespan"})
+            await lifespan.send_input({"type": "lifespan.startup"})
+            self.assertEqual(await lifespan.receive_output(), {"type": "lifespan.startup.complete"})
+            self.assertTrue(reaper.running)
+            await lifespan.send_input({"type": "lifespan.shutdown"})
+            self.assertEqual(await lifespan.receive_output(), {"type": "lifespan.shutdown.complete"})
+            self.assertFalse(reaper.running)
+
+        asyncio.run(inner())
+
+
+class RecordingLayer:
+    def __init__(self):
+        self.sent = []
+
+    async def group_send(self, group, message):
+        self.sent.append(json.loads(message["text"]))
+
+
+def update(seq, room_id):
+    return RoomEvent("room_updated", seq, room_id)
+
+
+class TestLobbyBroadcaster(SimpleTestCase):
+    def test_ticked_senders_must_implement_flush(self):
+        class Silent(TickedSender):
+            pass
+
+        with self.assertRaises(TypeError):
+            Silent()
+
+    def test_burst_is_coalesced_into_one_update_per_tick(self):
+        async def inner():
+            layer, lobby = RecordingLayer(), LobbyBroadcaster(tick_ms=50)
+            for seq in range(1, 11):
+                await lobby.publish(layer, [update(seq, "a")])
+            await lobby.publish(layer, [update(11, "b")])
+            # the first change after a quiet period is not held back
+            self.assertEqual([m["seq"] for m in layer.sent], [1])
+
+            await asyncio.sleep(0.1)
+            self.assertEqual(len(layer.sent), 2)
+            batch = layer.sent[1]
+            self.assertEqual((batch["type"], batch["from_seq"], batch["seq"]), ("room_events", 2, 11))
+            self.assertEqual([(e["seq"], e["data"]["id"]) for e in batch["data"]], [(10, "a"), (11, "b")])
+            stats = lobby.stats()
+            self.assertEqual((stats["events"], stats["messages"], stats["coalesced"]), (11, 2, 8))
+            self.assertEqual(stats["max_coalesced_per_tick"], 8)
+
+            # idle again: the next change goes out at once, as a plain event
+            await lobby.publish(layer, [update(12, "a")])
+            self.assertEqual(layer.sent[-1]["type"], "room_updated")
+
+        asyncio.run(inner())
+
+    def test_changes_numbered_by_another_worker_split_the_batch(self):
+        async def inner():
+            layer, lobby = RecordingLayer(), LobbyBroadcaster(tick_ms=50)
+            await lobby.publish(layer, [update(1, "a")])
+            await lobby.publish(layer, [update(2, "a"), update(3, "a"), update(5, "a")])
+            await asyncio.sleep(0.1)
+            self.assertEqual(
+                [(m.get("from_seq"), m["seq"]) for m in layer.sent], [(None, 1), (2, 3), (None, 5)]
+            )
+
+        asyncio.run(inner())
+
+    def test_zero_tick_sends_every_change(self):
+        async def inner():
+            layer, lobby = RecordingLayer(), LobbyBroadcaster(tick_ms=0)
+            for seq in range(1, 4):
+                await lobby.publish(layer, [update(seq, "a")])
+            self.assertEqual([m["seq"] for m in layer.sent], [1, 2, 3])
+
+        asyncio.run(inner())
@@ -0,0 +1,112 @@
+import asyncio
+
+from channels.testing import WebsocketCommunicator
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from core.models import CustomUser as User
+from ts.models import GameRoom, RoomStatus
+from ts.rooms import InMemoryRoomRegistry
+from ts.rounds import ClockSync, save_match
+from ts.tests.fixtures import make_catalog
+from ts.tests.test_rooms import worker
+
+
+class TestClockSync(SimpleTestCase):
+    def test_uses_the_shortest_round_trip(self):
+        clock = ClockSync()
+        self.assertEqual(clock.to_client(1000), 1000)
+        # client clock 5000ms ahead; the slow reply spent its extra time on the way back
+        clock.add(sent_ms=0, client_ms=5050, received_ms=300)
+        clock.add(sent_ms=1000, client_ms=6020, received_ms=1040)
+        self.assertEqual((clock.rtt_ms, clock.offset_ms), (40, 5000))
+        self.assertEqual(clock.to_client(2000), 7000)
+
+
+async def receive_until(communicator, message_type, clock_ahead_ms=0):
+    """Next message of ``message_type``, answering the engine's pings meanwhile."""
+    while True:
+        message = await communicator.receive_json_from(timeout=5)
+        if message["type"] == "ping":
+            server_ms = message["data"]["server_ms"]
+            pong = {"server_ms": server_ms, "client_ms": server_ms + clock_ahead_ms}
+            await communicator.send_json_to({"type": "pong", "data": pong})
+        elif message["type"] == message_type:
+            return message
+
+
+@override_settings(
+    TS_MATCH_ROUNDS=2, TS_MATCH_CLOCK_SAMPLES=3, TS_MATCH_PING_INTERVAL_MS=20, TS_MATCH_LEAD_MS=0,
+    TS_REVEAL_DELAY_MS=0,
+)
+class TestRoundEngine(TransactionTestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username="alice", password="pw")
+        self.bob = User.objects.create_user(username="bob", password="pw")
+        self.titles = {song.id: song.song_title.title for song in make_catalog(4)}
+
+    async def connect(self, app, room_id, user):
+        communicator = WebsocketCommunicator(app, f"/ws/ts/dualmode/{room_id}/", headers=[(b"host", b"localhost")])
+        communicator.scope["user"] = user
+        await communicator.connect()
+        return communicator
+
+    def test_plays_a_match_and_saves_the_room_once(self):
+        game_room = GameRoom.objects.create(player_1=self.alice)
+
+        async def inner():
+            rooms = InMemoryRoomRegistry()
+            await rooms.create(player_1=self.alice.id, room_id=str(game_room.id), game_room_id=game_room.id)
+            app = worker(rooms)
+            alice = await self.connect(app, game_room.id, self.alice)
+            bob = await self.connect(app, game_room.id, self.bob)
+            await alice.send_json_to({"type": "ready"})
+            await bob.send_json_to({"type": "ready"})
+            await bob.send_json_to({"type": "ready"})
+            self.assertEqual((await receive_until(bob, "error"))["data"]["code"], "cannot_start")
+
+            rounds = await asyncio.gather(receive_until(alice, "round"), receive_until(bob, "round", 5000))
+            data = rounds[0]["data"]
+            self.assertEqual(rounds[0], rounds[1])
+            play_at = data["play_at"]
+            self.assertAlmostEqual(play_at[str(self.alice.id)], data["server_play_at"], delta=50)
+            self.assertAlmostEqual(play_at[str(self.bob.id)] - data["server_play_at"], 5000, delta=50)
+            self.assertNotIn("correct_option", data)
+            # absolute: the frontend is served from another origin
+            self.assertTrue(data["song"]["audio_url"].startswith("http://localhost/media/songs/"))
+
+            correct = self.titles[data["song"]["id"]]
+            wrong = next(option for option in data["options"] if option != correct)
+            await bob.send_json_to({"type": "answer", "data": {"round": 0, "option": wrong}})
+            await bob.send_json_to({"type": "answer", "data": {"round": 0, "option": correct}})
+            await alice.send_json_to({"type": "answer", "data": {"round": 0, "option": correct}})
+            result = (await receive_until(bob, "round_result"))["data"]
+            self.assertEqual((result["winner"], result["correct_option"]), (self.alice.id, correct))
+
+            data = (await receive_until(bob, "round"))["data"]
+            self.assertEqual(data["round"], 1)
+            await bob.send_json_to({"type": "answer", "data": {"round": 1, "option": self.titles[data["song"]["id"]]}})
+            over = (await receive_until(alice, "match_over"))["data"]
+            self.assertEqual(over, {
+                "scores": {str(self.alice.id): 1, str(self.bob.id): 1}, "winner": None, "game_room": game_room.id,
+            })
+            await alice.disconnect()
+            await bob.disconnect()
+            return data["song"]["id"]
+
+        last_song = asyncio.run(inner())
+        game_room.refresh_from_db()
+        self.assertEqual(GameRoom.objects.count(), 1)
+        self.assertEqual(
+            (game_room.status, game_room.player_2_id, game_room.player_1_score, game_room.player_2_score),
+            (RoomStatus.FINISHED, self.bob.id, 1, 1),
+        )
+        self.assertEqual(game_room.current_song_id, last_song)
+
+    def test_rooms_from_the_lobby_insert_their_result(self):
+        with CaptureQueriesContext(connection) as queries:
+            pk = save_match(None, self.alice.id, self.bob.id, 3, 1, None)
+        self.assertEqual(len(queries), 1)
+        room = GameRoom.objects.get(pk=pk)
+        self.assertEqual((room.status, room.player_1_score, room.player_2_score), (RoomStatus.FINISHED, 3, 1))
@@ -0,0 +1,163 @@
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from core.models import CustomUser as User
+from ts.catalog import catalog, posters
+from ts.distractors import distractors
+from ts.exceptions import InvalidState, VersionConflict
+from ts.models import GameSession, GameSessionStatus, GameTurn, SongTitle
+from ts.services import (
+    _save_session,
+    end_session,
+    guess_and_advance,
+    handle_next,
+    start_session,
+    submit_guess,
+)
+from ts.tests.fixtures import make_catalog
+
+
+class ServiceTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="swiftie", password="pw")
+        with self.captureOnCommitCallbacks(execute=True):
+            make_catalog(12)
+        # build the in-process indexes up front so query counts only see game SQL
+        len(catalog)
+        distractors.pool("")
+        posters.urls(0)
+
+    def answer_correctly(self, session):
+        turn = session.current_turn
+        return submit_guess(
+            session_id=session.id,
+            option=turn.correct_option,
+            elapsed_time_ms=0,
+            version=session.version,
+            user=self.user,
+        )
+
+
+class TestTurnDeck(ServiceTestCase):
+    @override_settings(TS_TURN_DECK_SIZE=6, TS_TURN_DECK_REFILL_AT=2)
+    def test_start_session_deals_a_deck_without_repeats(self):
+        with self.assertNumQueries(5):  # incl. savepoint/release
+            session = start_session(self.user)
+        turns = GameTurn.objects.filter(session=session)
+        self.assertEqual(turns.count(), 6)
+        self.assertEqual(len({t.song_id for t in turns}), 6)
+        self.assertEqual(session.dealt_turns, 6)
+        self.assertEqual(session.current_turn.sequence_index, 1)
+        self.assertEqual(session.next_turn.sequence_index, 2)
+
+    @override_settings(TS_TURN_DECK_SIZE=6, TS_TURN_DECK_REFILL_AT=2)
+    def test_handle_next_advances_pointers_and_tops_up(self):
+        session = start_session(self.user)
+        for expected_current in range(2, 9):
+            _, session = self.answer_correctly(session)
+            self.assertEqual(session.status, GameSessionStatus.REVEALING)
+            with self.assertNumQueries(5 if session.dealt_turns - (expected_current + 1) >= 2 else 6):
+                session, current, preloaded = handle_next(session.id, session.version, self.user)
+            self.assertEqual(current.sequence_index, expected_current)
+            self.assertEqual(preloaded.sequence_index, expected_current + 1)
+        self.assertEqual(session.dealt_turns, 12)
+
+    def test_legacy_mode_creates_turns_one_at_a_time(self):
+        session = start_session(self.user)
+        self.assertEqual(GameTurn.objects.filter(session=session).count(), 2)
+        _, session = self.answer_correctly(session)
+        session, current, preloaded = handle_next(session.id, session.version, self.user)
+        self.assertEqual((current.sequence_index, preloaded.sequence_index), (2, 3))
+        self.assertEqual(session.dealt_turns, 3)
+
+
+@override_settings(TS_SESSION_CONCURRENCY="optimistic")
+class TestOptimisticConcurrency(ServiceTestCase):
+    def test_game_loop_without_row_locks(self):
+        session = start_session(self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            _, session = self.answer_correctly(session)
+            session, current, _ = handle_next(session.id, session.version, self.user)
+            session, _ = end_session(session.id, session.version, self.user)
+        self.assertFalse([q for q in ctx.captured_queries if "FOR UPDATE" in q["sql"]])
+        self.assertEqual(session.version, 4)
+        self.assertEqual(session.status, GameSessionStatus.ENDED)
+        self.assertEqual(GameSession.objects.get(id=session.id).version, 4)
+
+    def test_lost_race_maps_to_version_conflict(self):
+        session = start_session(self.user)
+        stale = GameSession.objects.get(id=session.id)
+        GameSession.objects.filter(id=session.id).update(version=F("version") + 1)
+        stale.status = GameSessionStatus.ENDED
+        with self.assertRaises(VersionConflict):
+            _save_session(stale, 1, ["status"])
+        self.assertEqual(
+            GameSession.objects.get(id=session.id).status, GameSessionStatus.IN_PROGRESS
+        )
+
+
+class TestRevealPoster(ServiceTestCase):
+    def test_correct_answer_runs_no_poster_queries(self):
+        session = start_session(self.user)
+        self.assertEqual(session.current_turn.poster_url, "/media/posters/folklore.jpg")
+        with self.assertNumQueries(5):  # savepoint, session, session update, turn update, release
+            turn, _ = self.answer_correctly(session)
+        self.assertEqual(turn.poster_url, "/media/posters/folklore.jpg")
+
+    def test_title_without_posters_does_not_crash(self):
+        SongTitle.poster_pics.through.objects.all().delete()
+        posters.invalidate()
+        session = start_session(self.user)
+        turn, session = self.answer_correctly(session)
+        self.assertEqual(turn.poster_url, "")
+        self.assertEqual(session.status, GameSessionStatus.REVEALING)
+
+    def test_poster_changes_invalidate_the_index(self):
+        before = posters.version
+        title = SongTitle.objects.get(title="Song 0")
+        with self.captureOnCommitCallbacks(execute=True):
+            title.poster_pics.clear()
+            self.assertEqual(posters.version, before)
+        self.assertGreater(posters.version, before)
+        self.assertEqual(posters.urls(title.id), [])
+
+
+class TestGuessAndAdvance(ServiceTestCase):
+    def guess(self, session, option=None):
+        return guess_and_advance(
+            session.id, option or session.current_turn.correct_option, 0, session.version, self.user
+        )
+
+    @override_settings(TS_REVEAL_DELAY_MS=0)
+    def test_correct_answer_advances_with_one_version_bump(self):
+        session = start_session(self.user)
+        first, second = session.current_turn, session.next_turn
+        turn, session, new_turn, preloaded = self.guess(session)
+        self.assertEqual(turn.id, first.id)
+        self.assertEqual(turn.poster_url, "/media/posters/folklore.jpg")
+        self.assertEqual(new_turn.id, second.id)
+        self.assertEqual(preloaded.sequence_index, 3)
+        stored = GameSession.objects.get(id=session.id)
+        self.assertEqual((stored.version, stored.score, stored.status), (2, 1, GameSessionStatus.IN_PROGRESS))
+        self.assertEqual((stored.current_turn_id, stored.next_turn_id), (second.id, preloaded.id))
+        self.assertEqual(self.guess(session)[2].sequence_index, 3)
+
+    @override_settings(TS_REVEAL_DELAY_MS=60_000)
+    def test_next_turn_is_closed_during_the_reveal(self):
+        _, session, _, _ = self.guess(start_session(self.user))
+        with self.assertRaises(InvalidState):
+            self.guess(session)
+        with self.assertRaises(InvalidState):
+            submit_guess(session.id, "x", 0, session.version, self.user)
+
+    def test_wrong_answer_does_not_advance(self):
+        session = start_session(self.user)
+        session.score = 3
+        session.save()
+        turn, session, new_turn, preloaded = self.guess(session, option="nope")
+        self.assertIsNone(new_turn)
+        self.assertIsNone(preloaded)
+        self.assertEqual(session.health, 2)
+        self.assertEqual(GameSession.objects.get(id=session.id).current_turn_id, turn.id)
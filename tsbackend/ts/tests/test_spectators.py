@@ -0,0 +1,88 @@
+import asyncio
+
+from channels.testing import WebsocketCommunicator
+from django.test import SimpleTestCase, override_settings
+
+from core.models import CustomUser as User
+from ts.rooms import InMemoryRoomRegistry
+from ts.spectators import SpectatorFeed, evict_idle_feeds, feeds, spectator_feed, spectator_stats
+from ts.tests.test_rooms import RecordingLayer, worker
+
+
+class TestSpectatorFeed(SimpleTestCase):
+    def test_changes_within_a_tick_are_sent_as_one_view(self):
+        async def inner():
+            layer, feed = RecordingLayer(), SpectatorFeed("abc", tick_ms=50)
+            await feed.update(layer, room={"player_1_score": 0})
+            for score in (1, 2, 3):
+                await feed.update(layer, room={"player_1_score": score})
+            await feed.update(layer, round={"round": 3})
+            self.assertEqual(layer.sent, [{"type": "room_view", "data": {"room": {"player_1_score": 0}}}])
+
+            await asyncio.sleep(0.1)
+            self.assertEqual(layer.sent[1]["data"], {"room": {"player_1_score": 3}, "round": {"round": 3}})
+            self.assertEqual(len(layer.sent), 2)
+            self.assertEqual(feed.state, layer.sent[1]["data"])
+
+        asyncio.run(inner())
+
+    @override_settings(TS_SPECTATOR_FEED_IDLE_SECS=60)
+    def test_feeds_unused_past_the_idle_time_are_dropped(self):
+        feeds.clear()
+        spectator_stats.clear()
+        spectator_feed("old").used_at -= 120
+        used = spectator_feed("used")
+        self.assertIs(spectator_feed("used"), used)
+        evict_idle_feeds()
+        self.assertEqual(list(feeds), ["used"])
+        # removed in another worker: nothing here touches the room again
+        evict_idle_feeds(now=used.used_at + 61)
+        self.assertEqual(list(feeds), [])
+        self.assertEqual(spectator_stats["evicted"], 2)
+
+
+@override_settings(TS_SPECTATOR_TICK_MS=50)
+class TestSpectators(SimpleTestCase):
+    def setUp(self):
+        spectator_stats.clear()
+
+    async def connect(self, app, user):
+        communicator = WebsocketCommunicator(app, "/ws/ts/dualmode/abc/")
+        communicator.scope["user"] = user
+        await communicator.connect()
+        return communicator
+
+    def test_spectators_get_throttled_views_instead_of_room_messages(self):
+        alice, bob, carol = User(id=1, username="alice"), User(id=2, username="bob"), User(id=3, username="carol")
+
+        async def inner():
+            app = worker(InMemoryRoomRegistry())
+            players = [await self.connect(app, user) for user in (alice, bob)]
+            spectator = await self.connect(app, carol)
+            self.assertEqual((await spectator.receive_json_from())["type"], "room_state")
+            view = await spectator.receive_json_from()
+            self.assertEqual((view["type"], view["data"]["room"]["player_2"]), ("room_view", bob.id))
+
+            await spectator.send_json_to({"type": "chat", "data": {"text": "hi"}})
+            self.assertEqual((await spectator.receive_json_from())["data"]["code"], "spectator")
+
+            await players[0].send_json_to({"type": "chat", "data": {"text": "hello"}})
+            received = [(await players[1].receive_json_from())["type"] for _ in range(3)]
+            # bob's own join and alice's chat; carol joining is not announced to the players
+            self.assertEqual(received, ["room_state", "player_joined", "chat"])
+            self.assertTrue(await players[1].receive_nothing())
+            # only the held view of the joins, no chat
+            seen = set()
+            while not await spectator.receive_nothing(timeout=0.2):
+                seen.add((await spectator.receive_json_from())["type"])
+            self.assertLessEqual(seen, {"room_view"})
+
+            await players[1].disconnect()
+            view = await spectator.receive_json_from()
+            self.assertEqual(view["data"]["room"]["members"], 2)
+
+            await players[0].disconnect()
+            await spectator.disconnect()
+            self.assertNotIn("abc", feeds)
+
+        asyncio.run(inner())
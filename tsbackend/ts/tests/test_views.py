@@ -0,0 +1,346 @@
+import asyncio
+import base64
+import json
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from django.db import connection
+from django.test import AsyncClient, Client, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.models import CustomUser as User
+from ts.catalog import catalog, posters
+from ts.db import db_pool
+from ts.distractors import distractors
+from ts.idempotency import replay_cache
+from ts.models import GameSession, GameSessionStatus, GameTurn, GameTurnOutcome, Song
+from ts.rooms import registry
+from ts.serializers import GameTurnSerializer
+from ts.services import handle_next, submit_guess
+from ts.tests.fixtures import make_catalog
+
+
+class GameApiTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="swiftie", password="pw")
+        # through TestCase: TestAsyncGameViews shares this setUp
+        with TestCase.captureOnCommitCallbacks(execute=True):
+            make_catalog(8)
+        len(catalog)
+        distractors.pool("")
+        posters.urls(0)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def start(self):
+        return self.client.post("/ts/game-sessions/").data["session"]
+
+    def correct_option(self, session):
+        return GameSession.objects.get(id=session["id"]).current_turn.correct_option
+
+
+class TestIdempotentActions(GameApiTestCase):
+    def setUp(self):
+        super().setUp()
+        replay_cache.clear()
+
+    def test_retried_guess_replays_first_response(self):
+        session = self.start()
+        url = f"/ts/game-sessions/{session['id']}/guess/"
+        body = {"option": self.correct_option(session), "version": session["version"], "elapsed_time_ms": 0}
+        hits = replay_cache.hits
+
+        first = self.client.post(url, body, format="json", HTTP_IDEMPOTENCY_KEY="k1")
+        retry = self.client.post(url, body, format="json", HTTP_IDEMPOTENCY_KEY="k1")
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(replay_cache.hits, hits + 1)
+        self.assertEqual(GameSession.objects.get(id=session["id"]).version, session["version"] + 1)
+
+    def test_without_key_a_retry_conflicts(self):
+        session = self.start()
+        url = f"/ts/game-sessions/{session['id']}/guess/"
+        body = {"option": self.correct_option(session), "version": session["version"], "elapsed_time_ms": 0}
+        self.client.post(url, body, format="json")
+        self.assertEqual(self.client.post(url, body, format="json").status_code, 409)
+
+    def test_keys_are_scoped_per_user(self):
+        session = self.start()
+        url = f"/ts/game-sessions/{session['id']}/end-session/"
+        self.client.post(url, {"version": session["version"]}, format="json", HTTP_IDEMPOTENCY_KEY="k2")
+
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user(username="other", password="pw"))
+        # not replayed: the service runs and finds no session owned by this user
+        response = other.post(url, {"version": session["version"]}, format="json", HTTP_IDEMPOTENCY_KEY="k2")
+        self.assertEqual(response.status_code, 404)
+
+    def test_key_reused_with_another_body_is_422(self):
+        session = self.start()
+        url = f"/ts/game-sessions/{session['id']}/guess/"
+        body = {"option": self.correct_option(session), "version": session["version"], "elapsed_time_ms": 0}
+        self.client.post(url, body, format="json", HTTP_IDEMPOTENCY_KEY="k3")
+        response = self.client.post(url, {**body, "option": "other"}, format="json", HTTP_IDEMPOTENCY_KEY="k3")
+        self.assertEqual(response.status_code, 422)
+        self.assertNotIn("Idempotent-Replayed", response)
+
+
+class TestTurnPayload(GameApiTestCase):
+    def test_poster_is_hidden_until_answered_correctly(self):
+        session = self.start()
+        turn = self.client.get(f"/ts/game-turns/{session['current_turn']}/").data
+        self.assertIsNone(turn["poster_url"])
+
+        response = self.client.post(
+            f"/ts/game-sessions/{session['id']}/guess/",
+            {"option": self.correct_option(session), "version": session["version"], "elapsed_time_ms": 0},
+            format="json",
+        )
+        self.assertEqual(response.data["turn"]["poster_url"], "/media/posters/folklore.jpg")
+
+    def test_guess_and_advance_is_one_request(self):
+        session = self.start()
+        response = self.client.post(
+            f"/ts/game-sessions/{session['id']}/guess-and-advance/",
+            {"option": self.correct_option(session), "version": session["version"], "elapsed_time_ms": 0},
+            format="json",
+        ).data
+        self.assertEqual(response["turn"]["outcome"], GameTurnOutcome.CORRECT)
+        self.assertEqual(response["new_turn"]["id"], session["next_turn"])
+        self.assertEqual(response["session"]["current_turn"], session["next_turn"])
+        self.assertEqual(response["reveal_ms"], 2000)
+
+    def test_start_carries_playable_turns_without_the_answer(self):
+        data = self.client.post("/ts/game-sessions/").data
+        for key in ("turn", "preloaded_turn"):
+            song_data = data[key]["song_data"]
+            self.assertEqual(set(song_data), {"id", "audio_url", "snippet_start_sec"})
+            song = Song.objects.get(id=song_data["id"])
+            self.assertEqual(song_data["audio_url"], f"http://testserver/media/{song.file.name}")
+            self.assertNotIn(song.song_title.title, str(song_data))
+        self.assertEqual(data["turn"]["id"], data["session"]["current_turn"])
+
+    def test_turns_from_services_serialize_without_queries(self):
+        session = self.start()
+        turn, _ = submit_guess(session["id"], self.correct_option(session), 0, session["version"], self.user)
+        _, new_turn, preloaded = handle_next(session["id"], session["version"] + 1, self.user)
+        with self.assertNumQueries(0):
+            for t in (turn, new_turn, preloaded):
+                GameTurnSerializer(t).data
+
+
+class TestPreviousResults(GameApiTestCase):
+    def finish_sessions(self, count):
+        song = Song.objects.select_related("song_title").first()
+        for i in range(count):
+            session = GameSession.objects.create(
+                user=self.user, score=i, status=GameSessionStatus.ENDED, ended_at=timezone.now()
+            )
+            GameTurn.objects.create(
+                session=session, sequence_index=1, song=song, correct_option="x",
+                outcome=GameTurnOutcome.WRONG,
+            )
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        self.finish_sessions(2)
+        with self.assertNumQueries(3):  # count, page, songs
+            small = self.client.get("/ts/game-sessions/previous-results/")
+        self.finish_sessions(8)
+        with self.assertNumQueries(3):
+            full = self.client.get("/ts/game-sessions/previous-results/")
+        self.assertEqual(len(small.data["results"]), 2)
+        self.assertEqual(len(full.data["results"]), 10)
+
+    def test_payload_is_slim(self):
+        self.finish_sessions(1)
+        GameSession.objects.create(user=self.user, status=GameSessionStatus.ENDED, ended_at=timezone.now())
+        results = self.client.get("/ts/game-sessions/previous-results/").data["results"]
+        self.assertIsNone(results[0]["last_correct_song"])
+        song = results[1]["last_correct_song"]
+        self.assertEqual(set(song), {"id", "file", "song_title"})
+        self.assertEqual(set(song["song_title"]), {"id", "title", "album"})
+
+
+class TestKeysetPagination(GameApiTestCase):
+    def test_walks_all_turns_without_count(self):
+        for _ in range(4):
+            self.start()  # 2 turns each, 8 in total
+        for i in range(3):
+            self.start()
+        self.assertEqual(self.client.get("/ts/game-turns/").data["count"], 14)
+        seen, url = [], "/ts/game-turns/?cursor="
+        pages = 0
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                data = self.client.get(url).data
+            self.assertFalse([q for q in ctx.captured_queries if "COUNT(" in q["sql"]])
+            seen += [turn["id"] for turn in data["results"]]
+            url, pages = data["next"], pages + 1
+        expected = list(GameTurn.objects.order_by("session_id", "sequence_index").values_list("id", flat=True))
+        self.assertEqual(seen, expected)
+        self.assertEqual(pages, 2)
+
+        previous = self.client.get(data["previous"]).data
+        self.assertEqual([t["id"] for t in previous["results"]], expected[:10])
+        self.assertIsNone(previous["previous"])
+
+    def test_previous_results_cursor_is_opt_in(self):
+        for score in range(12):
+            GameSession.objects.create(
+                user=self.user, score=score, status=GameSessionStatus.ENDED, ended_at=timezone.now()
+            )
+        paged = self.client.get("/ts/game-sessions/previous-results/").data
+        self.assertEqual(paged["count"], 12)
+        first = self.client.get("/ts/game-sessions/previous-results/?cursor=").data
+        self.assertNotIn("count", first)
+        second = self.client.get(first["next"]).data
+        ids = [r["session_id"] for r in first["results"] + second["results"]]
+        self.assertEqual(ids, [r["session_id"] for r in paged["results"]] + [
+            s.id for s in GameSession.objects.order_by("-ended_at", "id")[10:]
+        ])
+
+    def test_bad_cursor_is_404(self):
+        self.assertEqual(self.client.get("/ts/game-turns/?cursor=nope").status_code, 404)
+        for position in (["x", "y"], [1, None], [[1], 2]):
+            cursor = base64.urlsafe_b64encode(json.dumps({"r": 0, "p": position}).encode()).decode()
+            self.assertEqual(self.client.get(f"/ts/game-turns/?cursor={cursor}").status_code, 404)
+        cursor = base64.urlsafe_b64encode(b'{"r": 0, "p": ["yesterday", 1]}').decode()
+        self.assertEqual(self.client.get(f"/ts/game-rooms/?cursor={cursor}").status_code, 404)
+
+
+class TestGameRooms(GameApiTestCase):
+    def test_created_rooms_are_opened_for_their_match(self):
+        room_id = self.client.post("/ts/game-rooms/", {}).data["id"]
+        live = next(room for room in async_to_sync(registry().snapshot)()[1] if room.id == str(room_id))
+        self.assertEqual((live.player_1, live.game_room_id), (self.user.id, room_id))
+
+
+def shape(data):
+    if isinstance(data, dict):
+        return {key: shape(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [shape(value) for value in data]
+    return type(data).__name__
+
+
+FORM = "application/x-www-form-urlencoded"
+
+
+class TestAsyncGameViews(TransactionTestCase):
+    """The game actions as served under ASGI (``ts.async_views``)."""
+
+    def setUp(self):
+        GameApiTestCase.setUp(self)
+        replay_cache.clear()
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+
+    async def post(self, url, body=None, content_type="application/json", **headers):
+        headers.setdefault("Authorization", f"Bearer {self.token}")
+        return await AsyncClient().post(url, {} if body is None else body, content_type=content_type, headers=headers)
+
+    def test_plays_and_ends_a_session(self):
+        async def inner():
+            submitted = db_pool.stats()["submitted"]
+            started = await self.post("/ts/game-sessions/")
+            self.assertEqual(started.status_code, 201)
+            session = started.json()["session"]
+            self.assertTrue(started.json()["turn"]["song_data"]["audio_url"].startswith("http://testserver/media/"))
+
+            base = f"/ts/game-sessions/{session['id']}"
+            option = await database_sync_to_async(self.correct_option)(session)
+            guess = {"option": option, "version": session["version"], "elapsed_time_ms": 0}
+            guessed = await self.post(f"{base}/guess/", guess)
+            self.assertEqual(guessed.json()["turn"]["outcome"], GameTurnOutcome.CORRECT)
+
+            version = guessed.json()["session"]["version"]
+            advanced = await self.post(f"{base}/next-turn/", {"version": version})
+            self.assertEqual(advanced.json()["new_turn"]["id"], started.json()["preloaded_turn"]["id"])
+
+            stale = await self.post(f"{base}/end-session/", {"version": version})
+            self.assertEqual((stale.status_code, stale.json()["detail"][:13]), (409, "Stale version"))
+            version = advanced.json()["session"]["version"]
+            ended = await self.post(f"{base}/end-session/", {"version": version})
+            self.assertEqual(ended.json()["session"]["status"], GameSessionStatus.ENDED)
+            self.assertEqual(db_pool.stats()["submitted"], submitted + 5)
+
+        asyncio.run(inner())
+
+    def test_retries_are_replayed_and_errors_match_the_viewset(self):
+        async def inner():
+            session = (await self.post("/ts/game-sessions/")).json()["session"]
+            url = f"/ts/game-sessions/{session['id']}/guess/"
+            body = {"option": "nope", "version": session["version"], "elapsed_time_ms": 0}
+            first = await self.post(url, body, **{"Idempotency-Key": "k"})
+            retry = await self.post(url, body, **{"Idempotency-Key": "k"})
+            self.assertEqual(retry.json(), first.json())
+            self.assertEqual(retry["Idempotent-Replayed"], "true")
+
+            invalid = await self.post(url, {"version": 1})
+            self.assertEqual((invalid.status_code, sorted(invalid.json())), (400, ["elapsed_time_ms", "option"]))
+            anonymous = await self.post(url, body, Authorization="")
+            self.assertEqual(anonymous.status_code, 401)
+            self.assertIn("Bearer", anonymous["WWW-Authenticate"])
+
+        asyncio.run(inner())
+
+    def play(self, post):
+        """One scripted run of the actions, errors included; returns what the
+        client sees of each response."""
+        seen = []
+
+        def step(url, body=None, content_type="application/json", **headers):
+            response = post(url, {} if body is None else body, content_type, **headers)
+            data = response.json()
+            # ids, songs and options differ between runs; bodies of errors do not
+            seen.append((
+                response.status_code,
+                data if response.status_code >= 400 else shape(data),
+                response.get("Idempotent-Replayed"),
+                response.get("WWW-Authenticate"),
+            ))
+            return data
+
+        session = step("/ts/game-sessions/")["session"]
+        base = f"/ts/game-sessions/{session['id']}"
+        guess = {"option": self.correct_option(session), "version": session["version"], "elapsed_time_ms": 0}
+        step(f"{base}/guess/", {"version": session["version"]})
+        step(f"{base}/guess/", "{")
+        step(f"{base}/guess/", {**guess, "version": session["version"] + 1})
+        step(f"{base}/guess/", guess, Authorization="")
+        guessed = step(f"{base}/guess/", guess, **{"Idempotency-Key": "k"})
+        step(f"{base}/guess/", guess, **{"Idempotency-Key": "k"})
+        step(f"{base}/guess/", {**guess, "option": "other"}, **{"Idempotency-Key": "k"})
+        step(f"{base}/next-turn/", "version=1", "text/plain")
+        # form bodies, as the browsable API posts them
+        advanced = step(f"{base}/next-turn/", f"version={guessed['session']['version']}", FORM)
+        session = advanced["session"]
+        guess = {"option": self.correct_option(session), "version": session["version"], "elapsed_time_ms": 0}
+        advanced = step(f"{base}/guess-and-advance/", guess)
+        step(f"{base}/end-session/", {"version": advanced["session"]["version"]})
+        step(f"/ts/game-sessions/{session['id'] + 1000}/end-session/", {"version": 1})
+        return seen
+
+    def test_async_views_answer_like_the_viewset(self):
+        def wsgi(url, body, content_type, **headers):
+            headers.setdefault("Authorization", f"Bearer {self.token}")
+            return Client().post(url, body, content_type=content_type, headers=headers)
+
+        def asgi(url, body, content_type, **headers):
+            return async_to_sync(self.post)(url, body, content_type, **headers)
+
+        submitted = db_pool.stats()["submitted"]
+        viewset = self.play(wsgi)
+        self.assertEqual(db_pool.stats()["submitted"], submitted)
+        replay_cache.clear()
+        self.assertEqual(self.play(asgi), viewset)
+        self.assertGreater(db_pool.stats()["submitted"], submitted)
+        self.assertEqual([status for status, *_ in viewset], [201, 400, 400, 409, 401, 200, 200, 422, 415, 200, 200, 200, 404])
+
+    def correct_option(self, session):
+        return GameSession.objects.get(id=session["id"]).current_turn.correct_option
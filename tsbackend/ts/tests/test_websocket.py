@@ -1,6 +1,18 @@
 import asyncio
 
-from django.test import SimpleTestCase
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.test import SimpleTestCase, TransactionTestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.models import CustomUser as User
+from ts.consumers import _socket_context
+from ts.fanout import TextFrameMixin, encode, group_send_json
+from ts.models import GameTurn, Song
+from ts.tests.fixtures import make_catalog
+from tsbackend.asgi import application
 
 
 class TestWebsocketRoom(SimpleTestCase):
@@ -38,3 +50,119 @@ class TestWebsocketRoom(SimpleTestCase):
             await communicator.disconnect()
 
         asyncio.run(inner())
+
+
+class FanoutListener(TextFrameMixin, AsyncJsonWebsocketConsumer):
+    async def connect(self):
+        await self.channel_layer.group_add("fanout", self.channel_name)
+        await self.accept()
+
+    async def send_json(self, content, close=False):
+        raise AssertionError("group_send_json frames must not be encoded again")
+
+
+class TestGroupFanout(SimpleTestCase):
+    def test_members_get_the_frame_encoded_once(self):
+        async def inner():
+            members = [WebsocketCommunicator(FanoutListener.as_asgi(), "/") for _ in range(2)]
+            for communicator in members:
+                connected, _ = await communicator.connect()
+                assert connected is True
+
+            payload = {"type": "room_updated", "seq": 7, "data": {"id": "abc", "title": "Anti-Hero"}}
+            await group_send_json(get_channel_layer(), "fanout", payload)
+            frames = [await communicator.receive_from() for communicator in members]
+            assert frames == [encode(payload)] * 2
+            for communicator in members:
+                await communicator.disconnect()
+
+        asyncio.run(inner())
+
+
+class TestSocketContext(SimpleTestCase):
+    def test_urls_follow_the_handshake_host_and_scheme(self):
+        scope = {"scheme": "wss", "headers": [(b"host", b"localhost")], "server": ("10.0.0.2", 8001)}
+        request = _socket_context(scope)["request"]
+        self.assertEqual(request.build_absolute_uri("/media/songs/a.mp3"), "https://localhost/media/songs/a.mp3")
+
+    def test_unknown_host_keeps_urls_relative(self):
+        self.assertEqual(_socket_context({"scheme": "ws", "headers": [(b"host", b"evil.example")]}), {})
+        self.assertEqual(_socket_context({"scheme": "ws", "headers": []}), {})
+
+
+class TestGameSessionSocket(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="swiftie")
+        make_catalog(8)
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+
+    def test_anonymous_connection_is_refused(self):
+        async def inner():
+            communicator = WebsocketCommunicator(application, "/ws/ts/game/")
+            connected, code = await communicator.connect()
+            assert connected is False
+            assert code == 4401
+
+        asyncio.run(inner())
+
+    def test_bad_messages_get_an_error_and_keep_the_socket(self):
+        async def inner():
+            communicator = WebsocketCommunicator(application, f"/ws/ts/game/?token={self.token}")
+            connected, _ = await communicator.connect()
+            assert connected is True
+            for message in ([1, 2], "start", {"type": "guess", "data": [1]}, {"type": "next", "data": "x"}):
+                await communicator.send_json_to(message)
+                assert (await communicator.receive_json_from())["data"]["code"] == "bad_message"
+
+            # an unexpected failure, here an empty catalog, is reported like the API's
+            await database_sync_to_async(lambda: Song.objects.all().delete())()
+            await communicator.send_json_to({"type": "start", "ref": 1})
+            failed = await communicator.receive_json_from()
+            assert (failed["type"], failed["ref"], failed["data"]["code"]) == ("error", 1, "server_error")
+            await communicator.send_json_to({"type": "next", "data": {}})
+            assert (await communicator.receive_json_from())["data"]["code"] == {"session": ["invalid"]}
+            await communicator.disconnect()
+
+        with self.assertLogs("ts.consumers", "ERROR"):
+            asyncio.run(inner())
+
+    def test_plays_a_turn_over_one_socket(self):
+        async def inner():
+            communicator = WebsocketCommunicator(
+                application, f"/ws/ts/game/?token={self.token}", headers=[(b"host", b"localhost:8000")]
+            )
+            connected, _ = await communicator.connect()
+            assert connected is True
+
+            await communicator.send_json_to({"type": "start", "ref": 1})
+            started = await communicator.receive_json_from()
+            assert (started["type"], started["ref"]) == ("start", 1)
+            session = started["data"]["session"]
+            # absolute, as the REST actions return it
+            assert started["data"]["preloaded_turn"]["song_data"]["audio_url"].startswith("http://localhost:8000/media/songs/")
+
+            answer = await database_sync_to_async(
+                lambda: GameTurn.objects.get(id=session["current_turn"]).correct_option
+            )()
+            await communicator.send_json_to({
+                "type": "guess",
+                "data": {"session": session["id"], "option": answer, "version": session["version"], "elapsed_time_ms": 0},
+            })
+            guessed = (await communicator.receive_json_from())["data"]
+            assert guessed["turn"]["outcome"] == "correct"
+
+            await communicator.send_json_to({"type": "next", "data": {"session": session["id"], "version": session["version"]}, "ref": "stale"})
+            stale = await communicator.receive_json_from()
+            assert (stale["type"], stale["ref"], stale["data"]["code"]) == ("error", "stale", "version_conflict")
+
+            version = guessed["session"]["version"]
+            await communicator.send_json_to({"type": "next", "data": {"session": session["id"], "version": version}})
+            advanced = (await communicator.receive_json_from())["data"]
+            assert advanced["new_turn"]["id"] == session["next_turn"]
+
+            await communicator.send_json_to({"type": "end", "data": {"session": session["id"], "version": version + 1}})
+            ended = (await communicator.receive_json_from())["data"]
+            assert ended["session"]["status"] == "ended"
+            await communicator.disconnect()
+
+        asyncio.run(inner())
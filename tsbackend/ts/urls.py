@@ -3,6 +3,7 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     SongViewSet,
     rand_titles,
+    metrics,
     SongTitleViewSet,
     PosterViewSet,
     CommentViewSet,
@@ -24,4 +25,5 @@ router.register(r"game-rooms", RoomViewSet, basename="game-rooms")
 urlpatterns = [
     path("", include(router.urls)),
     path("random-titles/", rand_titles, name="random-titles"),
+    path("metrics/", metrics, name="metrics"),
 ]
@@ -3,11 +3,31 @@ from rest_framework import viewsets, status
 from .services import (
     handle_next,
     end_session,
+    guess_and_advance,
     start_session,
     submit_guess,
     get_top_score_of_current_week,
 )
 from .services import get_top_score_of_current_week
+from .authentication import CachedJWTAuthentication, user_cache
+from .catalog import catalog
+from .db import db_pool
+from .idempotency import idempotent, replay_cache
+from .leaderboard import iso_week, leaderboard
+from .fanout import group_send_json
+from .limits import relay_stats
+from .lobby import broadcaster, reaper
+from .rooms import registry
+from .rounds import engines
+from .spectators import stats as spectator_stats
+from .pagination import PageNumberOrKeysetPagination
+from .payloads import (
+    end_session_payload,
+    guess_and_advance_payload,
+    guess_payload,
+    next_turn_payload,
+    start_payload,
+)
 from .models import (
     GameSession,
     GameSessionStatus,
@@ -23,6 +43,7 @@ from .serializers import (
     GuessSerializer,
     VersionNumberSerializer,
     SongSerializer,
+    SongSummarySerializer,
     SongTitleSerializer,
     PosterSerializer,
     CommentSerializer,
@@ -30,10 +51,10 @@ from .serializers import (
     GameTurnSerializer,
     RoomSerializer,
 )
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from django.db.models import OuterRef, Subquery
 import random
 from core.serializer import UserSerializer
 from channels.layers import get_channel_layer
@@ -79,6 +100,8 @@ class PosterViewSet(viewsets.ModelViewSet):
 class CommentViewSet(viewsets.ModelViewSet):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
+    pagination_class = PageNumberOrKeysetPagination
+    keyset_ordering = ("-id",)
 
 
 @api_view(["GET"])
@@ -88,16 +111,88 @@ def rand_titles(request):
     return Response(random_titles)
 
 
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def metrics(request):
+    """Per-worker counters of the in-process caches and the lobby broadcaster."""
+    return Response(
+        {
+            "song_catalog_version": catalog.version,
+            "idempotency": replay_cache.stats(),
+            "auth": user_cache.stats(),
+            "lobby": broadcaster(registry()).stats(),
+            "lobby_reaper": reaper.stats(),
+            "room_relay": dict(relay_stats),
+            "ws_db_pool": db_pool.stats(),
+            "matches_running": len(engines),
+            "spectators": spectator_stats(),
+        }
+    )
+
+
+def previous_results_queryset(user):
+    """Finished sessions of ``user``, annotated with their last wrong turn."""
+    last_wrong_turn = GameTurn.objects.filter(
+        session=OuterRef("pk"), outcome=GameTurnOutcome.WRONG
+    ).order_by("-sequence_index")
+    return (
+        GameSession.objects.filter(user=user)
+        .filter(status=GameSessionStatus.ENDED)
+        .order_by("-ended_at", "id")
+        .only("id", "score", "ended_at")
+        .annotate(last_turn_id=Subquery(last_wrong_turn.values("id")[:1]))
+    )
+
+
+def previous_results_data(sessions):
+    """
+    Build the previous-results records for sessions annotated with
+    ``last_turn_id``; the songs of all those turns are loaded in one query.
+    """
+    sessions = list(sessions)
+    turns = (
+        GameTurn.objects.filter(id__in=[s.last_turn_id for s in sessions if s.last_turn_id])
+        .select_related("song__song_title")
+        .only(
+            "song__id",
+            "song__file",
+            "song__song_title__id",
+            "song__song_title__title",
+            "song__song_title__album",
+        )
+        .in_bulk()
+    )
+    results = []
+    for session in sessions:
+        turn = turns.get(session.last_turn_id)
+        results.append(
+            {
+                "session_id": session.id,
+                "score": session.score,
+                "ended_at": session.ended_at,
+                "last_correct_song": SongSummarySerializer(turn.song).data if turn else None,
+            }
+        )
+    return results
+
+
 class GameSessionViewSet(viewsets.ModelViewSet):
     queryset = GameSession.objects.all()
     serializer_class = GameSessionSerlaiizer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
+    # page numbers unless the client asks for ?cursor= (frontend uses page counts)
+    pagination_class = PageNumberOrKeysetPagination
+
+    def get_keyset_ordering(self):
+        if self.action == "previous_results":
+            return ("-ended_at", "id")
+        return ("-created_at", "-id")
 
     def create(self, request, *args, **kwargs):
         session = start_session(request.user)
-        data = GameSessionSerlaiizer(session).data
-        return Response({"session": data}, status=status.HTTP_201_CREATED)
+        payload = start_payload(session, self.get_serializer_context())
+        return Response(payload, status=status.HTTP_201_CREATED)
 
     @action(
         detail=True,
@@ -105,6 +200,7 @@ class GameSessionViewSet(viewsets.ModelViewSet):
         permission_classes=[IsAuthenticated],
         url_path="guess",
     )
+    @idempotent("guess")
     def guess(self, request, pk):
         user = request.user
         serializer = GuessSerializer(data=request.data)
@@ -120,10 +216,32 @@ class GameSessionViewSet(viewsets.ModelViewSet):
             version=version,
             user=user,
         )
-        payload = {
-            "turn": GameTurnSerializer(turn).data,
-            "session": GameSessionSerlaiizer(session).data,
-        }
+        payload = guess_payload(turn, session, self.get_serializer_context())
+        return Response(payload, status=status.HTTP_200_OK)
+
+    @action(
+        detail=True,
+        methods=["POST"],
+        permission_classes=[IsAuthenticated],
+        url_path="guess-and-advance",
+    )
+    @idempotent("guess-and-advance")
+    def guess_and_advance(self, request, pk):
+        """``guess`` followed by ``next-turn`` in one request when the answer
+        is correct. The client shows the reveal for ``reveal_ms`` before
+        playing ``new_turn``; guesses on it are refused until then."""
+        serializer = GuessSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        turn, session, new_turn, preloaded_turn = guess_and_advance(
+            session_id=int(pk),
+            option=serializer.validated_data["option"],
+            elapsed_time_ms=serializer.validated_data["elapsed_time_ms"],
+            version=serializer.validated_data["version"],
+            user=request.user,
+        )
+        payload = guess_and_advance_payload(
+            turn, session, new_turn, preloaded_turn, self.get_serializer_context()
+        )
         return Response(payload, status=status.HTTP_200_OK)
 
     @action(
@@ -132,6 +250,7 @@ class GameSessionViewSet(viewsets.ModelViewSet):
         permission_classes=[IsAuthenticated],
         url_path="next-turn",
     )
+    @idempotent("next-turn")
     def next_turn(self, request, pk):
         user = request.user
         serializer = VersionNumberSerializer(data=request.data)
@@ -141,11 +260,7 @@ class GameSessionViewSet(viewsets.ModelViewSet):
         session, new_turn, preloaded_turn = handle_next(
             session_id=session_id, version=version, user=user
         )
-        payload = {
-            "session": GameSessionSerlaiizer(session).data,
-            "new_turn": GameTurnSerializer(new_turn).data,
-            "preloaded_turn": GameTurnSerializer(preloaded_turn).data,
-        }
+        payload = next_turn_payload(session, new_turn, preloaded_turn, self.get_serializer_context())
         return Response(payload, status=status.HTTP_200_OK)
 
     @action(
@@ -154,6 +269,7 @@ class GameSessionViewSet(viewsets.ModelViewSet):
         permission_classes=[IsAuthenticated],
         url_path="end-session",
     )
+    @idempotent("end-session")
     def end_session(self, request, pk):
         user = request.user
         serializer = VersionNumberSerializer(data=request.data)
@@ -161,10 +277,7 @@ class GameSessionViewSet(viewsets.ModelViewSet):
         session_id = int(pk)
         version = serializer.validated_data["version"]
         session, turn = end_session(session_id=session_id, version=version, user=user)
-        payload = {
-            "session": GameSessionSerlaiizer(session).data,
-            "turn": GameTurnSerializer(turn).data,
-        }
+        payload = end_session_payload(session, turn, self.get_serializer_context())
         return Response(payload, status=status.HTTP_200_OK)
 
     @action(
@@ -180,12 +293,7 @@ class GameSessionViewSet(viewsets.ModelViewSet):
         and end_time if available. Unfinished sessions are excluded.
         Paginated response.
         """
-        user = request.user
-        qs = (
-            GameSession.objects.filter(user=user)
-            .filter(status=GameSessionStatus.ENDED)
-            .order_by("-ended_at", "id")
-        )
+        qs = previous_results_queryset(request.user)
 
         # Get paginated queryset
         page = self.paginate_queryset(qs)
@@ -194,28 +302,7 @@ class GameSessionViewSet(viewsets.ModelViewSet):
         else:
             sessions = qs
 
-        results = []
-        for session in sessions:
-            # Get the last turn for this session
-            last_turn: GameTurn = (
-                session.turns.filter(outcome=GameTurnOutcome.WRONG)
-                .order_by("-sequence_index")
-                .first()
-            )
-
-            result_data = {
-                "session_id": session.id,
-                "score": session.score,
-                "ended_at": session.ended_at,
-            }
-
-            # Add last correct song if last turn exists
-            if last_turn:
-                result_data["last_correct_song"] = SongSerializer(last_turn.song).data
-            else:
-                result_data["last_correct_song"] = None
-
-            results.append(result_data)
+        results = previous_results_data(sessions)
 
         if page is not None:
             return self.get_paginated_response(results)
@@ -246,23 +333,47 @@ class GameSessionViewSet(viewsets.ModelViewSet):
         url_path="top-week-scores",
     )
     def top_week_scores(self, request):
+        """
+        Return this week's 13 best players with their best score. A player
+        is listed once (the list used to have one entry per session, so a
+        player with several high games could fill it).
+        """
         items = get_top_score_of_current_week()
         results = [
             {"score": score, "user": UserSerializer(user).data} for score, user in items
         ]
         return Response(results)
 
+    @action(
+        detail=False,
+        methods=["get"],
+        permission_classes=[IsAuthenticated],
+        url_path="my-week-rank",
+    )
+    def my_week_rank(self, request):
+        """
+        Return the authenticated user's rank and best score on this week's
+        leaderboard; both are null if the user has not finished a game yet.
+        """
+        entry = leaderboard.rank(request.user.id)
+        rank, score = entry if entry else (None, None)
+        return Response({"week": iso_week(), "rank": rank, "score": score})
+
 
 class GameTurnViewSet(viewsets.ModelViewSet):
-    queryset = GameTurn.objects.all()
+    queryset = GameTurn.objects.select_related("song")
     serializer_class = GameTurnSerializer
+    pagination_class = PageNumberOrKeysetPagination
+    keyset_ordering = ("session_id", "sequence_index")
 
 
 class RoomViewSet(viewsets.ModelViewSet):
     queryset = GameRoom.objects.all().select_related("player_1", "player_2", "current_song")
     serializer_class = RoomSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = PageNumberOrKeysetPagination
+    keyset_ordering = ("-created_at", "-id")
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -273,7 +384,13 @@ class RoomViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         # creator is always player_1; ignore any incoming player_1
-        serializer.save(player_1=self.request.user)
+        room = serializer.save(player_1=self.request.user)
+        # the live room players connect to by this id; the match result updates this row
+        try:
+            async_to_sync(registry().create)(player_1=room.player_1_id, room_id=str(room.pk), game_room_id=room.pk)
+        except ValueError:
+            # someone already connected to the id
+            async_to_sync(registry().update)(str(room.pk), game_room_id=room.pk)
 
     def create(self, request, *args, **kwargs):
         # Use DRF's standard flow so we can broadcast after saving
@@ -284,13 +401,8 @@ class RoomViewSet(viewsets.ModelViewSet):
         # Broadcast to the lobby that a new room is created
         try:
             channel_layer = get_channel_layer()
-            async_to_sync(channel_layer.group_send)(
-                "lobby",
-                {
-                    "type": "broadcast",
-                    "message_type": "room_created",
-                    "data": serializer.data,
-                },
+            async_to_sync(group_send_json)(
+                channel_layer, "lobby", {"type": "room_created", "data": serializer.data}
             )
         except Exception:
             # Non-fatal: room is created even if broadcast fails
@@ -11,13 +11,14 @@ from channels.auth import AuthMiddlewareStack
 django_asgi_app = get_asgi_application()
 
 import ts.routing  # import after Django setup
+from ts.lobby import RoomReaperApp
 from ts.middleware import JwtAuthMiddleware
 
-application = ProtocolTypeRouter({
+application = RoomReaperApp(ProtocolTypeRouter({
     "http": django_asgi_app,
     "websocket": JwtAuthMiddleware(
         URLRouter(
             ts.routing.websocket_urlpatterns
         )
     ),
-})
+}))
@@ -0,0 +1,16 @@
+"""URLs for POST requests under ASGI (see ``ts.middleware.AsgiUrlconfMiddleware``):
+the async game-session actions, then everything in ``tsbackend.urls``."""
+
+from django.urls import path
+
+from ts import async_views
+from tsbackend.urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path("ts/game-sessions/", async_views.create_session),
+    path("ts/game-sessions/<int:pk>/guess/", async_views.guess),
+    path("ts/game-sessions/<int:pk>/guess-and-advance/", async_views.guess_and_advance),
+    path("ts/game-sessions/<int:pk>/next-turn/", async_views.next_turn),
+    path("ts/game-sessions/<int:pk>/end-session/", async_views.end_session),
+    *sync_urlpatterns,
+]
@@ -60,9 +60,12 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
+    "ts.middleware.AsgiUrlconfMiddleware",
 ]
 CORS_ALLOW_ALL_ORIGINS = True
 ROOT_URLCONF = "tsbackend.urls"
+# POSTs served under ASGI resolve here first: the async game-session actions (ts.async_views).
+TS_ASGI_URLCONF = os.getenv("TS_ASGI_URLCONF", "tsbackend.asgi_urls") or None
 
 TEMPLATES = [
     {
@@ -153,7 +156,7 @@ REST_FRAMEWORK = {
     ],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "ts.authentication.CachedJWTAuthentication",
     ),
     "PAGE_SIZE": 10,
 }
@@ -162,12 +165,74 @@ SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=30),  # Set access token expiration time
 }
 
+# Single-player game tuning
+# Turns pre-generated per session with one bulk insert; 0 creates them one at a time.
+TS_TURN_DECK_SIZE = int(os.getenv("TS_TURN_DECK_SIZE", "0"))
+# Deal another deck once fewer than this many turns are left beyond the preloaded one.
+TS_TURN_DECK_REFILL_AT = int(os.getenv("TS_TURN_DECK_REFILL_AT", "2"))
+# "locking" serializes game requests with SELECT ... FOR UPDATE; "optimistic" writes
+# with a single UPDATE ... WHERE version=? and maps lost races to VersionConflict.
+TS_SESSION_CONCURRENCY = os.getenv("TS_SESSION_CONCURRENCY", "locking")
+# Responses replayed for retried guess/next-turn/end-session calls with an Idempotency-Key.
+TS_IDEMPOTENCY_TTL_SECS = int(os.getenv("TS_IDEMPOTENCY_TTL_SECS", "300"))
+TS_IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("TS_IDEMPOTENCY_MAX_ENTRIES", "10000"))
+# How long a worker trusts its in-memory copy of the weekly leaderboard.
+TS_LEADERBOARD_TTL_SECS = int(os.getenv("TS_LEADERBOARD_TTL_SECS", "30"))
+# Reveal time after a correct answer on guess-and-advance before the next turn opens.
+TS_REVEAL_DELAY_MS = int(os.getenv("TS_REVEAL_DELAY_MS", "2000"))
+# Users resolved from JWTs (REST and WebSocket) are cached per worker; saves invalidate.
+TS_AUTH_CACHE_TTL_SECS = int(os.getenv("TS_AUTH_CACHE_TTL_SECS", "60"))
+TS_AUTH_CACHE_MAX_ENTRIES = int(os.getenv("TS_AUTH_CACHE_MAX_ENTRIES", "10000"))
+# Threads (and so database connections) per worker for the sync database work of WebSocket consumers.
+TS_DB_THREADS = int(os.getenv("TS_DB_THREADS", "8"))
+
 # Channels configuration (use in-memory layer for development)
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer",
+# Set REDIS_URL to run several workers: groups and the lobby's rooms then live in Redis.
+TS_REDIS_URL = os.getenv("REDIS_URL", "")
+if TS_REDIS_URL:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {"hosts": [TS_REDIS_URL]},
+        }
     }
-}
+else:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels.layers.InMemoryChannelLayer",
+        }
+    }
+# "memory" keeps lobby rooms in the worker process; "redis" shares them through TS_REDIS_URL.
+TS_ROOM_REGISTRY = os.getenv("TS_ROOM_REGISTRY", "redis" if TS_REDIS_URL else "memory")
+# Lobby room changes are coalesced and published at most once per tick; 0 sends each change at once.
+TS_LOBBY_TICK_MS = int(os.getenv("TS_LOBBY_TICK_MS", "100"))
+# Empty lobby rooms are removed after the grace period by a sweep run every interval.
+TS_LOBBY_EMPTY_ROOM_GRACE_SECS = float(os.getenv("TS_LOBBY_EMPTY_ROOM_GRACE_SECS", "10"))
+TS_LOBBY_REAP_INTERVAL_SECS = float(os.getenv("TS_LOBBY_REAP_INTERVAL_SECS", "5"))
+# Limits on what a room client can relay to the room (see ts.limits).
+TS_ROOM_RELAYED_TYPES = os.getenv("TS_ROOM_RELAYED_TYPES", "chat").split(",")
+TS_ROOM_MAX_FRAME_BYTES = int(os.getenv("TS_ROOM_MAX_FRAME_BYTES", "4096"))
+TS_ROOM_RATE_PER_SEC = float(os.getenv("TS_ROOM_RATE_PER_SEC", "5"))
+TS_ROOM_RATE_BURST = float(os.getenv("TS_ROOM_RATE_BURST", "10"))
+# Group frames queued per room client; "drop" or "disconnect" when a slow client fills it.
+TS_ROOM_OUTBOUND_QUEUE = int(os.getenv("TS_ROOM_OUTBOUND_QUEUE", "100"))
+TS_ROOM_SLOW_CONSUMER_POLICY = os.getenv("TS_ROOM_SLOW_CONSUMER_POLICY", "drop")
+# Dual-mode matches (ts.rounds): rounds per match, pings for the clock offset estimate,
+# and how far ahead a round's synchronized start is scheduled.
+TS_MATCH_ROUNDS = int(os.getenv("TS_MATCH_ROUNDS", "10"))
+TS_MATCH_CLOCK_SAMPLES = int(os.getenv("TS_MATCH_CLOCK_SAMPLES", "5"))
+TS_MATCH_PING_INTERVAL_MS = int(os.getenv("TS_MATCH_PING_INTERVAL_MS", "100"))
+TS_MATCH_LEAD_MS = int(os.getenv("TS_MATCH_LEAD_MS", "1500"))
+# Quick-match queue (ts.matchmaking): "memory" pairs players of one worker, "redis" across workers.
+# Players are paired within score brackets this wide (0: one bracket for everyone), by the
+# mean score of their last TS_MATCH_RECENT_SESSIONS finished sessions.
+TS_MATCHMAKING_QUEUE = os.getenv("TS_MATCHMAKING_QUEUE", "redis" if TS_REDIS_URL else "memory")
+TS_MATCH_BRACKET_WIDTH = int(os.getenv("TS_MATCH_BRACKET_WIDTH", "0"))
+TS_MATCH_RECENT_SESSIONS = int(os.getenv("TS_MATCH_RECENT_SESSIONS", "5"))
+# Spectators of a full room get its state (scores, current round) at most once per tick.
+TS_SPECTATOR_TICK_MS = int(os.getenv("TS_SPECTATOR_TICK_MS", "500"))
+# A worker forgets the spectator feed of a room it has not touched for this long.
+TS_SPECTATOR_FEED_IDLE_SECS = int(os.getenv("TS_SPECTATOR_FEED_IDLE_SECS", "600"))
 
 # Logging configuration: send logs to console (stdout)
 LOG_LEVEL = "INFO"
@@ -20,9 +20,16 @@ const albumColors = [
   "#C5AC90",
   "#242E47",
 ];
+export interface TurnSong {
+  id: number;
+  audio_url: string;
+  snippet_start_sec: number;
+}
+
 export interface GameTurn {
   id: number;
   song: number;
+  song_data: TurnSong;
   options: string[];
   poster_url: string;
   time_limit_secs: number;
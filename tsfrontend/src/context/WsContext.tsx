@@ -86,6 +86,14 @@ export const WsProvider: React.FC<{ children: React.ReactNode }> = ({ children }
         console.log(`<- ${ev.data}`);
         try {
           const parsed = JSON.parse(ev.data);
+          if (parsed?.type === "ping") {
+            // clock sync for the match engine: answer before anything else runs
+            ws.send(JSON.stringify({
+              type: "pong",
+              data: { server_ms: parsed.data?.server_ms, client_ms: Date.now() },
+            }));
+            return;
+          }
           setLastMessage({
             type: String(parsed?.type ?? "message"),
             data: parsed?.data,
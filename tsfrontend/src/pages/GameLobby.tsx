@@ -26,6 +26,8 @@ const GameLobby: React.FC = () => {
   const [query, setQuery] = useState("");
   const [creating, setCreating] = useState(false);
   const lobbyWsRef = useRef<WebSocket | null>(null);
+  // sequence number of the last lobby snapshot or room event applied
+  const lobbySeqRef = useRef(0);
 
   // Fetch waiting rooms from backend
   const loadRooms = async () => {
@@ -59,6 +61,34 @@ const GameLobby: React.FC = () => {
           const msg = JSON.parse(ev.data);
           if (msg.type === "rooms") {
             setRooms(msg.data);
+            lobbySeqRef.current = msg.seq ?? 0;
+          } else if (
+            msg.type === "room_added" ||
+            msg.type === "room_updated" ||
+            msg.type === "room_removed" ||
+            msg.type === "room_events"
+          ) {
+            // a burst arrives as one room_events message covering from_seq..seq
+            const fromSeq = msg.type === "room_events" ? msg.from_seq : msg.seq;
+            if (msg.seq <= lobbySeqRef.current) return; // already in the snapshot
+            if (fromSeq > lobbySeqRef.current + 1) {
+              // missed an event: ask for the full list again
+              ws.send(JSON.stringify({ type: "snapshot" }));
+              return;
+            }
+            lobbySeqRef.current = msg.seq;
+            const events = msg.type === "room_events" ? msg.data : [msg];
+            setRooms((prev) =>
+              events.reduce((rooms: ApiRoom[], event: { type: string; data: ApiRoom }) => {
+                const room = event.data;
+                if (event.type === "room_removed") {
+                  return rooms.filter((r) => r.id !== room.id);
+                }
+                return rooms.some((r) => r.id === room.id)
+                  ? rooms.map((r) => (r.id === room.id ? room : r))
+                  : [...rooms, room];
+              }, prev)
+            );
           } else if (msg.type === "room_created") {
             const room = msg.data;
             connect(room.id);
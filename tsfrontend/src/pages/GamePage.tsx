@@ -4,9 +4,9 @@ import { LinearProgress, Box, Chip } from "@mui/material";
 import { motion } from "framer-motion";
 import { Howl } from "howler";
 import { IoHeart } from "react-icons/io5";
-import { fetchNextTurn, fetchSongWithId } from "../services/api";
+import { fetchNextTurn } from "../services/api";
 import { AppContext } from "../context/AppContext";
-import MusicQuiz, { Song } from "../components/MusicQuiz";
+import MusicQuiz from "../components/MusicQuiz";
 import { useNavigate } from "react-router-dom";
 const backendIp = import.meta.env.VITE_BACKEND_IP;
 
@@ -33,9 +33,6 @@ const GamePage = () => {
   const [health, setHealth] = useState(3);
   const [bgUrl, setBgUrl] = useState<string | null>(null);
   const [bgLoaded, setBgLoaded] = useState(false);
-  const [currentSong, setCurrentSong] = useState<Song | null>(null);
-  const [nextSong, setNextSong] = useState<Song | null>(null);
-  const [isInitialFetchDone, setIsInitialFetchDone] = useState(false);
   // fetch song, options, and poster
   // Using server-provided turn (currentTurn) instead of local random song logic now
 
@@ -46,20 +43,6 @@ const GamePage = () => {
   //   nextTurn?.song
   // );
 
-  useEffect(() => {
-    const fetchInitialSongs = async () => {
-      if (!currentTurn || !nextTurn) return;
-      if(currentSong && nextSong) return;
-      const data2 = await fetchSongWithId(currentTurn.song.toString());
-      const data3 = await fetchSongWithId(nextTurn.song.toString());
-      setCurrentSong(data2);
-      setNextSong(data3);
-      setIsInitialFetchDone(true);
-      console.log("initial fetch finished")
-    };
-    fetchInitialSongs();
-  }, []);
-
   const handleNext = async () => {
     if (!gameSession) return;
     console.log("next");
@@ -69,11 +52,6 @@ const GamePage = () => {
       const data = await fetchNextTurn(gameSession.id, {
         version: gameSession.version,
       });
-      const data2 = await fetchSongWithId(data.new_turn.song.toString());
-
-      const data3 = await fetchSongWithId(data.preloaded_turn.song.toString());
-      setCurrentSong(data2);
-      setNextSong(data3);
       setGameSession(data.session);
       setCurrentTurn(data.new_turn);
       setNextTurn(data.preloaded_turn);
@@ -129,19 +107,19 @@ const GamePage = () => {
 
   // current sound
   useEffect(() => {
-    console.log("setIsInitialFetchDone", isInitialFetchDone);
     // clean up any existing sound instance only when switching to a different track
     if(isSoundLoaded){
       console.log("sound already loaded, skip effect");
       return;
     }
-    const currentFile = currentSong?.file;
-    if (!currentFile || !currentTurn || !nextSong) {
+    // turns carry their audio URL and snippet start, no song fetch needed
+    const currentFile = currentTurn?.song_data?.audio_url;
+    if (!currentFile || !currentTurn || !nextTurn) {
       console.log(
         "no current file or turn",
         currentFile,
         currentTurn,
-        nextSong
+        nextTurn
       );
       return;
     }
@@ -151,7 +129,7 @@ const GamePage = () => {
       console.log("Using preloaded next sound");
       newSound = nextSound;
     } else {
-      console.log("fetch new sound", currentSong);
+      console.log("fetch new sound", currentFile);
       newSound = new Howl({
         src: [currentFile],
         volume: 1,
@@ -178,7 +156,7 @@ const GamePage = () => {
     // Prepare time limit once per turn
     setTimeLimit(getTimeLimitForScore(gameSession?.score ?? 0));
 
-    let skipTo = 0;
+    let skipTo = currentTurn.song_data.snippet_start_sec;
     // Mark UI ready when playback actually starts
     newSound.once("play", (id) => {
       console.log("playback started", id, newSound);
@@ -186,9 +164,9 @@ const GamePage = () => {
         newSound.seek(skipTo, id);
       }
       setIsSoundLoaded(true);
-      const nextFile = nextSong?.file;
+      const nextFile = nextTurn?.song_data?.audio_url;
       if (nextFile) {
-        console.log("preload next sound", nextSong?.song_title.title);
+        console.log("preload next sound", nextFile);
         const nextNewSound = new Howl({
           src: [nextFile],
           volume: 1,
@@ -198,7 +176,7 @@ const GamePage = () => {
         });
         setNextSound(nextNewSound);
       } else {
-        console.log("no next sound", nextSong);
+        console.log("no next sound", nextTurn);
       }
     });
 
@@ -211,24 +189,13 @@ const GamePage = () => {
       console.log("sound already loaded", newSound);
       // If loaded, call play directly
       newSound.play();
-      if (gameSession && gameSession?.score >= 5) {
-        const duration = newSound.duration();
-        const maxSkip = Math.min(90, Math.max(0, duration - 1));
-        if (Math.random() > 0.25) {
-          skipTo = Math.random() * maxSkip;
-        }
-      }
+      // the server picks the snippet start; keep it inside the track
+      skipTo = Math.min(skipTo, Math.max(0, newSound.duration() - 1));
     } else {
       console.log("song has not loaded", newSound);
       newSound.once("load", () => {
         newSound.play();
-        if (gameSession && gameSession?.score >= 5) {
-          const duration = newSound.duration();
-          const maxSkip = Math.min(90, Math.max(0, duration - 1));
-          if (Math.random() > 0.25) {
-            skipTo = Math.random() * maxSkip;
-          }
-        }
+        skipTo = Math.min(skipTo, Math.max(0, newSound.duration() - 1));
       });
     }
 
@@ -245,7 +212,7 @@ const GamePage = () => {
     setSound(newSound);
 
     return () => {};
-  }, [currentTurn?.id,isInitialFetchDone]);
+  }, [currentTurn?.id]);
 
   // Guard: if not actively playing, redirect home (independent of sound lifecycle)
   useEffect(() => {
@@ -360,7 +327,7 @@ const GamePage = () => {
       >
         <Grid size={{ xs: 12, md: 8, lg: 6 }}>
           <motion.div
-            key={currentSong?.song_title?.title || ""}
+            key={currentTurn?.id ?? ""}
             initial={{ opacity: 0, y: 10 }}
             animate={{ opacity: 1, y: 0 }}
             exit={{ opacity: 0, y: -10 }}
@@ -19,7 +19,7 @@ import {
 } from "react-icons/io5";
 import "@fontsource/poppins";
 import { AppContext } from "../context/AppContext";
-import { fetchGameTurn, startGameSession } from "../services/api";
+import { startGameSession } from "../services/api";
 
 type QuickPlayCardProps = {
   title: string;
@@ -184,14 +184,10 @@ const HomePage: React.FC = () => {
 
   const handleStartClassic = async () => {
     try {
-      const session = await startGameSession();
+      const { session, turn, preloaded_turn } = await startGameSession();
       setGameSession(session);
-      if (session.current_turn) {
-        const turn = await fetchGameTurn(session.current_turn);
-        setCurrentTurn(turn);
-        const nextTurnId = await fetchGameTurn(session.next_turn);
-        setNextTurn(nextTurnId);
-      }
+      setCurrentTurn(turn);
+      setNextTurn(preloaded_turn);
       navigate("/game");
     } catch (e) {
       console.error("Failed to start game session", e);
@@ -30,7 +30,7 @@ const WaitingRoom = ({}) => {
   const theme = useTheme();
   const [ready, setReady] = useState<boolean>(false);
   const location = useLocation();
-  const { connect, disconnect, connected, roomId, lastMessage } = useWs();
+  const { connect, disconnect, connected, roomId, lastMessage, send } = useWs();
   const roomFromState = (location.state as any)?.room as Room | undefined;
   const { userName, avatar, userId } = useContext(AuthContext);
   const [opponent, setOpponent] = useState<User | null>(null);
@@ -78,8 +78,9 @@ const WaitingRoom = ({}) => {
   }, [disconnect]);
 
   const toggleReady = () => {
-    const next = !ready;
-    setReady(next);
+    // the match starts once both players are ready, so this cannot be undone
+    if (ready) return;
+    if (send("ready")) setReady(true);
   };
 
   // Auto-connect if navigated with a room and no active connection
@@ -23,6 +23,15 @@ interface NextResponse{
   session:GameSession
 }
 
+interface GuessAndAdvanceResponse {
+  turn: GameTurn;
+  session: GameSession;
+  // null unless the answer was correct and the session moved on
+  new_turn: GameTurn | null;
+  preloaded_turn: GameTurn | null;
+  reveal_ms: number;
+}
+
 interface EndSessionResponse{
   turn:GameTurn;
   session:GameSession
@@ -98,11 +107,15 @@ export const fetchPosterById = async (id: string) => {
 };
 
 // Game Session APIs
-export const startGameSession = async ():Promise<GameSession> => {
+export const startGameSession = async (): Promise<{
+  session: GameSession;
+  turn: GameTurn;
+  preloaded_turn: GameTurn;
+}> => {
   const res = await axios.post(`${backendIp}/ts/game-sessions/`, null, {
     headers: { ...authHeaders() },
   });
-  return res.data.session; // expects session with current_turn
+  return res.data; // session plus its current and preloaded turns
 };
 
 
@@ -145,6 +158,22 @@ export const fetchNextTurn = async (
   return res.data; // { session, turn, ended }
 };
 
+export const guessAndAdvance = async (
+  sessionId: number,
+  payload: {
+    option: string;
+    version: number;
+    elapsed_time_ms: number;
+  }
+):Promise<GuessAndAdvanceResponse> => {
+  const res = await axios.post(
+    `${backendIp}/ts/game-sessions/${sessionId}/guess-and-advance/`,
+    payload,
+    { headers: { ...authHeaders() } }
+  );
+  return res.data; // play new_turn after reveal_ms
+};
+
 export const endGameSession = async (
   sessionId: number,
   payload: { version: number }